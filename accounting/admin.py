@@ -5,3 +5,9 @@ admin.site.register(Wallet)
 admin.site.register(Transaction)
 admin.site.register(Category)
 admin.site.register(PaymentType)
+admin.site.register(WalletSummary)
+admin.site.register(MonthlyRollup)
+admin.site.register(ArchivedTransaction)
+admin.site.register(CarryForward)
+admin.site.register(BalanceCheckpoint)
+admin.site.register(ReconciliationRun)
@@ -0,0 +1,238 @@
+"""JSON API over the transactions, categories and payment types of the user's wallet. Lists are
+compact rows referencing payment types and categories by id, transactions are paged by cursor.
+Transactions are created in batches: the whole batch is validated first and then inserted by one
+ledger operation, which applies the balance deltas once per payment type.
+
+Requests are authenticated by the session and POSTs need the CSRF token, like the forms."""
+import json
+
+from django.core.exceptions import ValidationError
+from django.http import JsonResponse
+from django.utils import timezone
+from django.views.generic import View
+
+from accounting import ledger
+from accounting.balances import get_balances
+from accounting.cashflow import CashflowError, get_cached_cashflow
+from accounting.filters import TransactionFilter
+from accounting.forms import CashflowForm
+from accounting.imports import DESCRIPTION_LENGTH, parse_date, parse_value
+from accounting.models import Transaction
+from accounting.pagination import paginate_by_cursor
+from accounting.utils import WalletCacheMixin
+
+MAX_BATCH_SIZE = 1000
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+# The wallet is read by the related manager
+TRANSACTION_FIELDS = ('id', 'wallet', 'date', 'payment_type', 'category', 'value', 'description')
+
+
+def error_response(message, status=400, **kwargs):
+    return JsonResponse({'error': message, **kwargs}, status=status)
+
+
+def payment_type_row(payment_type):
+    return {'id': payment_type.pk, 'name': payment_type.name, 'balance': str(payment_type.balance)}
+
+
+def category_row(category):
+    return {'id': category.pk, 'name': category.name, 'type': category.type, 'service': category.service}
+
+
+def transaction_row(transaction):
+    return {'id': transaction.pk, 'date': transaction.date.isoformat(), 'payment_type': transaction.payment_type_id,
+            'category': transaction.category_id, 'value': f'{transaction.value:.2f}',
+            'description': transaction.description or ''}
+
+
+def totals_row(totals):
+    return {key: f'{totals[key]:.2f}' for key in ('income', 'expense', 'net')}
+
+
+def cashflow_row(row):
+    result = {'date': row['date'].isoformat(), **totals_row(row)}
+    if 'split' in row:
+        result['split'] = [{'id': pk, **totals_row(totals)} for pk, totals in row['split'].items()]
+    return result
+
+
+class TransactionBatchParser:
+    """Turns JSON objects into unsaved transactions of the wallet. Payment types and categories are
+    referenced by id, values are signed by the category type like in the forms."""
+
+    def __init__(self, wallet, payment_types, categories):
+        self.wallet = wallet
+        self.payment_types = {payment_type.pk: payment_type for payment_type in payment_types}
+        self.categories = {category.pk: category for category in categories}
+        self.timezone = timezone.get_current_timezone()
+
+    @staticmethod
+    def lookup(objects, pk):
+        """The object by an integer id, None for an unknown id or anything else"""
+        if isinstance(pk, bool) or not isinstance(pk, int):
+            return None
+        return objects.get(pk)
+
+    def parse(self, item):
+        """Raises ValidationError with the errors by field"""
+        if not isinstance(item, dict):
+            raise ValidationError({'__all__': 'Expected an object'})
+        errors = {}
+
+        payment_type = self.lookup(self.payment_types, item.get('payment_type'))
+        if payment_type is None:
+            errors['payment_type'] = f'Unknown payment type {item.get("payment_type")!r}'
+        category = self.lookup(self.categories, item.get('category'))
+        if category is None:
+            errors['category'] = f'Unknown category {item.get("category")!r}'
+
+        value = item.get('value')
+        try:
+            if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+                raise ValidationError(f'Invalid value {value!r}')
+            value = parse_value(str(value))
+        except ValidationError as e:
+            errors['value'] = e.messages
+        if category is not None and 'value' not in errors:
+            if category.type == 'Expense':
+                value = -abs(value)
+            elif category.type == 'Income':
+                value = abs(value)
+
+        date = item.get('date')
+        try:
+            if date is None:
+                date = timezone.now()
+            elif isinstance(date, str):
+                date = parse_date(date, self.timezone)
+            else:
+                raise ValidationError(f'Invalid date {date!r}')
+        except ValidationError as e:
+            errors['date'] = e.messages
+
+        description = item.get('description') or ''
+        if not isinstance(description, str):
+            errors['description'] = 'Expected a string'
+        elif len(description.strip()) > DESCRIPTION_LENGTH:
+            errors['description'] = f'The description is longer than {DESCRIPTION_LENGTH} characters'
+
+        if errors:
+            raise ValidationError(errors)
+        return Transaction(wallet_id=self.wallet.pk, payment_type_id=payment_type.pk, category=category,
+                           value=value, description=description.strip(), date=date)
+
+
+class ApiView(WalletCacheMixin, View):
+    """JSON view of the logged in user's wallet, anonymous requests get 401 instead of a redirect"""
+
+    def dispatch(self, request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return error_response('Authentication required', status=401)
+        return super().dispatch(request, *args, **kwargs)
+
+
+class PaymentTypesApi(ApiView):
+    query_budget = 4
+
+    def get(self, request):
+        return JsonResponse({'results': [payment_type_row(payment_type)
+                                         for payment_type in self.wallet_cache.get_payment_types()]})
+
+
+class CategoriesApi(ApiView):
+    query_budget = 4
+
+    def get(self, request):
+        return JsonResponse({'results': [category_row(category) for category in self.wallet_cache.get_categories()]})
+
+
+class BalancesApi(ApiView):
+    """GET: balances of the payment types after their transactions up to ?date= (now by default), from
+    the balance checkpoints"""
+    query_budget = 6
+
+    def get(self, request):
+        date = request.GET.get('date')
+        try:
+            date = parse_date(date, timezone.get_current_timezone()) if date else timezone.now()
+        except ValidationError as e:
+            return error_response(e.messages[0])
+
+        balances = get_balances(request.user.wallet, date)
+        results = [{**payment_type_row(payment_type), 'balance': str(balances[payment_type.pk])}
+                   for payment_type in self.wallet_cache.get_payment_types()]
+        return JsonResponse({'date': date.isoformat(), 'results': results,
+                             'total': str(sum(balances.values()))})
+
+
+class CashflowApi(ApiView):
+    """GET: income, expense and net per bucket (day, week or month) of the period, in the time zone tz,
+    optionally split by category or payment type. Cached until the wallet changes."""
+    query_budget = 5
+
+    def get(self, request):
+        form = CashflowForm(request.GET)
+        if not form.is_valid():
+            return error_response('Invalid parameters', errors=form.errors.get_json_data())
+        data = form.cleaned_data
+
+        try:
+            rows = get_cached_cashflow(self.wallet_cache, data['bucket'], data['date__gte'], data['date__lte'],
+                                       data['tz'], data['split'] or None)
+        except CashflowError as e:
+            return error_response(str(e))
+        return JsonResponse({'bucket': data['bucket'], 'timezone': str(data['tz']), 'split': data['split'] or None,
+                             'results': [cashflow_row(row) for row in rows]})
+
+
+class TransactionsApi(ApiView):
+    """GET: transactions newest first, or most relevant first with ordering=relevance and a description,
+    filtered like the Transactions page, limit rows per page.
+    POST: {"transactions": [...]} creates up to MAX_BATCH_SIZE transactions, all or none."""
+    # A batch is inserted in chunks of the database's parameter limit on SQLite
+    query_budget = 20
+
+    def get(self, request):
+        wallet = request.user.wallet
+        queryset = wallet.transaction_set.only(*TRANSACTION_FIELDS)
+        filtered = TransactionFilter(request.GET, queryset=queryset)
+        for name in ('payment_type', 'category'):
+            filtered.form.fields[name].queryset = filtered.form.fields[name].queryset.filter(wallet=wallet)
+        if not filtered.is_valid():
+            return error_response('Invalid filters', errors=filtered.errors.get_json_data())
+
+        try:
+            limit = min(int(request.GET.get('limit', PAGE_SIZE)), MAX_PAGE_SIZE)
+            if limit < 1:
+                raise ValueError(limit)
+            page = paginate_by_cursor(filtered.qs, limit, request.GET.get('cursor'), filtered.get_cursor_keys())
+        except ValueError:
+            return error_response('Invalid limit or cursor')
+
+        return JsonResponse({'results': [transaction_row(transaction) for transaction in page],
+                             'next': page.next_cursor, 'previous': page.previous_cursor})
+
+    def post(self, request):
+        try:
+            items = json.loads(request.body)['transactions']
+        except (ValueError, KeyError, TypeError):
+            return error_response('Expected a JSON object with a "transactions" list')
+        if not isinstance(items, list) or not items:
+            return error_response('Expected a JSON object with a "transactions" list')
+        if len(items) > MAX_BATCH_SIZE:
+            return error_response(f'At most {MAX_BATCH_SIZE} transactions per request')
+
+        parser = TransactionBatchParser(request.user.wallet, self.wallet_cache.get_payment_types(),
+                                        self.wallet_cache.get_categories())
+        transactions, errors = [], []
+        for index, item in enumerate(items):
+            try:
+                transactions.append(parser.parse(item))
+            except ValidationError as e:
+                errors.append({'index': index, 'errors': e.message_dict})
+        if errors:
+            return error_response('Nothing created', errors=errors)
+
+        ledger.create_transactions(request.user.wallet.pk, [transactions], set_pks=True)
+        return JsonResponse({'results': [transaction_row(transaction) for transaction in transactions]}, status=201)
@@ -1,6 +1,12 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class AccountingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'accounting'
+
+    def ready(self):
+        from accounting.search import create_search_index
+
+        post_migrate.connect(create_search_index, sender=self)
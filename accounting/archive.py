@@ -0,0 +1,126 @@
+"""Cold storage of old transactions. archive_wallet moves the transactions of a wallet older than a date
+from the transaction table to ArchivedTransaction and adds them to its CarryForward rows. Balances,
+the wallet summary, the rollups and the usage counters don't change, the archived transactions still
+count. The rebuilds of those add the carry-forward rows to what they compute from the transaction
+table.
+
+The Transactions page and the export read the archive with ?archive=1. Archived transactions can't be
+edited, the details and edit pages only find transactions of the transaction table."""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, router, transaction as db_transaction
+from django.db.models import Count, DateField, Exists, F, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest, TruncMonth
+from django.utils import timezone
+
+from accounting import summaries
+from accounting.models import ArchivedTransaction, CarryForward, Transaction, Wallet
+
+BATCH_SIZE = 5000
+FIELDS = ('id', 'wallet_id', 'payment_type_id', 'category_id', 'value', 'description', 'date')
+
+
+def archive_horizon(days=None):
+    """Start of the month (current time zone) `days` days ago, ARCHIVE_AFTER_DAYS by default"""
+    days = settings.ARCHIVE_AFTER_DAYS if days is None else days
+    date = timezone.localtime() - timedelta(days=days)
+    return date.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def get_transactions(wallet, archived=False):
+    """Transactions of the wallet from the transaction table or the archive"""
+    return ArchivedTransaction.objects.filter(wallet=wallet) if archived else wallet.transaction_set.all()
+
+
+def _copy_to_archive(transactions):
+    """One INSERT ... SELECT of the transactions into the archive"""
+    connection = connections[router.db_for_write(ArchivedTransaction)]
+    sql, params = transactions.order_by().values_list(*FIELDS).query.get_compiler(connection=connection).as_sql()
+    quote_name = connection.ops.quote_name
+    columns = ', '.join(quote_name(ArchivedTransaction._meta.get_field(field).column) for field in FIELDS)
+    with connection.cursor() as cursor:
+        cursor.execute(f'INSERT INTO {quote_name(ArchivedTransaction._meta.db_table)} ({columns}) {sql}', params)
+
+
+def add_to_carry_forward(wallet_id, rows):
+    """Adds grouped rows (category_id, payment_type_id, month, total, count, last_date) to the
+    carry-forward of the wallet. The caller must hold the wallet summary row lock."""
+    rows = list(rows)
+    existing = set(CarryForward.objects.filter(wallet_id=wallet_id, month__in={row['month'] for row in rows})
+                   .values_list('category_id', 'payment_type_id', 'month'))
+    new_rows = []
+    for row in rows:
+        if (row['category_id'], row['payment_type_id'], row['month']) in existing:
+            CarryForward.objects.filter(wallet_id=wallet_id, category_id=row['category_id'],
+                                        payment_type_id=row['payment_type_id'], month=row['month']).update(
+                total=F('total') + row['total'], count=F('count') + row['count'],
+                last_date=Greatest('last_date', Value(row['last_date'])))
+        else:
+            new_rows.append(CarryForward(wallet_id=wallet_id, **row))
+    CarryForward.objects.bulk_create(new_rows)
+
+
+def archive_wallet(wallet_id, before, batch_size=BATCH_SIZE):
+    """Moves the transactions of the wallet dated before the date to the archive, batch_size rows per
+    database transaction. Returns the number of archived transactions."""
+    transactions = Transaction.objects.filter(wallet_id=wallet_id, date__lt=before)
+    archived = 0
+    while True:
+        with db_transaction.atomic():
+            # Ledger lock order: transactions, then the summary
+            pks = list(transactions.select_for_update().order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not pks:
+                break
+            batch = Transaction.objects.filter(pk__in=pks)
+            rows = list(batch.order_by().annotate(month=TruncMonth('date', output_field=DateField())).values(
+                'category_id', 'payment_type_id', 'month'
+            ).annotate(total=Sum('value'), count=Count('pk'), last_date=Max('date')))
+            _copy_to_archive(batch)
+            batch.delete()
+
+            summaries.bump_version(wallet_id)
+            add_to_carry_forward(wallet_id, rows)
+            Wallet.objects.filter(pk=wallet_id).update(
+                archived_until=Greatest(Coalesce('archived_until', Value(before)), Value(before)))
+        archived += len(pks)
+    return archived
+
+
+def archive_transactions(before, wallets=None, batch_size=BATCH_SIZE, progress=None):
+    """Archives the transactions dated before the date of the given wallets (all by default), calling
+    progress(wallet id, archived) after each wallet. Returns the number of archived transactions."""
+    if wallets is None:
+        wallets = Wallet.objects.all()
+    old_transactions = Transaction.objects.filter(date__lt=before).values('wallet_id')
+    archived = 0
+    for wallet_id in wallets.filter(pk__in=old_transactions).order_by('pk').values_list('pk', flat=True):
+        wallet_archived = archive_wallet(wallet_id, before, batch_size=batch_size)
+        archived += wallet_archived
+        if progress:
+            progress(wallet_id, wallet_archived)
+    return archived
+
+
+def move_archived(wallet_id, field, old_id, new_id):
+    """Moves the archived transactions and the carry-forward of a payment type or category (field) to
+    another one, merging carry-forward rows that already exist for the new one"""
+    # Every archived transaction is in the carry-forward
+    if not CarryForward.objects.filter(wallet_id=wallet_id).exists():
+        return
+    ArchivedTransaction.objects.filter(wallet_id=wallet_id, **{f'{field}_id': old_id}).update(**{f'{field}_id': new_id})
+
+    other = 'category' if field == 'payment_type' else 'payment_type'
+    wallet_rows = CarryForward.objects.filter(wallet_id=wallet_id)
+    old_rows = wallet_rows.filter(**{f'{field}_id': old_id})
+    new_rows = wallet_rows.filter(**{f'{field}_id': new_id})
+
+    matching_old = old_rows.filter(month=OuterRef('month'), **{f'{other}_id': OuterRef(f'{other}_id')})
+    new_rows.filter(Exists(matching_old)).update(
+        total=F('total') + Subquery(matching_old.values('total')),
+        count=F('count') + Subquery(matching_old.values('count')),
+        last_date=Greatest('last_date', Subquery(matching_old.values('last_date'))),
+    )
+    matching_new = new_rows.filter(month=OuterRef('month'), **{f'{other}_id': OuterRef(f'{other}_id')})
+    old_rows.filter(Exists(matching_new)).delete()
+    old_rows.update(**{f'{field}_id': new_id})
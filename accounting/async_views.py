@@ -0,0 +1,103 @@
+"""Async variants of the Main and Transactions pages, served under ASGI. The independent reads of a
+page (the choice lists, the page of transactions and the filtered totals) run at the same time on a
+small pool of threads, each with its own database connection, instead of one after another. The
+page is then rendered by the sync view from what was read."""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.views.generic import View
+
+from accounting.middleware import active_query_stats, count_queries
+from accounting.routers import read_routing
+from accounting.utils import ConditionalPageMixin
+from accounting.views import Main, Transactions
+
+# At most this many extra connections per process
+READ_THREADS = 4
+
+_executor = ThreadPoolExecutor(READ_THREADS, thread_name_prefix='iae-read')
+
+
+def _run_read(func, stats, routing):
+    # The pool's connections are opened and closed like the requests' ones, CONN_MAX_AGE keeps them
+    close_old_connections()
+    token = read_routing.set(routing)
+    try:
+        with count_queries(*stats):
+            return func()
+    finally:
+        read_routing.reset(token)
+        close_old_connections()
+
+
+async def read(func):
+    """Result of the database read func, run on a thread of the pool. Its queries count towards the
+    request's query stats and go to the request's database."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, _run_read, func, active_query_stats.get(), read_routing.get())
+
+
+async def read_all(*funcs):
+    """Results of the independent reads, run concurrently"""
+    return await asyncio.gather(*(read(func) for func in funcs))
+
+
+class AsyncPageMixin:
+    """Async GET of a ConditionalPageMixin page: checks the login and the wallet version, reads what
+    the page needs in prefetch() and renders it with the sync view's GET. The event loop never
+    queries, so the user is loaded on the request's thread."""
+
+    def dispatch(self, request, *args, **kwargs):
+        # LoginRequiredMixin would load the user on the event loop, the handlers check the login
+        return View.dispatch(self, request, *args, **kwargs)
+
+    async def is_authenticated(self):
+        return await sync_to_async(lambda: self.request.user.is_authenticated)()
+
+    async def prefetch(self):
+        """Loads the data of the page concurrently, see read_all. Pages without independent reads
+        render without it."""
+
+    async def get(self, request, *args, **kwargs):
+        if not await self.is_authenticated():
+            return self.handle_no_permission()
+        await read(lambda: self.wallet_cache.summary)
+        response = self.get_not_modified_response()
+        if response is None:
+            await self.prefetch()
+            # The page's own GET, everything it reads is already loaded
+            response = super(ConditionalPageMixin, self).get(request, *args, **kwargs)
+        return self.set_validators(response)
+
+
+class AsyncMain(AsyncPageMixin, Main):
+
+    async def prefetch(self):
+        await read_all(self.wallet_cache.get_recent_transactions, self.wallet_cache.get_payment_types,
+                       self.wallet_cache.get_categories)
+
+    async def post(self, request, *args, **kwargs):
+        if not await self.is_authenticated():
+            return self.handle_no_permission()
+        # Writes stay on the request's thread
+        return await sync_to_async(super().post)(request, *args, **kwargs)
+
+    async def put(self, *args, **kwargs):
+        return await self.post(*args, **kwargs)
+
+
+class AsyncTransactions(AsyncPageMixin, Transactions):
+
+    async def prefetch(self):
+        await asyncio.gather(read(self.wallet_cache.get_payment_types), read(self.wallet_cache.get_categories),
+                             self.prefetch_page())
+
+    async def prefetch_page(self):
+        # Validating the filters reads the filtered payment types and categories
+        queryset, self.cached_page = await read_all(
+            self.get_queryset, lambda: self.wallet_cache.get(self.get_page_cache_name()))
+        if self.cached_page is None:
+            await read_all(lambda: self.paginate_queryset(queryset, self.paginate_by), self.get_page_summary)
+            await read(self.get_running_balances)
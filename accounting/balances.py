@@ -0,0 +1,208 @@
+"""Historical balances of payment types. A BalanceCheckpoint stores the balance of a payment type after
+its transactions dated before `until`, the start of a day. build_checkpoints adds them for the days with
+transactions since the last run. The ledger deletes the checkpoints after the date of a back-dated
+write (invalidate_checkpoints), the next run rebuilds them from there.
+
+The balance at any moment is the nearest checkpoint plus or minus the transactions between the two:
+one index lookup and about a day of transactions, whatever the length of the history. Without
+checkpoints it is the current balance minus the transactions after that moment."""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from functools import reduce
+from operator import or_
+
+from django.db import transaction as db_transaction
+from django.db.models import OuterRef, Q, Subquery, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from accounting.models import ArchivedTransaction, BalanceCheckpoint, PaymentType, Transaction, Wallet, WalletSummary
+
+
+def up_to(date, pk=None):
+    """Transactions up to the position: dated up to the date, or with pk ordered (date, id) up to that transaction"""
+    if pk is None:
+        return Q(date__lte=date)
+    return Q(date__lt=date) | Q(date=date, pk__lte=pk)
+
+
+def after(date, pk=None):
+    if pk is None:
+        return Q(date__gt=date)
+    return Q(date__gt=date) | Q(date=date, pk__gt=pk)
+
+
+def start_of_today():
+    """Checkpoints are only built for the days before, see invalidate_checkpoints"""
+    return timezone.localtime(timezone=timezone.get_default_timezone()).replace(hour=0, minute=0, second=0,
+                                                                                microsecond=0)
+
+
+def _tables(wallet, since):
+    """Transactions of the wallet that may be dated after since. The archive only has transactions
+    dated before wallet.archived_until."""
+    tables = [Transaction.objects.filter(wallet=wallet)]
+    if wallet.archived_until is not None and (since is None or since < wallet.archived_until):
+        tables.append(ArchivedTransaction.objects.filter(wallet=wallet))
+    return tables
+
+
+def _condition(conditions):
+    return reduce(or_, (Q(payment_type_id=pk) & condition for pk, condition in conditions.items()))
+
+
+def _sums(wallet, conditions, since):
+    """{payment type id: sum of its transactions matching its condition} with one grouped query per table"""
+    sums = defaultdict(Decimal)
+    if not conditions:
+        return sums
+    for queryset in _tables(wallet, since):
+        rows = queryset.filter(_condition(conditions)).order_by().values('payment_type_id').annotate(
+            total=Sum('value')).values_list('payment_type_id', 'total')
+        for pk, total in rows:
+            sums[pk] += total
+    return sums
+
+
+def get_balances(wallet, date, pk=None, payment_types=None):
+    """{payment type id: balance after its transactions up to the position (see up_to)} of the wallet's
+    payment types (or of the given ids) from the nearest checkpoints, with two queries (three with the archive)"""
+    checkpoints = BalanceCheckpoint.objects.filter(payment_type=OuterRef('pk'))
+    previous = checkpoints.filter(until__lte=date).order_by('-until')
+    following = checkpoints.filter(until__gt=date).order_by('until')
+    rows = PaymentType.objects.filter(wallet=wallet)
+    if payment_types is not None:
+        rows = rows.filter(pk__in=payment_types)
+    rows = rows.values_list('pk', 'balance',
+                            Subquery(previous.values('until')[:1]), Subquery(previous.values('balance')[:1]),
+                            Subquery(following.values('until')[:1]), Subquery(following.values('balance')[:1]))
+
+    balances, added, subtracted = {}, {}, {}
+    since = date
+    for payment_type_id, balance, previous_until, previous_balance, following_until, following_balance in rows:
+        if previous_until is not None:
+            # The checkpoint plus the transactions since
+            balances[payment_type_id] = previous_balance
+            added[payment_type_id] = Q(date__gte=previous_until) & up_to(date, pk)
+            since = min(since, previous_until)
+        elif following_until is not None:
+            # The checkpoint minus the transactions in between
+            balances[payment_type_id] = following_balance
+            subtracted[payment_type_id] = after(date, pk) & Q(date__lt=following_until)
+        else:
+            balances[payment_type_id] = balance
+            subtracted[payment_type_id] = after(date, pk)
+
+    sums = _sums(wallet, {**added, **subtracted}, since)
+    for payment_type_id in balances:
+        balances[payment_type_id] += sums[payment_type_id] if payment_type_id in added else -sums[payment_type_id]
+    return balances
+
+
+def running_balances(wallet, transactions):
+    """{transaction id: balance of its payment type after it} of transactions, like a page of the
+    Transactions page, with three queries"""
+    if not transactions:
+        return {}
+    # Pages ordered by relevance aren't in date order
+    transactions = sorted(transactions, key=lambda transaction: (transaction.date, transaction.pk), reverse=True)
+    newest = transactions[0]
+    oldest = {}
+    for transaction in transactions:
+        oldest[transaction.payment_type_id] = transaction
+    balances = get_balances(wallet, newest.date, newest.pk, payment_types=oldest)
+
+    # Transactions of the payment types from the oldest one on the page of each. Filters may have
+    # left out some of them.
+    condition = _condition({payment_type_id: Q(date__gt=transaction.date) | Q(date=transaction.date,
+                                                                            pk__gte=transaction.pk)
+                            for payment_type_id, transaction in oldest.items()}) & up_to(newest.date, newest.pk)
+    rows = []
+    for queryset in _tables(wallet, min(transaction.date for transaction in oldest.values())):
+        rows += queryset.filter(condition).values_list('date', 'pk', 'payment_type_id', 'value')
+
+    result = {}
+    for _, pk, payment_type_id, value in sorted(rows, reverse=True):
+        result[pk] = balances[payment_type_id]
+        balances[payment_type_id] -= value
+    return result
+
+
+def _day_end(day):
+    return timezone.make_aware(datetime.combine(day + timedelta(days=1), time()), timezone.get_default_timezone())
+
+
+def build_wallet_checkpoints(wallet):
+    """Adds the checkpoints of the wallet's payment types for the days with transactions from their
+    last checkpoint to yesterday. Returns the number of new checkpoints."""
+    end = start_of_today()
+    with db_transaction.atomic():
+        # Ledger writes wait, so the balances and the transactions match
+        list(WalletSummary.objects.select_for_update().filter(wallet=wallet))
+        last = BalanceCheckpoint.objects.filter(payment_type=OuterRef('pk')).order_by('-until')
+        payment_types = PaymentType.objects.filter(wallet=wallet).values_list(
+            'pk', 'balance', Subquery(last.values('until')[:1]), Subquery(last.values('balance')[:1]))
+
+        balances, conditions, new = {}, {}, []
+        since = end
+        for payment_type_id, balance, last_until, last_balance in payment_types:
+            if last_until is None:
+                new.append(payment_type_id)
+                balances[payment_type_id] = balance
+                conditions[payment_type_id] = Q(date__lt=end)
+                since = None
+            elif last_until < end:
+                balances[payment_type_id] = last_balance
+                conditions[payment_type_id] = Q(date__gte=last_until, date__lt=end)
+                since = since and min(since, last_until)
+        if not conditions:
+            return 0
+
+        # Payment types without checkpoints start from the opening balance: the current one minus
+        # every transaction
+        opening = _sums(wallet, {payment_type_id: Q() for payment_type_id in new}, None)
+        for payment_type_id in new:
+            balances[payment_type_id] -= opening[payment_type_id]
+
+        days = defaultdict(Decimal)
+        for queryset in _tables(wallet, since):
+            rows = queryset.filter(_condition(conditions)).order_by().annotate(
+                day=TruncDate('date', tzinfo=timezone.get_default_timezone())
+            ).values('payment_type_id', 'day').annotate(total=Sum('value')).values_list(
+                'payment_type_id', 'day', 'total')
+            for payment_type_id, day, total in rows:
+                days[payment_type_id, day] += total
+
+        checkpoints = []
+        for payment_type_id, day in sorted(days):
+            balances[payment_type_id] += days[payment_type_id, day]
+            checkpoints.append(BalanceCheckpoint(payment_type_id=payment_type_id, until=_day_end(day),
+                                                 balance=balances[payment_type_id]))
+        return len(BalanceCheckpoint.objects.bulk_create(checkpoints))
+
+
+def build_checkpoints(wallets=None, progress=None):
+    """Adds the checkpoints of the given wallets (all by default) up to yesterday, one database
+    transaction per wallet, calling progress(wallet id, created) after each. Returns the number of new
+    checkpoints."""
+    if wallets is None:
+        wallets = Wallet.objects.all()
+    created = 0
+    for wallet in wallets.order_by('pk').iterator():
+        wallet_created = build_wallet_checkpoints(wallet)
+        created += wallet_created
+        if progress:
+            progress(wallet.pk, wallet_created)
+    return created
+
+
+def invalidate_checkpoints(dates):
+    """Deletes the checkpoints that include a changed transaction: {payment type id: earliest date of
+    the changed transactions, None for all}. Called after the summary row is locked, so it sees the
+    checkpoints of a concurrent build."""
+    today = start_of_today()
+    conditions = {payment_type_id: Q() if date is None else Q(until__gt=date)
+                  for payment_type_id, date in dates.items() if date is None or date < today}
+    if conditions:
+        BalanceCheckpoint.objects.filter(_condition(conditions)).delete()
@@ -0,0 +1,199 @@
+"""View benchmarks: every URL of accounting and authentication is requested through the test client
+against synthetic wallets of several sizes, recording latency percentiles, query count, SQL time and
+peak memory per view. Results are JSON and can be compared against a stored baseline. The requests go
+through the WSGI handler, or the ASGI one to compare the async views."""
+import platform
+import statistics
+import time
+import tracemalloc
+from datetime import timedelta
+from urllib.parse import urlencode
+
+import django
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import AsyncClient, Client
+from django.urls import reverse
+from django.utils import timezone
+
+from accounting import ledger, urls as accounting_urls
+from accounting.middleware import QueryStats, track_queries
+from accounting.models import Category, PaymentType, Transaction
+from accounting.synthetic import analyze, generate_wallet
+from authentication import urls as authentication_urls
+
+SIZES = (1000, 100000, 1000000)
+REPEAT = 20
+TOLERANCE = 0.2
+DESCRIPTION = 'Benchmark'
+
+
+class Scenario:
+    """One request of the benchmark. before runs ahead of every request, outside the measurement."""
+
+    def __init__(self, name, client, path, data=None, method='get', before=None):
+        self.name = name
+        self.client = client
+        self.path = path
+        self.data = data
+        self.method = method
+        self.before = before
+
+    def send(self):
+        if self.method == 'post':
+            # Form-encoded, Django 4.1's AsyncClient can't send multipart bodies
+            return self.client.post(self.path, urlencode(self.data), content_type='application/x-www-form-urlencoded')
+        return getattr(self.client, self.method)(self.path, self.data)
+
+    async def send_async(self):
+        return await self.send()
+
+    def request(self):
+        if isinstance(self.client, AsyncClient):
+            response = async_to_sync(self.send_async)()
+        else:
+            response = self.send()
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+        return response
+
+
+def get_wallet(size, seed=0):
+    """Wallet of the benchmark user of the size, generated on first use"""
+    user, created = get_user_model().objects.get_or_create(username=f'benchmark-{size}')
+    if not created:
+        return user.wallet
+    user.set_unusable_password()
+    user.save()
+    wallet = generate_wallet(user, size, seed=seed, transactions=size)
+    analyze()
+    return wallet
+
+
+def _percentile(quantiles, percent):
+    return quantiles[percent - 1] if quantiles else None
+
+
+def measure(scenario, repeat=REPEAT, warm=False):
+    """Latency percentiles in ms, median query count and SQL time of the scenario, and the peak
+    memory traced in one more run (tracing slows the code down, so it isn't timed)"""
+    timings, query_counts, sql_times = [], [], []
+    status = None
+    # The first run only warms up connections, imports and templates
+    for number in range(repeat + 1):
+        if scenario.before:
+            scenario.before()
+        if not warm:
+            cache.clear()
+        with track_queries(QueryStats()) as stats:
+            start = time.perf_counter()
+            status = scenario.request().status_code
+            elapsed = time.perf_counter() - start
+        if number:
+            timings.append(elapsed * 1000)
+            query_counts.append(stats.count)
+            sql_times.append(stats.duration * 1000)
+
+    if scenario.before:
+        scenario.before()
+    if not warm:
+        cache.clear()
+    tracemalloc.start()
+    try:
+        scenario.request()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    quantiles = statistics.quantiles(timings, n=100, method='inclusive') if len(timings) > 1 else timings * 99
+    return {
+        'status': status,
+        'p50_ms': round(_percentile(quantiles, 50), 2),
+        'p95_ms': round(_percentile(quantiles, 95), 2),
+        'p99_ms': round(_percentile(quantiles, 99), 2),
+        'queries': statistics.median_low(query_counts),
+        'sql_ms': round(statistics.median(sql_times), 2),
+        'peak_memory_kb': round(peak / 1024),
+    }
+
+
+def scenarios(wallet, asgi=False):
+    """GET of every URL with objects of the wallet, filtered transactions, and the frequent writes"""
+    client_class = AsyncClient if asgi else Client
+    client = client_class()
+    client.force_login(wallet.owner)
+    anonymous = client_class()
+    payment_type = wallet.paymenttype_set.order_by('-usage_count').first()
+    category = wallet.category_set.filter(service=False).order_by('-usage_count').first()
+    transaction = wallet.transaction_set.order_by('-date', '-id').first()
+    objects = {PaymentType: payment_type, Category: category, Transaction: transaction}
+
+    for pattern in accounting_urls.urlpatterns:
+        kwargs = {}
+        if 'pk' in pattern.pattern.converters:
+            kwargs['pk'] = objects[pattern.callback.view_class.model].pk
+        yield Scenario(f'GET {pattern.name}', client, reverse(pattern.name, kwargs=kwargs))
+    for pattern in authentication_urls.urlpatterns:
+        before = (lambda: anonymous.force_login(wallet.owner)) if pattern.name == 'logout' else None
+        yield Scenario(f'GET {pattern.name}', anonymous, reverse(pattern.name), before=before)
+
+    yield Scenario('GET transactions filtered', client, reverse('transactions'), {
+        'category': category.pk, 'payment_type': payment_type.pk, 'description': 'coffee',
+        'date__gte': (transaction.date - timedelta(days=365)).date().isoformat()})
+    yield Scenario('GET export_transactions gzip', client, reverse('export_transactions'), {'gzip': 1})
+    yield Scenario('POST main', client, reverse('main'), {
+        'category': category.pk, 'payment_type': payment_type.pk, 'value': 1, 'description': DESCRIPTION},
+        method='post')
+    yield Scenario('POST update_transaction', client, reverse('update_transaction', args=[transaction.pk]), {
+        'category': transaction.category_id, 'payment_type': transaction.payment_type_id,
+        'value': abs(transaction.value), 'description': transaction.description or '',
+        'date': timezone.localtime(transaction.date).strftime('%Y-%m-%dT%H:%M')}, method='post')
+
+
+def run_benchmarks(sizes=SIZES, repeat=REPEAT, warm=False, seed=0, asgi=False, progress=None):
+    """Benchmark results of every scenario for the wallet sizes, through the ASGI handler if asgi"""
+    results = {}
+    for size in sizes:
+        wallet = get_wallet(size, seed)
+        results[str(size)] = {}
+        for scenario in scenarios(wallet, asgi):
+            results[str(size)][scenario.name] = measure(scenario, repeat, warm)
+            if progress:
+                progress(size, scenario.name, results[str(size)][scenario.name])
+        # Transactions created by the benchmark
+        for transaction in wallet.transaction_set.filter(description=DESCRIPTION):
+            ledger.delete_transaction(transaction)
+
+    return {
+        'meta': {
+            'created': timezone.now().isoformat(timespec='seconds'),
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'repeat': repeat,
+            'cache': 'warm' if warm else 'cold',
+            'handler': 'asgi' if asgi else 'wsgi',
+            'async_views': settings.ASYNC_VIEWS,
+        },
+        'results': results,
+    }
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """Regressions against the baseline as (size, scenario, metric, baseline value, value): a p95
+    latency more than tolerance above the baseline, or more queries"""
+    regressions = []
+    for size, scenario_results in results['results'].items():
+        for name, metrics in scenario_results.items():
+            base = baseline['results'].get(size, {}).get(name)
+            if base is None:
+                continue
+            if metrics['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+                regressions.append((size, name, 'p95_ms', base['p95_ms'], metrics['p95_ms']))
+            if metrics['queries'] > base['queries']:
+                regressions.append((size, name, 'queries', base['queries'], metrics['queries']))
+    return regressions
@@ -0,0 +1,130 @@
+"""Income, expense and net of a wallet per day, week or month. The database truncates the dates in the
+requested time zone and sums the transactions of each bucket (and category or payment type), so a
+chart of years of transactions reads one row per bucket. Archived transactions are included when the
+period starts before the wallet's archive horizon. The results are cached until the wallet changes."""
+import hashlib
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from django.db.models import DateField, Q, Sum
+from django.db.models.functions import Coalesce, Trunc
+from django.utils import timezone
+
+from accounting.archive import get_transactions
+from accounting.summaries import ZERO
+
+BUCKETS = ('day', 'week', 'month')
+# Fields of the split by category or payment type
+SPLITS = {'category': 'category_id', 'payment_type': 'payment_type_id'}
+MAX_BUCKETS = 1000
+# Bucket starts and time zone shifts of the dates in between stay within the range of datetime
+MIN_DATE = date.min + timedelta(days=31)
+MAX_DATE = date.max - timedelta(days=31)
+
+
+class CashflowError(Exception):
+    pass
+
+
+def bucket_start(day, bucket):
+    """First day of the bucket of the day, the same as Trunc"""
+    if bucket == 'week':
+        return day - timedelta(days=day.weekday())
+    if bucket == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def next_bucket(day, bucket):
+    if bucket == 'week':
+        return day + timedelta(days=7)
+    if bucket == 'month':
+        return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return day + timedelta(days=1)
+
+
+def bucket_count(first, last, bucket):
+    """Number of buckets from the one of the first day to the one of the last day"""
+    if bucket == 'week':
+        return (bucket_start(last, bucket) - bucket_start(first, bucket)).days // 7 + 1
+    if bucket == 'month':
+        return (last.year - first.year) * 12 + last.month - first.month + 1
+    return (last - first).days + 1
+
+
+def _bounds(date_from, date_to, tz):
+    """Aware start and end of the period of whole days in the time zone"""
+    start = datetime.combine(date_from, time(), tz) if date_from else None
+    end = datetime.combine(date_to + timedelta(days=1), time(), tz) if date_to else None
+    return start, end
+
+
+def _rows(transactions, bucket, tz, start, end, split):
+    transactions = transactions.filter(category__type__in=['Income', 'Expense'])
+    if start:
+        transactions = transactions.filter(date__gte=start)
+    if end:
+        transactions = transactions.filter(date__lt=end)
+    fields = ['bucket'] + ([SPLITS[split]] if split else [])
+    return transactions.order_by().annotate(
+        bucket=Trunc('date', bucket, output_field=DateField(), tzinfo=tz)
+    ).values(*fields).annotate(
+        income=Coalesce(Sum('value', filter=Q(category__type='Income')), ZERO),
+        expense=Coalesce(Sum('value', filter=Q(category__type='Expense')), ZERO),
+    ).values_list(*fields, 'income', 'expense')
+
+
+def _totals(income=Decimal(0), expense=Decimal(0)):
+    return {'income': income, 'expense': expense, 'net': income + expense}
+
+
+def get_cashflow(wallet, bucket='month', date_from=None, date_to=None, tz=None, split=None):
+    """[{'date', 'income', 'expense', 'net'}] per bucket from the first to the last one of the period,
+    with the buckets without transactions. With split each has 'split', {category or payment type id:
+    totals}. Dates are in the time zone tz, the current one by default. One grouped query, two when the
+    period reaches into the archive. Raises CashflowError for more than MAX_BUCKETS buckets, which an
+    open period may span."""
+    tz = tz or timezone.get_current_timezone()
+    start, end = _bounds(date_from, date_to, tz)
+    querysets = [get_transactions(wallet)]
+    if wallet.archived_until is not None and (start is None or start < wallet.archived_until):
+        querysets.append(get_transactions(wallet, archived=True))
+
+    sums = defaultdict(lambda: [Decimal(0), Decimal(0)])
+    for queryset in querysets:
+        for row in _rows(queryset, bucket, tz, start, end, split):
+            key, income, expense = row[:-2], row[-2], row[-1]
+            sums[key][0] += income
+            sums[key][1] += expense
+
+    by_bucket = defaultdict(dict)
+    for key, (income, expense) in sums.items():
+        by_bucket[key[0]][key[1] if split else None] = _totals(income, expense)
+    if not by_bucket and not (date_from and date_to):
+        return []
+
+    day = bucket_start(date_from or min(by_bucket), bucket)
+    count = bucket_count(day, date_to or max(by_bucket), bucket)
+    if count > MAX_BUCKETS:
+        raise CashflowError(f'The period has {count} buckets, at most {MAX_BUCKETS} per request')
+    results = []
+    for number in range(count):
+        if number:
+            day = next_bucket(day, bucket)
+        groups = by_bucket.get(day, {})
+        row = {'date': day, **_totals(sum((totals['income'] for totals in groups.values()), Decimal(0)),
+                                      sum((totals['expense'] for totals in groups.values()), Decimal(0)))}
+        if split:
+            row['split'] = dict(sorted(groups.items()))
+        results.append(row)
+    return results
+
+
+def get_cached_cashflow(wallet_cache, bucket='month', date_from=None, date_to=None, tz=None, split=None):
+    """get_cashflow cached for the current version of the wallet"""
+    tz = tz or timezone.get_current_timezone()
+    parameters = f'{bucket}:{date_from}:{date_to}:{tz}:{split}'
+    name = f'cashflow:{hashlib.md5(parameters.encode(), usedforsecurity=False).hexdigest()}'
+    return wallet_cache.get_or_set(name, lambda: get_cashflow(wallet_cache.wallet, bucket, date_from, date_to,
+                                                              tz, split))
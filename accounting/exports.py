@@ -0,0 +1,75 @@
+"""Streaming export of transactions as CSV (the format accounting.imports reads) or JSON lines.
+Rows are fetched through a server-side cursor chunk by chunk, so memory use doesn't depend on
+the number of transactions."""
+import csv
+import io
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+COLUMNS = ('date', 'payment_type', 'category', 'value', 'description')
+FIELDS = ('date', 'payment_type__name', 'category__name', 'value', 'description')
+CHUNK_SIZE = 2000
+
+
+def export_rows(queryset, chunk_size=CHUNK_SIZE):
+    """Value tuples of the transactions in COLUMNS order, dates in the current time zone"""
+    tz = timezone.get_current_timezone()
+    for date, *values in queryset.values_list(*FIELDS).iterator(chunk_size=chunk_size):
+        yield date.astimezone(tz).isoformat(sep=' ', timespec='seconds'), *values
+
+
+def _chunks(buffer, write, rows, chunk_size):
+    """Contents of the buffer after every chunk_size rows passed to write"""
+    for number, row in enumerate(rows, 1):
+        write(row)
+        if number % chunk_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def csv_chunks(rows, chunk_size=CHUNK_SIZE):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    return _chunks(buffer, writer.writerow, rows, chunk_size)
+
+
+def jsonl_chunks(rows, chunk_size=CHUNK_SIZE):
+    buffer = io.StringIO()
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+
+    def write(row):
+        buffer.write(encoder.encode(dict(zip(COLUMNS, row))))
+        buffer.write('\n')
+
+    return _chunks(buffer, write, rows, chunk_size)
+
+
+def gzip_chunks(chunks):
+    """Compresses a stream of strings into a gzip file on the fly"""
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+FORMATS = {
+    'csv': ('text/csv', csv_chunks),
+    'jsonl': ('application/x-ndjson', jsonl_chunks),
+}
+
+
+def export_transactions(queryset, export_format='csv', compress=False):
+    """(content type, file name, chunks) of the export. Raises KeyError for unknown formats."""
+    content_type, chunks = FORMATS[export_format]
+    chunks, file_name = chunks(export_rows(queryset)), f'transactions.{export_format}'
+    if compress:
+        return 'application/gzip', f'{file_name}.gz', gzip_chunks(chunks)
+    return f'{content_type}; charset=utf-8', file_name, chunks
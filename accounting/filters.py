@@ -1,7 +1,14 @@
+import datetime
+
 import django_filters
 from django import forms
+from django.utils import timezone
 
 from accounting.models import Transaction, PaymentType, Category
+from accounting.pagination import CURSOR_KEYS, RELEVANCE_CURSOR_KEYS
+from accounting.search import parse_words, search_transactions
+
+RELEVANCE = 'relevance'
 
 
 class TransactionFilter(django_filters.FilterSet):
@@ -12,12 +19,13 @@ class TransactionFilter(django_filters.FilterSet):
                                                         widget=forms.CheckboxSelectMultiple(
                                                             attrs={'class': 'form-checkbox'}))
     date = django_filters.DateFilter()
-    date__gte = django_filters.DateTimeFilter(field_name='date', lookup_expr='date__gte',
+    # Bounds are compared with the raw column (not date__date) so the (wallet, date) index is usable
+    date__gte = django_filters.DateTimeFilter(field_name='date', method='filter_date_from',
                                               widget=forms.DateTimeInput(attrs={'type': 'date',
                                                                                 'class': 'form-control',
                                                                                 'max': '9999-12-31',
                                                                                 'placeholder': 'From'}))
-    date__lte = django_filters.DateTimeFilter(field_name='date', lookup_expr='date__lte',
+    date__lte = django_filters.DateTimeFilter(field_name='date', method='filter_date_to',
                                               widget=forms.DateTimeInput(attrs={'type': 'date',
                                                                                 'class': 'form-control',
                                                                                 'max': '9999-12-31',
@@ -29,11 +37,45 @@ class TransactionFilter(django_filters.FilterSet):
     value__lte = django_filters.NumberFilter(field_name='value', lookup_expr='lte',
                                              widget=forms.NumberInput(attrs={'class': 'form-control',
                                                                              'placeholder': 'To'}))
-    description = django_filters.Filter(field_name='description', lookup_expr='icontains',
+    description = django_filters.Filter(field_name='description', method='filter_description',
                                         label='Description',
                                         widget=forms.TextInput(attrs={'class': 'form-control',
                                                                       'placeholder': 'Description'}))
+    # Most relevant first, when there is a description to rank by
+    ordering = django_filters.ChoiceFilter(choices=[(RELEVANCE, 'Relevance')], method='filter_ordering',
+                                           label='Order', empty_label='Newest first',
+                                           widget=forms.Select(attrs={'class': 'form-control'}))
 
     class Meta:
         model = Transaction
         fields = []
+
+    @staticmethod
+    def start_of_day(value):
+        return timezone.localtime(value).replace(hour=0, minute=0, second=0, microsecond=0)
+
+    def filter_date_from(self, queryset, name, value):
+        return queryset.filter(**{f'{name}__gte': self.start_of_day(value)})
+
+    def filter_date_to(self, queryset, name, value):
+        return queryset.filter(**{f'{name}__lt': self.start_of_day(value) + datetime.timedelta(days=1)})
+
+    def filter_description(self, queryset, name, value):
+        return search_transactions(queryset, value, rank=self.is_ranked())
+
+    def filter_ordering(self, queryset, name, value):
+        # Applied in filter_queryset, after the description filter has ranked the transactions
+        return queryset
+
+    def is_ranked(self):
+        data = self.form.cleaned_data
+        return data.get('ordering') == RELEVANCE and bool(parse_words(data.get('description')))
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.is_ranked():
+            queryset = queryset.order_by('-rank', '-date', '-id')
+        return queryset
+
+    def get_cursor_keys(self):
+        return RELEVANCE_CURSOR_KEYS if self.is_ranked() else CURSOR_KEYS
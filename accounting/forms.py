@@ -1,6 +1,10 @@
+import zoneinfo
+
 from django import forms
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 
+from accounting import cashflow
 from accounting.models import PaymentType, Category, Transaction
 
 
@@ -130,3 +134,65 @@ class TransferBetweenPaymentTypesForm(forms.Form):
             raise ValidationError("You can't transfer between same payment types")
 
         return payment_type_to
+
+
+class ImportTransactionsForm(forms.Form):
+    file = forms.FileField(label='CSV file with the columns date, payment_type, category, value, description',
+                           widget=forms.FileInput(attrs={'class': 'form-control', 'accept': '.csv,text/csv'}))
+
+
+class ReportForm(forms.Form):
+    month__gte = forms.DateField(required=False, input_formats=['%Y-%m'],
+                                 widget=forms.DateInput(attrs={'type': 'month', 'class': 'form-control',
+                                                               'placeholder': 'From'}, format='%Y-%m'))
+    month__lte = forms.DateField(required=False, input_formats=['%Y-%m'],
+                                 widget=forms.DateInput(attrs={'type': 'month', 'class': 'form-control',
+                                                               'placeholder': 'To'}, format='%Y-%m'))
+
+
+class CashflowForm(forms.Form):
+    date__gte = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control',
+                                                                              'placeholder': 'From'}))
+    date__lte = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control',
+                                                                              'placeholder': 'To'}))
+    bucket = forms.ChoiceField(required=False, choices=[('day', 'Day'), ('week', 'Week'), ('month', 'Month')],
+                               widget=forms.Select(attrs={'class': 'form-control'}))
+    split = forms.ChoiceField(required=False, choices=[('', 'Total'), ('category', 'By category'),
+                                                       ('payment_type', 'By payment type')],
+                              widget=forms.Select(attrs={'class': 'form-control'}))
+    # IANA name, the server's time zone by default
+    tz = forms.CharField(required=False, widget=forms.HiddenInput())
+
+    def clean_bucket(self):
+        return self.cleaned_data['bucket'] or 'month'
+
+    def clean_tz(self):
+        name = self.cleaned_data['tz']
+        if not name:
+            return timezone.get_current_timezone()
+        try:
+            return zoneinfo.ZoneInfo(name)
+        except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+            raise ValidationError(f'Unknown time zone "{name}"')
+
+    def clean_date(self, name):
+        value = self.cleaned_data[name]
+        if value and not cashflow.MIN_DATE <= value <= cashflow.MAX_DATE:
+            raise ValidationError(f'Enter a date from {cashflow.MIN_DATE} to {cashflow.MAX_DATE}')
+        return value
+
+    def clean_date__gte(self):
+        return self.clean_date('date__gte')
+
+    def clean_date__lte(self):
+        return self.clean_date('date__lte')
+
+    def clean(self):
+        cleaned_data = super().clean()
+        date_from, date_to, bucket = (cleaned_data.get(name) for name in ('date__gte', 'date__lte', 'bucket'))
+        if date_from and date_to:
+            if date_from > date_to:
+                raise ValidationError('The period ends before it starts')
+            if bucket and cashflow.bucket_count(date_from, date_to, bucket) > cashflow.MAX_BUCKETS:
+                raise ValidationError(f'The period has more than {cashflow.MAX_BUCKETS} {bucket}s')
+        return cleaned_data
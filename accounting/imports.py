@@ -0,0 +1,146 @@
+"""Bulk import of transactions from CSV files with the columns date, payment_type, category, value
+and description. The file is parsed as a stream and validated and inserted in batches, so its size
+doesn't matter. The import is all or nothing."""
+import csv
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.core.validators import DecimalValidator
+from django.utils import timezone
+
+from accounting import ledger
+from accounting.models import Transaction
+
+REQUIRED_COLUMNS = ('date', 'payment_type', 'category', 'value')
+BATCH_SIZE = 5000
+MAX_ERRORS = 20
+# Besides ISO 8601
+DATE_FORMATS = ('%d.%m.%Y %H:%M', '%d.%m.%Y')
+
+validate_value = DecimalValidator(max_digits=16, decimal_places=2)
+DESCRIPTION_LENGTH = Transaction._meta.get_field('description').max_length
+
+
+def parse_date(value, tz):
+    """Aware datetime of the ISO 8601 or DATE_FORMATS string, naive ones are in the tz"""
+    value = (value or '').strip()
+    try:
+        date = datetime.fromisoformat(value)
+    except ValueError:
+        for date_format in DATE_FORMATS:
+            try:
+                date = datetime.strptime(value, date_format)
+                break
+            except ValueError:
+                pass
+        else:
+            raise ValidationError(f'Invalid date "{value}"')
+    return timezone.make_aware(date, tz) if timezone.is_naive(date) else date
+
+
+def parse_value(value):
+    try:
+        value = Decimal((value or '').strip())
+    except InvalidOperation:
+        raise ValidationError(f'Invalid value "{value}"')
+    if not value.is_finite():
+        raise ValidationError(f'Invalid value "{value}"')
+    validate_value(value)
+    return value
+
+
+class TransactionImportError(Exception):
+    def __init__(self, errors):
+        super().__init__('\n'.join(errors))
+        self.errors = errors
+
+
+class TransactionParser:
+    """Turns CSV rows into unsaved transactions of the wallet. Payment types and categories
+    are looked up by name."""
+
+    def __init__(self, wallet):
+        self.wallet = wallet
+        self.payment_types = {payment_type.name.lower(): payment_type
+                              for payment_type in wallet.paymenttype_set.all()}
+        self.categories = {category.name.lower(): category for category in wallet.category_set.all()}
+        self.timezone = timezone.get_current_timezone()
+        self.errors = []
+
+    def parse_row(self, row):
+        payment_type = self.payment_types.get((row['payment_type'] or '').strip().lower())
+        if payment_type is None:
+            raise ValidationError(f'Unknown payment type "{row["payment_type"]}"')
+        category = self.categories.get((row['category'] or '').strip().lower())
+        if category is None:
+            raise ValidationError(f'Unknown category "{row["category"]}"')
+
+        value = parse_value(row['value'])
+        if category.type == 'Expense':
+            value = -abs(value)
+        elif category.type == 'Income':
+            value = abs(value)
+
+        description = (row.get('description') or '').strip()
+        if len(description) > DESCRIPTION_LENGTH:
+            raise ValidationError(f'The description is longer than {DESCRIPTION_LENGTH} characters')
+
+        # The ledger needs only the category object, setting ids is cheaper
+        return Transaction(wallet_id=self.wallet.pk, payment_type_id=payment_type.pk, category=category,
+                           value=value, description=description, date=parse_date(row['date'], self.timezone))
+
+    def rows(self, reader):
+        """Rows of the reader up to the end of the file or a malformed line, which is an error"""
+        while True:
+            try:
+                row = next(reader)
+            except StopIteration:
+                return
+            except csv.Error as e:
+                # DictReader.line_num is only updated after a valid row
+                self.errors.append(f'Line {reader.reader.line_num}: {e}')
+                return
+            yield row
+
+    def batches(self, lines, batch_size=BATCH_SIZE):
+        """Lists of up to batch_size transactions. Raises TransactionImportError after the last
+        batch if any row was invalid or the file isn't valid CSV."""
+        reader = csv.DictReader(lines)
+        try:
+            fieldnames = reader.fieldnames
+        except csv.Error as e:
+            raise TransactionImportError([f'Line {reader.reader.line_num}: {e}'])
+        if fieldnames is None:
+            raise TransactionImportError(['The file is empty'])
+        reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+        missing = [column for column in REQUIRED_COLUMNS if column not in reader.fieldnames]
+        if missing:
+            raise TransactionImportError([f'Missing columns: {", ".join(missing)}'])
+
+        batch = []
+        for row in self.rows(reader):
+            try:
+                transaction = self.parse_row(row)
+            except ValidationError as e:
+                self.errors.append(f'Line {reader.line_num}: {" ".join(e.messages)}')
+                if len(self.errors) >= MAX_ERRORS:
+                    break
+                continue
+            if self.errors:
+                # Nothing will be saved, the rest of the file is only validated
+                continue
+            batch.append(transaction)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if self.errors:
+            raise TransactionImportError(self.errors)
+        if batch:
+            yield batch
+
+
+def import_transactions(wallet, lines, batch_size=BATCH_SIZE):
+    """Imports the CSV lines (a text file) into the wallet. Raises TransactionImportError with the
+    row errors if any row is invalid. Returns the number of imported transactions."""
+    return ledger.create_transactions(wallet.pk, TransactionParser(wallet).batches(lines, batch_size))
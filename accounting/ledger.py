@@ -0,0 +1,272 @@
+"""Balance ledger. Every write of transactions or balances goes through the operations below: each runs
+in one database transaction and applies balance deltas with UPDATE ... SET balance = balance + delta,
+so concurrent requests never lose updates and only the touched rows are locked.
+
+Rows are locked in the same order by every operation (transaction, payment types by id, categories by id,
+wallet summary, rollups), so concurrent operations can't deadlock. The wallet summary row serializes the bookkeeping
+of derived data within one wallet, including the balance checkpoints of back-dated transactions."""
+import csv
+import io
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import connections, router, transaction as db_transaction
+from django.db.models import F, Subquery
+
+from accounting import archive, balances, rollups, summaries, usage
+from accounting.models import Category, PaymentType, Transaction
+
+
+def apply_balance_deltas(deltas, usage_deltas=None):
+    """Adds {payment type id: delta} to the balances and {payment type id: (count, date)} to the usage
+    counters, one UPDATE per payment type in id order"""
+    usage_deltas = usage_deltas or {}
+    for payment_type_id in sorted(set(deltas) | set(usage_deltas)):
+        changes = usage.usage_changes(*usage_deltas[payment_type_id]) if payment_type_id in usage_deltas else {}
+        if deltas.get(payment_type_id):
+            changes['balance'] = F('balance') + deltas[payment_type_id]
+        if changes:
+            PaymentType.objects.filter(pk=payment_type_id).update(**changes)
+
+
+def _apply_deltas(balance_deltas, usage_deltas):
+    apply_balance_deltas(balance_deltas, usage_deltas.payment_types)
+    usage.apply_usage_deltas(Category, usage_deltas.categories)
+
+
+def _locked_transactions():
+    # Locking the category row as well would block every insert referencing it
+    return Transaction.objects.select_for_update(of=('self',)).select_related('category')
+
+
+def create_transaction(transaction):
+    with db_transaction.atomic():
+        transaction.save()
+        usage_deltas = usage.UsageDeltas()
+        usage_deltas.add(transaction)
+        _apply_deltas({transaction.payment_type_id: transaction.value}, usage_deltas)
+        record_transaction_created(transaction)
+    return transaction
+
+
+def _insert_transactions(transactions, copy=True):
+    """Bulk insert of new transactions, with COPY on PostgreSQL unless copy is False. Copied objects
+    don't get primary keys."""
+    connection = connections[router.db_for_write(Transaction)]
+    if not copy or connection.vendor != 'postgresql':
+        Transaction.objects.bulk_create(transactions)
+        return
+
+    columns = ('wallet_id', 'payment_type_id', 'category_id', 'value', 'description', 'date')
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for transaction in transactions:
+        writer.writerow([transaction.wallet_id, transaction.payment_type_id, transaction.category_id,
+                         transaction.value, transaction.description, transaction.date.isoformat()])
+    buffer.seek(0)
+
+    quote_name = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.copy_expert(f'COPY {quote_name(Transaction._meta.db_table)} '
+                           f'({", ".join(quote_name(column) for column in columns)}) FROM STDIN WITH (FORMAT csv)',
+                           buffer)
+
+
+def create_transactions(wallet_id, batches, set_pks=False):
+    """Inserts batches (lists) of new transactions of one wallet and applies the balances, the summary
+    and the rollups once at the end instead of once per transaction. With set_pks the objects get their
+    primary keys, at the cost of plain INSERTs instead of COPY. Returns the number of transactions."""
+    balance_deltas = defaultdict(Decimal)
+    usage_deltas = usage.UsageDeltas()
+    rollup_deltas = defaultdict(lambda: [Decimal(0), 0])
+    totals = {'income': Decimal(0), 'expense': Decimal(0), 'balance': Decimal(0), 'count': 0, 'date': None}
+    first_dates = {}
+
+    with db_transaction.atomic():
+        for batch in batches:
+            _insert_transactions(batch, copy=not set_pks)
+            for transaction in batch:
+                balance_deltas[transaction.payment_type_id] += transaction.value
+                usage_deltas.add(transaction)
+                rollup = rollup_deltas[transaction.category_id, transaction.payment_type_id,
+                                       rollups.month_of(transaction.date)]
+                rollup[0] += transaction.value
+                rollup[1] += 1
+                for key, value in _split(transaction).items():
+                    totals[key] += value
+                totals['balance'] += transaction.value
+                totals['count'] += 1
+                totals['date'] = max(totals['date'] or transaction.date, transaction.date)
+                first_dates[transaction.payment_type_id] = min(
+                    first_dates.get(transaction.payment_type_id, transaction.date), transaction.date)
+
+        if totals['count']:
+            _apply_deltas(balance_deltas, usage_deltas)
+            summaries.apply_summary_delta(wallet_id, **totals)
+            balances.invalidate_checkpoints(first_dates)
+            rollups.add_to_rollups(wallet_id, rollup_deltas)
+    return totals['count']
+
+
+def update_transaction(transaction):
+    """Saves the changed transaction and moves the balance from its stored state"""
+    with db_transaction.atomic():
+        old_transaction = _locked_transactions().get(pk=transaction.pk)
+        transaction.save()
+
+        deltas = defaultdict(Decimal)
+        deltas[old_transaction.payment_type_id] -= old_transaction.value
+        deltas[transaction.payment_type_id] += transaction.value
+        usage_deltas = usage.UsageDeltas()
+        usage_deltas.add(old_transaction, sign=-1)
+        usage_deltas.add(transaction)
+        _apply_deltas(deltas, usage_deltas)
+        record_transaction_updated(old_transaction, transaction)
+    return transaction
+
+
+def delete_transaction(transaction):
+    """Deletes the transaction and subtracts its stored value. Returns False if it was already deleted."""
+    with db_transaction.atomic():
+        transaction = _locked_transactions().filter(pk=transaction.pk).first()
+        if transaction is None:
+            return False
+        Transaction.objects.filter(pk=transaction.pk).delete()
+
+        usage_deltas = usage.UsageDeltas()
+        usage_deltas.add(transaction, sign=-1)
+        _apply_deltas({transaction.payment_type_id: -transaction.value}, usage_deltas)
+        record_transaction_deleted(transaction)
+    return True
+
+
+def transfer(wallet, payment_type_from, payment_type_to, value, description=''):
+    """Moves the value between payment types as a pair of Transfer transactions"""
+    value = abs(value)
+    category = wallet.category_set.get(name='Transfer')
+    description = f'Transfer from "{payment_type_from.name}" to "{payment_type_to.name}"\n{description}'
+    transactions = [
+        Transaction(wallet=wallet, payment_type=payment_type_from, category=category, value=-value,
+                    description=description),
+        Transaction(wallet=wallet, payment_type=payment_type_to, category=category, value=value,
+                    description=description),
+    ]
+
+    with db_transaction.atomic():
+        usage_deltas = usage.UsageDeltas()
+        for transaction in transactions:
+            transaction.save()
+            usage_deltas.add(transaction)
+        _apply_deltas({payment_type_from.pk: -value, payment_type_to.pk: value}, usage_deltas)
+        for transaction in transactions:
+            record_transaction_created(transaction)
+    return transactions
+
+
+def create_payment_type(payment_type):
+    payment_type.opening_balance = payment_type.balance
+    with db_transaction.atomic():
+        payment_type.save()
+        record_balance_changed(payment_type.wallet_id, payment_type.balance)
+    return payment_type
+
+
+def _split(transaction, sign=1):
+    """Income and expense parts of the transaction value"""
+    value = transaction.value * sign
+    category_type = transaction.category.type
+    return {
+        'income': value if category_type == 'Income' else 0,
+        'expense': value if category_type == 'Expense' else 0,
+    }
+
+
+def record_transaction_created(transaction):
+    summaries.apply_summary_delta(transaction.wallet_id, balance=transaction.value, count=1,
+                                  date=transaction.date, **_split(transaction))
+    balances.invalidate_checkpoints({transaction.payment_type_id: transaction.date})
+    rollups.add_transaction(transaction)
+
+
+def record_transaction_updated(old_transaction, transaction):
+    income_expense = _split(transaction)
+    for key, value in _split(old_transaction, sign=-1).items():
+        income_expense[key] += value
+
+    summaries.apply_summary_delta(transaction.wallet_id, balance=transaction.value - old_transaction.value,
+                                  **income_expense)
+    if transaction.date != old_transaction.date:
+        summaries.refresh_last_transaction_date(transaction.wallet_id)
+    if (transaction.value, transaction.date, transaction.payment_type_id) != (
+            old_transaction.value, old_transaction.date, old_transaction.payment_type_id):
+        dates = {old_transaction.payment_type_id: old_transaction.date}
+        dates[transaction.payment_type_id] = min(dates.get(transaction.payment_type_id, transaction.date),
+                                                 transaction.date)
+        balances.invalidate_checkpoints(dates)
+    rollups.add_transaction(old_transaction, sign=-1)
+    rollups.add_transaction(transaction)
+
+
+def record_transaction_deleted(transaction):
+    summaries.apply_summary_delta(transaction.wallet_id, balance=-transaction.value, count=-1,
+                                  **_split(transaction, sign=-1))
+    summaries.refresh_last_transaction_date(transaction.wallet_id)
+    balances.invalidate_checkpoints({transaction.payment_type_id: transaction.date})
+    rollups.add_transaction(transaction, sign=-1)
+
+
+def record_balance_changed(wallet_id, delta):
+    """Balance change not caused by a transaction, e.g. the initial balance of a new payment type"""
+    summaries.apply_summary_delta(wallet_id, balance=delta)
+
+
+def record_transactions_moved(wallet_id, field, old_id, new_id):
+    """Transactions moved from one payment type or category (field) to another of the same type.
+    Wallet totals are unchanged."""
+    rollups.move_rollups(wallet_id, field, old_id, new_id)
+    archive.move_archived(wallet_id, field, old_id, new_id)
+    summaries.bump_version(wallet_id)
+    if field == 'payment_type':
+        balances.invalidate_checkpoints({old_id: None, new_id: None})
+
+
+def record_wallet_changed(wallet_id):
+    """Change that doesn't affect the totals, e.g. a renamed category"""
+    summaries.bump_version(wallet_id)
+
+
+def move_transactions(source, target, chunk_size=None, progress=None):
+    """Moves all transactions of a payment type or category (source) to another one (target),
+    together with the payment type balance and the usage counters. Runs as one atomic UPDATE, or with chunk_size as
+    short transactions of that many rows (safe to resume) calling progress(moved, total) after each.
+    Returns the number of moved transactions."""
+    field = 'payment_type' if isinstance(source, PaymentType) else 'category'
+    transactions = Transaction.objects.filter(wallet_id=source.wallet_id, **{field: source})
+
+    moved = 0
+    if chunk_size:
+        total = transactions.count()
+        last_pk = 0
+        while True:
+            pks = list(transactions.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:chunk_size])
+            if not pks:
+                break
+            with db_transaction.atomic():
+                moved += Transaction.objects.filter(pk__in=pks, **{field: source}).update(**{field: target})
+            last_pk = pks[-1]
+            if progress:
+                progress(moved, total)
+
+    with db_transaction.atomic():
+        moved += transactions.update(**{field: target})
+        if field == 'payment_type':
+            # The opening balance becomes NULL if either is unknown, see accounting.reconciliation
+            source_balances = PaymentType.objects.filter(pk=source.pk)
+            PaymentType.objects.filter(pk=target.pk).update(
+                balance=F('balance') + Subquery(source_balances.values('balance')),
+                opening_balance=F('opening_balance') + Subquery(source_balances.values('opening_balance')))
+            PaymentType.objects.filter(pk=source.pk).update(balance=0, opening_balance=0)
+            source.balance = source.opening_balance = 0
+        usage.move_usage(source, target)
+        record_transactions_moved(source.wallet_id, field, source.pk, target.pk)
+    return moved
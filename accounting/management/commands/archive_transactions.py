@@ -0,0 +1,38 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from accounting.archive import BATCH_SIZE, archive_horizon, archive_transactions
+from accounting.models import Wallet
+
+
+class Command(BaseCommand):
+    help = 'Moves old transactions to the archive, keeping balances, summaries and reports. ' \
+           'By default those before the month ARCHIVE_AFTER_DAYS ago.'
+
+    def add_arguments(self, parser):
+        group = parser.add_mutually_exclusive_group()
+        group.add_argument('--days', type=int, help='Archive before the month this many days ago')
+        group.add_argument('--before', help='Archive before this date, YYYY-MM-DD')
+        parser.add_argument('--wallet', type=int, nargs='+', dest='wallets', help='Wallet ids (all by default)')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if options['before']:
+            try:
+                before = timezone.make_aware(datetime.strptime(options['before'], '%Y-%m-%d'))
+            except ValueError:
+                raise CommandError('--before must be a date, YYYY-MM-DD')
+        else:
+            before = archive_horizon(options['days'])
+
+        wallets = Wallet.objects.all()
+        if options['wallets']:
+            wallets = wallets.filter(pk__in=options['wallets'])
+
+        def progress(wallet_id, archived):
+            self.stdout.write(f'Wallet {wallet_id}: {archived} transactions archived')
+
+        archived = archive_transactions(before, wallets, batch_size=options['batch_size'], progress=progress)
+        self.stdout.write(self.style.SUCCESS(f'Archived {archived} transactions before {before:%Y-%m-%d}'))
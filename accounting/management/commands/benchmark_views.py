@@ -0,0 +1,55 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounting.benchmarks import REPEAT, SIZES, TOLERANCE, compare, run_benchmarks
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks every view against synthetic wallets of several sizes and compares the results ' \
+           'with a baseline. Generates the wallets on first use, run it against a development database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help='Transactions per wallet')
+        parser.add_argument('--repeat', type=int, default=REPEAT, help='Measured requests per view')
+        parser.add_argument('--warm', action='store_true', help="Don't clear the cache before the requests")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--asgi', action='store_true',
+                            help='Request through the ASGI handler, set IAE_ASYNC_VIEWS=1 for the async views')
+        parser.add_argument('--output', help='JSON file for the results')
+        parser.add_argument('--baseline', help='JSON results to compare with, fails on regressions')
+        parser.add_argument('--tolerance', type=float, default=TOLERANCE,
+                            help='Allowed p95 latency increase over the baseline (0.2 = 20%%)')
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError('--repeat must be at least 1')
+        baseline = None
+        if options['baseline']:
+            try:
+                with open(options['baseline'], encoding='utf-8') as file:
+                    baseline = json.load(file)
+            except (OSError, ValueError) as e:
+                raise CommandError(e)
+
+        self.stdout.write(f'{"size":>8} {"view":<36} {"status":>6} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} '
+                          f'{"queries":>7} {"sql ms":>9} {"peak KB":>8}')
+        results = run_benchmarks(options['sizes'], options['repeat'], options['warm'], options['seed'],
+                                 options['asgi'], progress=self.write_row)
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(results, file, indent=2)
+            self.stdout.write(f'Results written to {options["output"]}')
+
+        if baseline is not None:
+            regressions = compare(results, baseline, options['tolerance'])
+            if regressions:
+                raise CommandError('Regressions against the baseline:\n' + '\n'.join(
+                    f'{size} {name}: {metric} {old} -> {new}' for size, name, metric, old, new in regressions))
+            self.stdout.write(self.style.SUCCESS('No regressions against the baseline'))
+
+    def write_row(self, size, name, metrics):
+        self.stdout.write(f'{size:>8} {name:<36} {metrics["status"]:>6} {metrics["p50_ms"]:>9.2f} '
+                          f'{metrics["p95_ms"]:>9.2f} {metrics["p99_ms"]:>9.2f} {metrics["queries"]:>7} '
+                          f'{metrics["sql_ms"]:>9.2f} {metrics["peak_memory_kb"]:>8}')
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from accounting.balances import build_checkpoints
+from accounting.models import Wallet
+
+
+class Command(BaseCommand):
+    help = 'Adds the daily balance checkpoints of the payment types up to yesterday. Run it nightly, ' \
+           'it continues from the last checkpoints and rebuilds the ones deleted by back-dated transactions.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--wallet', type=int, nargs='+', dest='wallets', help='Wallet ids (all by default)')
+
+    def handle(self, *args, **options):
+        wallets = Wallet.objects.all()
+        if options['wallets']:
+            wallets = wallets.filter(pk__in=options['wallets'])
+
+        def progress(wallet_id, created):
+            if created:
+                self.stdout.write(f'Wallet {wallet_id}: {created} checkpoints')
+
+        created = build_checkpoints(wallets, progress=progress)
+        self.stdout.write(self.style.SUCCESS(f'Created {created} balance checkpoints'))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounting.partitions import PartitionError, create_partitions
+
+
+class Command(BaseCommand):
+    help = 'Creates the partitions of the transaction table for the coming months or years, ' \
+           'e.g. daily from a scheduler'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ahead', type=int, default=3, help='Future partitions to keep (default 3)')
+
+    def handle(self, *args, **options):
+        try:
+            partitions = create_partitions(ahead=options['ahead'])
+        except PartitionError as e:
+            raise CommandError(e)
+        for partition in partitions:
+            self.stdout.write(f'Created {partition.name}')
+        self.stdout.write(self.style.SUCCESS(f'Created {len(partitions)} partitions'))
@@ -0,0 +1,28 @@
+from datetime import datetime, timezone
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounting.partitions import PartitionError, detach_partitions
+
+
+class Command(BaseCommand):
+    help = 'Detaches the partitions of the transaction table that end before a date. Their transactions ' \
+           'disappear from the pages and from rebuilt summaries.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--before', required=True, help='Date, YYYY-MM-DD')
+        parser.add_argument('--drop', action='store_true', help='Drop the detached tables')
+
+    def handle(self, *args, **options):
+        try:
+            before = datetime.strptime(options['before'], '%Y-%m-%d').replace(tzinfo=timezone.utc)
+        except ValueError:
+            raise CommandError('--before must be a date, YYYY-MM-DD')
+        try:
+            partitions = detach_partitions(before, drop=options['drop'])
+        except PartitionError as e:
+            raise CommandError(e)
+        for partition in partitions:
+            self.stdout.write(f'{"Dropped" if options["drop"] else "Detached"} {partition.name}')
+        self.stdout.write(self.style.SUCCESS(f'{"Dropped" if options["drop"] else "Detached"} '
+                                             f'{len(partitions)} partitions'))
@@ -0,0 +1,71 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count, Q, Sum
+
+from accounting.filters import TransactionFilter
+from accounting.models import Category, PaymentType, Wallet
+from accounting.pagination import decode_cursor, paginate_by_cursor
+from accounting.summaries import EXPENSE, INCOME
+
+
+class Command(BaseCommand):
+    help = "Prints the EXPLAIN plans of the views' hot queries for one wallet"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--wallet', type=int, help='Wallet id (the one with most transactions by default)')
+        parser.add_argument('--analyze', action='store_true', help='EXPLAIN ANALYZE (PostgreSQL only)')
+        parser.add_argument('--timing', action='store_true', help='Also run every query and print its duration')
+
+    @staticmethod
+    def get_queries(wallet):
+        """(name, queryset) pairs mirroring the queries of the views"""
+        transactions = wallet.transaction_set.order_by('-date', '-id')
+        category = wallet.category_set.exclude(service=True).first()
+        payment_type = wallet.paymenttype_set.first()
+
+        def filtered(**params):
+            return TransactionFilter(params, queryset=transactions).qs
+
+        queries = [
+            ('Main: last transactions', transactions[:5]),
+            ('Main: category choices', Category.objects.filter(wallet=wallet).order_by('-usage_count')),
+            ('Main: payment type choices', PaymentType.objects.filter(wallet=wallet).order_by('-usage_count')),
+            ('Transactions: first page', transactions[:51]),
+            ('Transactions: filter by category', filtered(category=[category.pk])[:51]),
+            ('Transactions: filter by payment type', filtered(payment_type=[payment_type.pk])[:51]),
+            ('Transactions: filter by value range', filtered(value__gte='100', value__lte='500')[:51]),
+            ('Transactions: filter by date range', filtered(date__gte='2020-01-01', date__lte='2020-12-31')[:51]),
+            ('Transactions: filter by description', filtered(description='shop')[:51]),
+            ('Transactions: filtered totals', filtered(category=[category.pk]).order_by().values('wallet').annotate(
+                income_sum=Sum('value', filter=INCOME), expense_sum=Sum('value', filter=EXPENSE))),
+            ('DeletePaymentType: reassigned transactions', wallet.transaction_set.filter(payment_type=payment_type)),
+            ('DeleteCategory: reassigned transactions', wallet.transaction_set.filter(category=category)),
+        ]
+
+        page = paginate_by_cursor(transactions, 50)
+        if page.next_cursor:
+            _, (date, pk) = decode_cursor(page.next_cursor)
+            queries.insert(4, ('Transactions: next page',
+                               transactions.filter(Q(date__lt=date) | Q(date=date, pk__lt=pk))[:51]))
+        return queries
+
+    def handle(self, *args, **options):
+        if options['wallet']:
+            wallet = Wallet.objects.filter(pk=options['wallet']).first()
+        else:
+            wallet = Wallet.objects.annotate(count=Count('transaction')).order_by('-count').first()
+        if wallet is None:
+            raise CommandError('Wallet not found')
+
+        explain_options = {'analyze': True} if options['analyze'] else {}
+        self.stdout.write(f'{connection.vendor}, wallet {wallet.pk}, {wallet.transaction_set.count()} transactions\n')
+        for name, queryset in self.get_queries(wallet):
+            self.stdout.write(f'{name}:')
+            self.stdout.write(queryset.explain(**explain_options))
+            if options['timing']:
+                start = time.perf_counter()
+                list(queryset)
+                self.stdout.write(f'Time: {(time.perf_counter() - start) * 1000:.1f} ms')
+            self.stdout.write('')
@@ -0,0 +1,55 @@
+import time
+from datetime import datetime, timezone
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from accounting.imports import BATCH_SIZE
+from accounting.synthetic import END, WORDS, generate_wallets
+
+
+class Command(BaseCommand):
+    help = 'Generates users with synthetic wallets for profiling. The same seed and options generate the same data.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1)
+        parser.add_argument('--payment-types', type=int, default=4, help='Payment types per wallet')
+        parser.add_argument('--categories', type=int, default=15, help='Income and expense categories per wallet')
+        parser.add_argument('--transactions', type=int, default=10000, help='Transactions per wallet')
+        parser.add_argument('--days', type=int, default=5 * 365, help='Date span of the transactions')
+        parser.add_argument('--end', type=datetime.fromisoformat, default=END,
+                            help=f'Date of the last transactions, {END.date()} by default')
+        parser.add_argument('--income-share', type=float, default=0.1, help='Share of income transactions')
+        parser.add_argument('--vocabulary', help='File with the description words, one per line')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--prefix', default='synthetic', help='User names are <prefix>-1 ... <prefix>-N')
+        parser.add_argument('--password', help='Password of the users, unusable by default')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if options['payment_types'] < 1 or options['categories'] < 1:
+            raise CommandError('Wallets need at least one payment type and category')
+        if not 0 <= options['income_share'] <= 1:
+            raise CommandError('The income share must be between 0 and 1')
+        names = [f'{options["prefix"]}-{number}' for number in range(1, options['users'] + 1)]
+        if get_user_model().objects.filter(username__in=names).exists():
+            raise CommandError(f'Users {options["prefix"]}-* already exist, choose another --prefix')
+
+        words = WORDS
+        if options['vocabulary']:
+            try:
+                with open(options['vocabulary'], encoding='utf-8') as file:
+                    words = [line.strip() for line in file if line.strip()]
+            except OSError as e:
+                raise CommandError(e)
+        end = options['end'] if options['end'].tzinfo else options['end'].replace(tzinfo=timezone.utc)
+
+        start = time.perf_counter()
+        wallets = generate_wallets(
+            users=options['users'], prefix=options['prefix'], password=options['password'], seed=options['seed'],
+            payment_types=options['payment_types'], categories=options['categories'],
+            transactions=options['transactions'], days=options['days'], end=end,
+            income_share=options['income_share'], words=words, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {len(wallets)} wallets with {len(wallets) * options["transactions"]} transactions '
+            f'in {time.perf_counter() - start:.1f} s (wallet ids {", ".join(str(wallet.pk) for wallet in wallets)})'))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounting.imports import BATCH_SIZE, TransactionImportError, import_transactions
+from accounting.models import Wallet
+
+
+class Command(BaseCommand):
+    help = 'Imports transactions into a wallet from a CSV file with the columns ' \
+           'date, payment_type, category, value, description'
+
+    def add_arguments(self, parser):
+        parser.add_argument('file')
+        parser.add_argument('--wallet', type=int, required=True, help='Wallet id')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        wallet = Wallet.objects.filter(pk=options['wallet']).first()
+        if wallet is None:
+            raise CommandError('Wallet not found')
+
+        try:
+            with open(options['file'], encoding='utf-8-sig', newline='') as lines:
+                imported = import_transactions(wallet, lines, batch_size=options['batch_size'])
+        except OSError as e:
+            raise CommandError(e)
+        except TransactionImportError as e:
+            raise CommandError(f'Nothing imported:\n{e}')
+        except UnicodeDecodeError:
+            raise CommandError('Nothing imported: the file must be UTF-8 encoded')
+        self.stdout.write(self.style.SUCCESS(f'Imported {imported} transactions'))
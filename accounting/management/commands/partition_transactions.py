@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounting.partitions import INTERVALS, PartitionError, partition_table
+
+
+class Command(BaseCommand):
+    help = 'Converts the transaction table into a PostgreSQL table partitioned by date. ' \
+           'Locks the table while it copies every row.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', choices=INTERVALS, default='month')
+        parser.add_argument('--ahead', type=int, default=3, help='Future partitions to create (default 3)')
+
+    def handle(self, *args, **options):
+        try:
+            partitions = partition_table(options['interval'], ahead=options['ahead'])
+        except PartitionError as e:
+            raise CommandError(e)
+        self.stdout.write(self.style.SUCCESS(f'Partitioned transactions into {len(partitions)} partitions '
+                                             f'from {partitions[0].start:%Y-%m-%d} to {partitions[-1].end:%Y-%m-%d}'))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounting import ledger
+from accounting.models import Category, PaymentType
+
+
+class Command(BaseCommand):
+    help = 'Moves all transactions of a payment type or category to another one in chunks, ' \
+           'e.g. before deleting a payment type or category with a large history'
+
+    def add_arguments(self, parser):
+        group = parser.add_mutually_exclusive_group(required=True)
+        group.add_argument('--payment-type', type=int, nargs=2, metavar=('SOURCE', 'TARGET'))
+        group.add_argument('--category', type=int, nargs=2, metavar=('SOURCE', 'TARGET'))
+        parser.add_argument('--chunk-size', type=int, default=10000)
+        parser.add_argument('--delete', action='store_true', help='Delete the source afterwards')
+
+    def handle(self, *args, **options):
+        model, (source_id, target_id) = (PaymentType, options['payment_type']) if options['payment_type'] \
+            else (Category, options['category'])
+        try:
+            source = model.objects.get(pk=source_id)
+            target = model.objects.get(pk=target_id, wallet_id=source.wallet_id)
+        except model.DoesNotExist:
+            raise CommandError(f'{model.__name__} not found in the same wallet')
+        if model is Category and source.type != target.type:
+            raise CommandError('Categories have different types')
+
+        def progress(moved, total):
+            self.stdout.write(f'{moved}/{total} transactions moved')
+
+        moved = ledger.move_transactions(source, target, chunk_size=options['chunk_size'], progress=progress)
+        if options['delete']:
+            source.delete()
+        self.stdout.write(self.style.SUCCESS(f'Moved {moved} transactions from "{source}" to "{target}"'))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from accounting.models import Wallet
+from accounting.rollups import rebuild_monthly_rollups
+
+
+class Command(BaseCommand):
+    help = 'Regenerates monthly per-category rollups from transactions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--wallet', type=int, nargs='+', dest='wallets', help='Wallet ids (all by default)')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        wallets = Wallet.objects.all()
+        if options['wallets']:
+            wallets = wallets.filter(pk__in=options['wallets'])
+
+        created = rebuild_monthly_rollups(wallets, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {created} monthly rollups'))
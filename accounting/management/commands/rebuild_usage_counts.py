@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from accounting.models import Wallet
+from accounting.usage import rebuild_usage
+
+
+class Command(BaseCommand):
+    help = 'Recomputes usage counts and last use dates of categories and payment types from transactions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--wallet', type=int, nargs='+', dest='wallets', help='Wallet ids (all by default)')
+
+    def handle(self, *args, **options):
+        wallets = Wallet.objects.all()
+        if options['wallets']:
+            wallets = wallets.filter(pk__in=options['wallets'])
+
+        updated = rebuild_usage(wallets)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt usage counts of {updated} categories and payment types'))
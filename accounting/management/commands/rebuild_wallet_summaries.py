@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from accounting.models import Wallet
+from accounting.summaries import rebuild_wallet_summaries
+
+
+class Command(BaseCommand):
+    help = 'Regenerates wallet summaries from payment types and transactions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--wallet', type=int, nargs='+', dest='wallets', help='Wallet ids (all by default)')
+        parser.add_argument('--missing', action='store_true',
+                            help='Only wallets without a summary, created before summaries existed')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        wallets = Wallet.objects.all()
+        if options['wallets']:
+            wallets = wallets.filter(pk__in=options['wallets'])
+        if options['missing']:
+            wallets = wallets.filter(summary__isnull=True)
+
+        rebuilt = rebuild_wallet_summaries(wallets, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rebuilt} wallet summaries'))
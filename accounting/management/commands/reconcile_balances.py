@@ -0,0 +1,43 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from accounting.models import Wallet
+from accounting.reconciliation import CHUNK_SIZE, FULL_RUN_INTERVAL, reconcile
+
+
+class Command(BaseCommand):
+    help = 'Compares the payment type balances with their opening balances plus their transactions ' \
+           'and reports the drift. --fix corrects the balances and the wallet summaries.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--wallet', type=int, nargs='+', dest='wallets', help='Wallet ids (all by default)')
+        parser.add_argument('--incremental', action='store_true',
+                            help='Only the wallets changed through the ledger since the last run, all of them '
+                                 'when the last full run is older than --full-run-days')
+        parser.add_argument('--full-run-days', type=int, default=FULL_RUN_INTERVAL.days,
+                            help='Days between full runs of incremental runs')
+        parser.add_argument('--fix', action='store_true', help='Set the drifted balances to the expected ones')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Wallets per query')
+        parser.add_argument('--workers', type=int, default=1, help='Chunks checked at the same time')
+
+    def handle(self, *args, **options):
+        wallets = Wallet.objects.all()
+        if options['wallets']:
+            wallets = wallets.filter(pk__in=options['wallets'])
+
+        def progress(checked, total, drift):
+            for row in drift:
+                self.stdout.write(f'Wallet {row["wallet_id"]}, payment type {row["pk"]} "{row["name"]}": '
+                                  f'balance {row["balance"]:.2f}, expected {row["expected"]:.2f}, '
+                                  f'drift {row["balance"] - row["expected"]:.2f}')
+            self.stdout.write(f'{checked}/{total} wallets checked')
+
+        run = reconcile(wallets, incremental=options['incremental'], fix=options['fix'],
+                        chunk_size=options['chunk_size'], workers=options['workers'], progress=progress,
+                        full_run_interval=timedelta(days=options['full_run_days']))
+        message = f'{run.drifted} drifted payment types in {run.wallets} wallets'
+        if options['fix']:
+            message += f', {run.fixed} fixed'
+        self.stdout.write(self.style.SUCCESS(message) if not run.drifted or run.fixed == run.drifted
+                          else self.style.WARNING(message))
@@ -0,0 +1,144 @@
+import logging
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+from accounting.routers import SAFE_METHODS, ReadRouting, choose_database, pin_to_primary, read_routing
+
+logger = logging.getLogger(__name__)
+
+# QueryStats of the current request (and of an enclosing measurement), for queries run on other
+# threads' connections by the async views
+active_query_stats = ContextVar('active_query_stats', default=())
+
+
+class QueryStats:
+    """Database execute wrapper counting the queries and their total time"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            with self.lock:
+                self.count += 1
+                self.duration += time.perf_counter() - start
+
+
+@contextmanager
+def count_queries(*stats):
+    """Counts the queries run on this thread's connections in every QueryStats"""
+    with ExitStack() as stack:
+        for connection in connections.all():
+            for item in stats:
+                stack.enter_context(connection.execute_wrapper(item))
+        yield
+
+
+@contextmanager
+def track_queries(stats):
+    """Counts the queries of this thread and of the reads started from this context in stats"""
+    token = active_query_stats.set((*active_query_stats.get(), stats))
+    try:
+        with count_queries(stats):
+            yield stats
+    finally:
+        active_query_stats.reset(token)
+
+
+def get_query_budget(request):
+    """query_budget of the class-based view that handled the request"""
+    resolver_match = getattr(request, 'resolver_match', None)
+    view_class = getattr(getattr(resolver_match, 'func', None), 'view_class', None)
+    return getattr(view_class, 'query_budget', None)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryBudgetMiddleware:
+    """Records query count and SQL time of every request in request.query_stats and the
+    Server-Timing header, and logs a warning when the view exceeds its query_budget, or raises
+    QueryBudgetExceeded with QUERY_BUDGET_STRICT"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with track_queries(QueryStats()) as stats:
+            response = self.get_response(request)
+        return self.record(request, response, stats)
+
+    async def __acall__(self, request):
+        with track_queries(QueryStats()) as stats:
+            response = await self.get_response(request)
+        return self.record(request, response, stats)
+
+    def record(self, request, response, stats):
+        request.query_stats = stats
+        response['Server-Timing'] = f'db;desc="{stats.count} queries";dur={stats.duration * 1000:.1f}'
+
+        budget = get_query_budget(request)
+        if budget is not None and stats.count > budget:
+            if settings.QUERY_BUDGET_STRICT:
+                raise QueryBudgetExceeded(f'{request.method} {request.path} ran {stats.count} queries, '
+                                          f'the budget is {budget}')
+            logger.warning('%s %s ran %d queries, the budget is %d', request.method, request.path,
+                           stats.count, budget)
+        return response
+
+
+class ReplicaMiddleware:
+    """Sends the reads of read-only views to a replica and keeps clients on the primary after their
+    writes, see accounting.routers"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = read_routing.set(ReadRouting())
+        try:
+            response = self.get_response(request)
+        finally:
+            read_routing.reset(token)
+        return self.record(request, response)
+
+    async def __acall__(self, request):
+        token = read_routing.set(ReadRouting())
+        try:
+            response = await self.get_response(request)
+        finally:
+            read_routing.reset(token)
+        return self.record(request, response)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.read_database = choose_database(request, getattr(view_func, 'view_class', None))
+        read_routing.get().database = request.read_database
+
+    def record(self, request, response):
+        if settings.REPLICA_DATABASES and request.method not in SAFE_METHODS:
+            pin_to_primary(response)
+        return response
@@ -1,3 +1,5 @@
+import uuid
+
 from django.db import models
 from django.conf import settings
 from django.utils import timezone
@@ -5,6 +7,8 @@ from django.utils import timezone
 
 class Wallet(models.Model):
     owner = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    # Transactions before this date are in ArchivedTransaction, see accounting.archive
+    archived_until = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return f'{self.owner.pk} - {self.owner} wallet'
@@ -14,6 +18,11 @@ class PaymentType(models.Model):
     wallet = models.ForeignKey(Wallet, on_delete=models.CASCADE)
     name = models.CharField(max_length=100)
     balance = models.DecimalField(default=0, max_digits=16, decimal_places=2)
+    # Balance before any transaction, NULL until accounting.reconciliation sets it for older payment types
+    opening_balance = models.DecimalField(null=True, blank=True, max_digits=16, decimal_places=2)
+    # Maintained by accounting.ledger, see accounting.usage
+    usage_count = models.PositiveIntegerField(default=0)
+    last_used = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return self.name
@@ -22,6 +31,9 @@ class PaymentType(models.Model):
         constraints = [
             models.UniqueConstraint(fields=['wallet', 'name'], name='unique_name_for_payment_type')
         ]
+        indexes = [
+            models.Index(fields=['wallet', '-usage_count'], name='payment_type_usage_idx'),
+        ]
 
 
 class Category(models.Model):
@@ -33,6 +45,9 @@ class Category(models.Model):
     wallet = models.ForeignKey(Wallet, on_delete=models.CASCADE)
     type = models.CharField(max_length=10, choices=transition_types)
     service = models.BooleanField(default=False)
+    # Maintained by accounting.ledger, see accounting.usage
+    usage_count = models.PositiveIntegerField(default=0)
+    last_used = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return self.name
@@ -41,6 +56,9 @@ class Category(models.Model):
         constraints = [
             models.UniqueConstraint(fields=['wallet', 'name'], name='unique_name_for_category')
         ]
+        indexes = [
+            models.Index(fields=['wallet', '-usage_count'], name='category_usage_idx'),
+        ]
 
 
 class Transaction(models.Model):
@@ -53,3 +71,117 @@ class Transaction(models.Model):
 
     def __str__(self):
         return f'{self.wallet}: {self.category} - {self.value} ({self.description})'
+
+    class Meta:
+        indexes = [
+            # Lists are filtered by wallet and ordered by (-date, -id), see accounting.pagination
+            models.Index(fields=['wallet', '-date', '-id'], name='transaction_wallet_date_idx'),
+            models.Index(fields=['wallet', 'category', '-date', '-id'], name='transaction_wallet_cat_idx'),
+            models.Index(fields=['wallet', 'payment_type', '-date', '-id'], name='transaction_wallet_pt_idx'),
+            models.Index(fields=['wallet', 'value'], name='transaction_wallet_value_idx'),
+        ]
+
+
+class WalletSummary(models.Model):
+    """Wallet totals maintained incrementally by accounting.ledger"""
+    wallet = models.OneToOneField(Wallet, on_delete=models.CASCADE, related_name='summary')
+    income_all_time = models.DecimalField(default=0, max_digits=16, decimal_places=2)
+    expense_all_time = models.DecimalField(default=0, max_digits=16, decimal_places=2)
+    balance = models.DecimalField(default=0, max_digits=16, decimal_places=2)
+    transaction_count = models.PositiveBigIntegerField(default=0)
+    last_transaction_date = models.DateTimeField(null=True, blank=True)
+    # Replaced by every write to the wallet, see accounting.wallet_cache and summaries.new_version
+    version = models.UUIDField(default=uuid.uuid4)
+    modified = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f'{self.wallet} summary'
+
+
+class MonthlyRollup(models.Model):
+    """Sum and count of the wallet transactions per category, payment type and month"""
+    wallet = models.ForeignKey(Wallet, on_delete=models.CASCADE)
+    category = models.ForeignKey(Category, on_delete=models.CASCADE)
+    payment_type = models.ForeignKey(PaymentType, on_delete=models.CASCADE)
+    month = models.DateField()
+    total = models.DecimalField(default=0, max_digits=16, decimal_places=2)
+    count = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.wallet}: {self.month:%Y-%m} {self.category} / {self.payment_type} - {self.total}'
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['wallet', 'month', 'category', 'payment_type'],
+                                    name='unique_monthly_rollup')
+        ]
+
+
+class ArchivedTransaction(models.Model):
+    """Transaction moved out of the transaction table by accounting.archive. Read only, it keeps its id."""
+    id = models.BigIntegerField(primary_key=True)
+    wallet = models.ForeignKey(Wallet, on_delete=models.CASCADE, db_index=False)
+    payment_type = models.ForeignKey(PaymentType, on_delete=models.CASCADE)
+    category = models.ForeignKey(Category, on_delete=models.CASCADE)
+    value = models.DecimalField(max_digits=16, decimal_places=2)
+    description = models.CharField(max_length=255, null=True, blank=True)
+    date = models.DateTimeField()
+
+    def __str__(self):
+        return f'{self.wallet}: {self.category} - {self.value} ({self.description}, archived)'
+
+    class Meta:
+        indexes = [
+            # The archive is only paged through, filters scan the wallet's rows
+            models.Index(fields=['wallet', '-date', '-id'], name='archived_wallet_date_idx'),
+        ]
+
+
+class CarryForward(models.Model):
+    """Sum, count and latest date of the archived transactions per category, payment type and month.
+    Rebuilds of the summaries, rollups and usage counters add them to the transactions."""
+    wallet = models.ForeignKey(Wallet, on_delete=models.CASCADE)
+    category = models.ForeignKey(Category, on_delete=models.CASCADE)
+    payment_type = models.ForeignKey(PaymentType, on_delete=models.CASCADE)
+    month = models.DateField()
+    total = models.DecimalField(default=0, max_digits=16, decimal_places=2)
+    count = models.BigIntegerField(default=0)
+    last_date = models.DateTimeField()
+
+    def __str__(self):
+        return f'{self.wallet}: {self.month:%Y-%m} {self.category} / {self.payment_type} - {self.total} (archived)'
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['wallet', 'month', 'category', 'payment_type'],
+                                    name='unique_carry_forward')
+        ]
+
+
+class BalanceCheckpoint(models.Model):
+    """Balance of the payment type after its transactions dated before until, see accounting.balances"""
+    payment_type = models.ForeignKey(PaymentType, on_delete=models.CASCADE)
+    until = models.DateTimeField()
+    balance = models.DecimalField(max_digits=16, decimal_places=2)
+
+    def __str__(self):
+        return f'{self.payment_type} before {self.until:%Y-%m-%d}: {self.balance}'
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['payment_type', 'until'], name='unique_balance_checkpoint')
+        ]
+
+
+class ReconciliationRun(models.Model):
+    """Run of accounting.reconciliation, incremental runs check the wallets changed since the last one started"""
+    started = models.DateTimeField(default=timezone.now)
+    finished = models.DateTimeField(null=True, blank=True)
+    incremental = models.BooleanField(default=False)
+    # Checked wallets, drifted and fixed payment types
+    wallets = models.PositiveIntegerField(default=0)
+    drifted = models.PositiveIntegerField(default=0)
+    fixed = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f'Reconciliation {self.started:%Y-%m-%d %H:%M}: {self.drifted} drifted payment types'
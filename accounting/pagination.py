@@ -0,0 +1,111 @@
+from datetime import datetime
+
+from django.db.models import Q
+from django.http import Http404
+from django.utils.encoding import force_str
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+# Descending keys of the keysets: newest first, or most relevant first for description searches
+CURSOR_KEYS = ('date', 'pk')
+RELEVANCE_CURSOR_KEYS = ('rank', 'date', 'pk')
+
+KEY_PARSERS = {'date': datetime.fromisoformat, 'pk': int, 'rank': float}
+
+
+def _format_key(value):
+    return value.isoformat() if isinstance(value, datetime) else repr(value)
+
+
+def encode_cursor(direction, obj, keys=CURSOR_KEYS):
+    value = '|'.join([direction, *(_format_key(getattr(obj, key)) for key in keys)])
+    return urlsafe_base64_encode(value.encode())
+
+
+def decode_cursor(cursor, keys=CURSOR_KEYS):
+    """Returns (direction, [values of keys]). Raises ValueError for malformed cursors."""
+    direction, *values = force_str(urlsafe_base64_decode(cursor)).split('|')
+    if direction not in ('next', 'previous') or len(values) != len(keys):
+        raise ValueError(direction)
+    return direction, [KEY_PARSERS[key](value) for key, value in zip(keys, values)]
+
+
+def _beyond(keys, values, lookup):
+    """Rows past values in the keyset: (a < x) or (a = x and b < y) or ... for lookup 'lt'"""
+    condition, equal = Q(), {}
+    for key, value in zip(keys, values):
+        condition |= Q(**equal, **{f'{key}__{lookup}': value})
+        equal[key] = value
+    return condition
+
+
+class CursorPage:
+    """Page of a descending keyset, (date, id) by default. It is never counted."""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.next_querystring = None
+        self.previous_querystring = None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+def paginate_by_cursor(queryset, per_page, cursor=None, keys=CURSOR_KEYS):
+    """Keyset pagination over queryset ordered by keys descending, (-date, -id) by default. Every page
+    costs one indexed range query of per_page + 1 rows no matter how deep it is."""
+    direction, values = decode_cursor(cursor, keys) if cursor else ('next', None)
+
+    if direction == 'next':
+        if values is not None:
+            queryset = queryset.filter(_beyond(keys, values, 'lt'))
+        rows = list(queryset.order_by(*(f'-{key}' for key in keys))[:per_page + 1])
+        has_more, rows = len(rows) > per_page, rows[:per_page]
+        has_next, has_previous = has_more, values is not None
+    else:
+        queryset = queryset.filter(_beyond(keys, values, 'gt'))
+        rows = list(queryset.order_by(*keys)[:per_page + 1])
+        has_more, rows = len(rows) > per_page, rows[:per_page][::-1]
+        has_next, has_previous = True, has_more
+
+    if not rows:
+        return CursorPage(rows)
+    return CursorPage(rows,
+                      next_cursor=encode_cursor('next', rows[-1], keys) if has_next else None,
+                      previous_cursor=encode_cursor('previous', rows[0], keys) if has_previous else None)
+
+
+class CursorPaginationMixin:
+    """ListView pagination by a cursor in the GET parameter instead of the page number"""
+    cursor_kwarg = 'cursor'
+
+    def get_cursor_keys(self):
+        return CURSOR_KEYS
+
+    def paginate_queryset(self, queryset, page_size):
+        try:
+            page = paginate_by_cursor(queryset, page_size, self.request.GET.get(self.cursor_kwarg),
+                                      self.get_cursor_keys())
+        except ValueError:
+            raise Http404('Invalid cursor')
+
+        for name in ('next', 'previous'):
+            cursor = getattr(page, f'{name}_cursor')
+            if cursor is not None:
+                query = self.request.GET.copy()
+                query[self.cursor_kwarg] = cursor
+                setattr(page, f'{name}_querystring', query.urlencode())
+        return None, page, page.object_list, page.has_other_pages()
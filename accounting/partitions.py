@@ -0,0 +1,215 @@
+"""Opt-in PostgreSQL partitioning of the transaction table by date, one partition per month or year.
+
+partition_table converts the table in place. The table keeps its name, columns, indexes and foreign
+keys, so the ORM code doesn't change. The primary key becomes (id, date), since a partitioned table
+can only have unique keys that include the partition key; the ids still come from one sequence.
+Queries with a date range only scan the partitions of that range. Rows outside every partition go to
+the default partition, and create_partitions moves them into their own partitions."""
+import re
+from datetime import datetime, timezone
+
+from django.db import connections, router, transaction as db_transaction
+
+from accounting.models import Transaction
+
+TABLE = Transaction._meta.db_table
+DEFAULT_PARTITION = f'{TABLE}_default'
+INTERVALS = ('month', 'year')
+PARTITION_NAME = re.compile(rf'^{TABLE}_y(\d{{4}})(?:m(\d{{2}}))?$')
+
+
+class PartitionError(Exception):
+    pass
+
+
+class Partition:
+    def __init__(self, name, start, end):
+        self.name = name
+        self.start = start
+        self.end = end
+
+    def __repr__(self):
+        return f'<Partition {self.name}: {self.start:%Y-%m-%d} - {self.end:%Y-%m-%d}>'
+
+
+def interval_start(date, interval):
+    """Start (UTC) of the month or year of the date"""
+    date = date.astimezone(timezone.utc)
+    return datetime(date.year, date.month if interval == 'month' else 1, 1, tzinfo=timezone.utc)
+
+
+def next_start(start, interval):
+    if interval == 'year' or start.month == 12:
+        return start.replace(year=start.year + 1, month=1)
+    return start.replace(month=start.month + 1)
+
+
+def partition_for(date, interval):
+    start = interval_start(date, interval)
+    name = f'{TABLE}_y{start.year}' + (f'm{start.month:02d}' if interval == 'month' else '')
+    return Partition(name, start, next_start(start, interval))
+
+
+def _connection(using):
+    connection = connections[using or router.db_for_write(Transaction)]
+    if connection.vendor != 'postgresql':
+        raise PartitionError('Partitioning needs PostgreSQL')
+    return connection
+
+
+def is_partitioned(using=None):
+    connection = connections[using or router.db_for_write(Transaction)]
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass', [TABLE])
+        return cursor.fetchone() is not None
+
+
+def get_partitions(using=None):
+    """Date partitions ordered by date and the interval, without the default partition"""
+    connection = _connection(using)
+    if not is_partitioned(connection.alias):
+        raise PartitionError(f'{TABLE} is not partitioned, see partition_transactions')
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+                       'WHERE i.inhparent = %s::regclass', [TABLE])
+        names = [row[0] for row in cursor.fetchall()]
+
+    partitions = []
+    interval = 'month'
+    for name in names:
+        match = PARTITION_NAME.match(name)
+        if match is None:
+            continue
+        year, month = match.groups()
+        interval = 'month' if month else 'year'
+        partitions.append(partition_for(datetime(int(year), int(month or 1), 1, tzinfo=timezone.utc), interval))
+    return sorted(partitions, key=lambda partition: partition.start), interval
+
+
+def _create_partition(cursor, quote_name, partition):
+    cursor.execute(f'CREATE TABLE {quote_name(partition.name)} PARTITION OF {quote_name(TABLE)} '
+                   f'FOR VALUES FROM (%s) TO (%s)', [partition.start, partition.end])
+
+
+def _partitions_until(start, until, interval):
+    partitions = []
+    while start < until:
+        partition = partition_for(start, interval)
+        partitions.append(partition)
+        start = partition.end
+    return partitions
+
+
+def _ahead(interval, ahead):
+    """End of the partitions for the current and the next `ahead` months or years"""
+    until = next_start(interval_start(datetime.now(timezone.utc), interval), interval)
+    for _ in range(ahead):
+        until = next_start(until, interval)
+    return until
+
+
+def partition_table(interval='month', ahead=3, using=None):
+    """Converts the transaction table into a table partitioned by date, with partitions for the stored
+    transactions and the next `ahead` months or years. Copies every row under an exclusive lock.
+    Returns the created partitions."""
+    if interval not in INTERVALS:
+        raise PartitionError(f'Interval must be one of {", ".join(INTERVALS)}')
+    connection = _connection(using)
+    if is_partitioned(connection.alias):
+        raise PartitionError(f'{TABLE} is already partitioned')
+
+    quote_name = connection.ops.quote_name
+    table, old_table = quote_name(TABLE), quote_name(f'{TABLE}_unpartitioned')
+    with db_transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        # ALTER TABLE refuses tables with deferred foreign key checks pending in the transaction
+        cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+        cursor.execute(f'LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE')
+        cursor.execute('SELECT pg_get_indexdef(indexrelid), indisunique FROM pg_index '
+                       'WHERE indrelid = %s::regclass AND NOT indisprimary', [TABLE])
+        indexes = cursor.fetchall()
+        if any(unique for _, unique in indexes):
+            raise PartitionError('Unique indexes would have to include the date')
+        cursor.execute("SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+                       "WHERE conrelid = %s::regclass AND contype IN ('f', 'c')", [TABLE])
+        constraints = cursor.fetchall()
+        cursor.execute("SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'p'", [TABLE])
+        primary_key = cursor.fetchone()[0]
+        cursor.execute(f'SELECT MIN(date), MAX(date) FROM {table}')
+        first, last = cursor.fetchone()
+
+        cursor.execute(f'ALTER TABLE {table} RENAME TO {old_table}')
+        cursor.execute(f'CREATE TABLE {table} (LIKE {old_table} INCLUDING DEFAULTS INCLUDING IDENTITY) '
+                       f'PARTITION BY RANGE (date)')
+        now = datetime.now(timezone.utc)
+        until = max(_ahead(interval, ahead), next_start(interval_start(last or now, interval), interval))
+        partitions = _partitions_until(interval_start(min(first or now, now), interval), until, interval)
+        for partition in partitions:
+            _create_partition(cursor, quote_name, partition)
+        cursor.execute(f'CREATE TABLE {quote_name(DEFAULT_PARTITION)} PARTITION OF {table} DEFAULT')
+
+        # Indexes are built after the copy, which is faster than maintaining them row by row
+        cursor.execute(f'INSERT INTO {table} SELECT * FROM {old_table}')
+        cursor.execute(f'DROP TABLE {old_table}')
+        cursor.execute(f'ALTER TABLE {table} ADD CONSTRAINT {quote_name(primary_key)} PRIMARY KEY (id, date)')
+        for definition, _ in indexes:
+            cursor.execute(definition)
+        for name, definition in constraints:
+            cursor.execute(f'ALTER TABLE {table} ADD CONSTRAINT {quote_name(name)} {definition}')
+
+        # The identity column got a new sequence
+        cursor.execute('SELECT pg_get_serial_sequence(%s, %s)', [TABLE, 'id'])
+        sequence = cursor.fetchone()[0]
+        cursor.execute(f'SELECT setval(%s, COALESCE(MAX(id), 0) + 1, false) FROM {table}', [sequence])
+        if sequence.split('.')[-1].strip('"') != f'{TABLE}_id_seq':
+            cursor.execute(f'ALTER SEQUENCE {sequence} RENAME TO {quote_name(f"{TABLE}_id_seq")}')
+        cursor.execute(f'ANALYZE {table}')
+    return partitions
+
+
+def create_partitions(ahead=3, using=None):
+    """Creates the missing partitions up to `ahead` months or years after the current one, and the
+    partitions of the rows in the default partition, which it moves there. Returns the created
+    partitions."""
+    connection = _connection(using)
+    partitions, interval = get_partitions(connection.alias)
+    quote_name = connection.ops.quote_name
+    table, default, moved = quote_name(TABLE), quote_name(DEFAULT_PARTITION), quote_name(f'{TABLE}_moved')
+
+    with db_transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute(f"SELECT DISTINCT date_trunc(%s, date AT TIME ZONE 'UTC') FROM {default}", [interval])
+        missing = {partition_for(start.replace(tzinfo=timezone.utc), interval).name:
+                   partition_for(start.replace(tzinfo=timezone.utc), interval) for start, in cursor.fetchall()}
+        start = partitions[-1].end if partitions else interval_start(datetime.now(timezone.utc), interval)
+        for partition in _partitions_until(start, _ahead(interval, ahead), interval):
+            missing.setdefault(partition.name, partition)
+        for partition in partitions:
+            missing.pop(partition.name, None)
+        missing = sorted(missing.values(), key=lambda partition: partition.start)
+
+        for partition in missing:
+            # A new partition can't overlap rows of the default partition, they wait in a temporary table
+            cursor.execute(f'CREATE TEMPORARY TABLE {moved} (LIKE {table})')
+            cursor.execute(f'WITH deleted AS (DELETE FROM {default} WHERE date >= %s AND date < %s RETURNING *) '
+                           f'INSERT INTO {moved} SELECT * FROM deleted', [partition.start, partition.end])
+            _create_partition(cursor, quote_name, partition)
+            cursor.execute(f'INSERT INTO {table} SELECT * FROM {moved}')
+            cursor.execute(f'DROP TABLE {moved}')
+    return missing
+
+
+def detach_partitions(before, drop=False, using=None):
+    """Detaches the partitions that end on or before the date. Their rows stay in the detached tables
+    unless drop. Returns the detached partitions."""
+    connection = _connection(using)
+    partitions, _ = get_partitions(connection.alias)
+    detached = [partition for partition in partitions if partition.end <= before]
+
+    quote_name = connection.ops.quote_name
+    with db_transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        for partition in detached:
+            cursor.execute(f'ALTER TABLE {quote_name(TABLE)} DETACH PARTITION {quote_name(partition.name)}')
+            if drop:
+                cursor.execute(f'DROP TABLE {quote_name(partition.name)}')
+    return detached
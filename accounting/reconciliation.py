@@ -0,0 +1,143 @@
+"""Reconciliation of the payment type balances. The ledger keeps PaymentType.balance equal to the
+opening balance plus the transactions of the payment type, archived ones included through the
+carry-forward. Writes that bypass it (the admin, SQL, bugs) make the balance drift. reconcile
+recomputes the expected balances of chunks of wallets with one grouped query each, which compares
+them in the database and only returns the drifted payment types, and optionally fixes them.
+
+Payment types created before opening_balance existed have none. The first run sets it to the current
+balance minus the transactions, so drift from before that run isn't detected."""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.db import connections, transaction as db_transaction
+from django.db.models import Exists, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from accounting import balances, ledger, summaries
+from accounting.models import CarryForward, PaymentType, ReconciliationRun, Transaction, Wallet
+
+CHUNK_SIZE = 1000
+# Incremental runs check every wallet when the last full run is older
+FULL_RUN_INTERVAL = timedelta(days=7)
+
+
+def _total(queryset, field):
+    """Scalar subquery with the sum of the field over the rows of the outer payment type"""
+    queryset = queryset.filter(payment_type=OuterRef('pk')).order_by().values('payment_type').annotate(
+        result=Sum(field))
+    return Coalesce(Subquery(queryset.values('result')), summaries.ZERO)
+
+
+def _transactions_total():
+    return _total(Transaction.objects.all(), 'value') + _total(CarryForward.objects.all(), 'total')
+
+
+def set_opening_balances(wallet_ids):
+    """Sets the unknown opening balances of the wallets' payment types from their current balances.
+    Returns the number of payment types."""
+    with db_transaction.atomic():
+        # Ledger lock order: payment types by id. The sums then match the locked balances.
+        pks = list(PaymentType.objects.select_for_update().filter(
+            wallet_id__in=wallet_ids, opening_balance__isnull=True).order_by('pk').values_list('pk', flat=True))
+        if not pks:
+            return 0
+        return PaymentType.objects.filter(pk__in=pks).update(opening_balance=F('balance') - _transactions_total())
+
+
+def get_drift(payment_types):
+    """Payment types whose balance isn't the opening balance plus their transactions, as dicts with the
+    balance and the expected one, in one query"""
+    return list(payment_types.filter(opening_balance__isnull=False).annotate(
+        expected=F('opening_balance') + _transactions_total()
+    ).filter(~Q(balance=F('expected'))).order_by('pk').values('pk', 'wallet_id', 'name', 'balance', 'expected'))
+
+
+def fix_drift(wallet_id, payment_type_ids):
+    """Sets the balances of the wallet's payment types to the expected ones, checked again under the
+    row locks, and the wallet summary balance to their sum. Returns the number of fixed payment types."""
+    with db_transaction.atomic():
+        list(PaymentType.objects.select_for_update().filter(pk__in=payment_type_ids).order_by('pk'))
+        rows = get_drift(PaymentType.objects.filter(wallet_id=wallet_id, pk__in=payment_type_ids))
+        deltas = {row['pk']: row['expected'] - row['balance'] for row in rows}
+        if deltas:
+            ledger.apply_balance_deltas(deltas)
+            summaries.refresh_balance(wallet_id)
+            # Checkpoints without transactions of their own were built from the drifted balances
+            balances.invalidate_checkpoints(dict.fromkeys(deltas))
+    return len(deltas)
+
+
+def reconcile_wallets(wallet_ids, fix=False):
+    """Checks (and with fix fixes) the payment types of the wallets. Returns the drifted rows (see
+    get_drift) and the number of fixed payment types."""
+    set_opening_balances(wallet_ids)
+    drift = get_drift(PaymentType.objects.filter(wallet_id__in=wallet_ids))
+    fixed = 0
+    if fix:
+        by_wallet = {}
+        for row in drift:
+            by_wallet.setdefault(row['wallet_id'], []).append(row['pk'])
+        for wallet_id, payment_type_ids in by_wallet.items():
+            fixed += fix_drift(wallet_id, payment_type_ids)
+    return drift, fixed
+
+
+def _reconcile_in_thread(wallet_ids, fix):
+    try:
+        return reconcile_wallets(wallet_ids, fix=fix)
+    finally:
+        # The pool's connections would stay open after the run
+        connections.close_all()
+
+
+def changed_wallets(wallets, since):
+    """Wallets written through the ledger since the date (see summaries.new_version), without a summary
+    or with payment types without an opening balance. Writes that bypass the ledger, the very ones that
+    cause drift, don't change the summary, so only full runs find it."""
+    return wallets.filter(
+        Q(summary__modified__gte=since) | Q(summary__isnull=True)
+        | Exists(PaymentType.objects.filter(wallet=OuterRef('pk'), opening_balance__isnull=True)))
+
+
+def reconcile(wallets=None, incremental=False, fix=False, chunk_size=CHUNK_SIZE, workers=1, progress=None,
+              full_run_interval=FULL_RUN_INTERVAL):
+    """Checks the given wallets (all by default) in chunks of chunk_size wallets on workers threads, each
+    with its own database connection. Incremental runs only check the wallets changed through the
+    ledger since the last finished run started (see changed_wallets), and become full runs when no full
+    run finished within full_run_interval. Calls progress(checked wallets, wallets, drifted rows) after
+    each chunk. Returns the ReconciliationRun."""
+    finished = ReconciliationRun.objects.filter(finished__isnull=False).order_by('-started')
+    last_run = finished.first()
+    if incremental:
+        last_full_run = finished.filter(incremental=False).first()
+        incremental = last_full_run is not None and last_full_run.started >= timezone.now() - full_run_interval
+    run = ReconciliationRun.objects.create(incremental=incremental)
+    if wallets is None:
+        wallets = Wallet.objects.all()
+    if incremental:
+        wallets = changed_wallets(wallets, last_run.started)
+
+    wallet_ids = list(wallets.order_by('pk').values_list('pk', flat=True))
+    chunks = [wallet_ids[start:start + chunk_size] for start in range(0, len(wallet_ids), chunk_size)]
+    if workers > 1:
+        executor = ThreadPoolExecutor(workers, thread_name_prefix='iae-reconcile')
+        results = executor.map(_reconcile_in_thread, chunks, [fix] * len(chunks))
+    else:
+        executor = None
+        results = (reconcile_wallets(chunk, fix=fix) for chunk in chunks)
+
+    try:
+        for chunk, (drift, fixed) in zip(chunks, results):
+            run.wallets += len(chunk)
+            run.drifted += len(drift)
+            run.fixed += fixed
+            if progress:
+                progress(run.wallets, len(wallet_ids), drift)
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    run.finished = timezone.now()
+    run.save()
+    return run
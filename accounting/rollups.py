@@ -0,0 +1,123 @@
+from itertools import groupby
+
+from django.db import IntegrityError, transaction as db_transaction
+from django.db.models import Count, DateField, Exists, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce, TruncMonth
+from django.utils import timezone
+
+from accounting.models import CarryForward, MonthlyRollup, Transaction, Wallet, WalletSummary
+from accounting.summaries import ZERO
+
+
+def month_of(date):
+    """First day of the month of the date in the current time zone, the same as TruncMonth"""
+    return timezone.localtime(date).date().replace(day=1)
+
+
+def add_to_rollup(wallet_id, category_id, payment_type_id, month, total, count):
+    """Adds the deltas to one rollup row, creating it if needed"""
+    key = {'wallet_id': wallet_id, 'category_id': category_id, 'payment_type_id': payment_type_id, 'month': month}
+    changes = {'total': F('total') + total, 'count': F('count') + count}
+
+    if MonthlyRollup.objects.filter(**key).update(**changes):
+        return
+    try:
+        with db_transaction.atomic():
+            MonthlyRollup.objects.create(total=total, count=count, **key)
+    except IntegrityError:
+        # Created by a concurrent request
+        MonthlyRollup.objects.filter(**key).update(**changes)
+
+
+def add_to_rollups(wallet_id, deltas):
+    """Adds {(category id, payment type id, month): (total, count)} to the rollups of one wallet with
+    an UPDATE per existing row and one bulk insert of the new rows. The caller must hold the wallet
+    summary row lock, so no concurrent request creates the same rows. Returns the number of new rows."""
+    existing = set(MonthlyRollup.objects.filter(wallet_id=wallet_id, month__in={key[2] for key in deltas}).values_list(
+        'category_id', 'payment_type_id', 'month'))
+    new_rollups = []
+    for key in sorted(deltas):
+        (category_id, payment_type_id, month), (total, count) = key, deltas[key]
+        if key in existing:
+            add_to_rollup(wallet_id, category_id, payment_type_id, month, total, count)
+        else:
+            new_rollups.append(MonthlyRollup(wallet_id=wallet_id, category_id=category_id,
+                                             payment_type_id=payment_type_id, month=month, total=total, count=count))
+    return len(MonthlyRollup.objects.bulk_create(new_rollups))
+
+
+def add_transaction(transaction, sign=1):
+    add_to_rollup(transaction.wallet_id, transaction.category_id, transaction.payment_type_id,
+                  month_of(transaction.date), transaction.value * sign, sign)
+
+
+def move_rollups(wallet_id, field, old_id, new_id):
+    """Moves the rollups of a payment type or category (field) to another one with three set-based
+    queries, merging rows that already exist for the new one"""
+    other = 'category' if field == 'payment_type' else 'payment_type'
+    wallet_rollups = MonthlyRollup.objects.filter(wallet_id=wallet_id)
+    old_rollups = wallet_rollups.filter(**{f'{field}_id': old_id})
+    new_rollups = wallet_rollups.filter(**{f'{field}_id': new_id})
+
+    with db_transaction.atomic():
+        matching_old = old_rollups.filter(month=OuterRef('month'), **{f'{other}_id': OuterRef(f'{other}_id')})
+        new_rollups.filter(Exists(matching_old)).update(total=F('total') + Subquery(matching_old.values('total')),
+                                                        count=F('count') + Subquery(matching_old.values('count')))
+        matching_new = new_rollups.filter(month=OuterRef('month'), **{f'{other}_id': OuterRef(f'{other}_id')})
+        old_rollups.filter(Exists(matching_new)).delete()
+        old_rollups.update(**{f'{field}_id': new_id})
+
+
+def rebuild_monthly_rollups(wallets=None, batch_size=1000):
+    """Regenerates the rollups of the given wallets (all by default) from their transactions with one
+    grouped query, then adds the carry-forward of archived transactions. Ledger writes to the wallets
+    wait until it is done. Returns the number of rollup rows."""
+    if wallets is None:
+        wallets = Wallet.objects.all()
+    rows = Transaction.objects.filter(wallet__in=wallets).order_by().annotate(
+        month=TruncMonth('date', output_field=DateField())
+    ).values('wallet_id', 'category_id', 'payment_type_id', 'month').annotate(total=Sum('value'), count=Count('pk'))
+
+    with db_transaction.atomic():
+        # The summary row locks the ledger takes, in pk order so concurrent rebuilds don't deadlock
+        list(WalletSummary.objects.select_for_update().filter(wallet__in=wallets).order_by('pk').values_list('pk'))
+        MonthlyRollup.objects.filter(wallet__in=wallets).delete()
+        created = 0
+        batch = []
+        for row in rows.iterator(chunk_size=batch_size):
+            batch.append(MonthlyRollup(**row))
+            if len(batch) >= batch_size:
+                created += len(MonthlyRollup.objects.bulk_create(batch))
+                batch = []
+        created += len(MonthlyRollup.objects.bulk_create(batch))
+
+        carry_forward = CarryForward.objects.filter(wallet__in=wallets).order_by('wallet_id').values_list(
+            'wallet_id', 'category_id', 'payment_type_id', 'month', 'total', 'count')
+        for wallet_id, rows in groupby(carry_forward.iterator(chunk_size=batch_size), key=lambda row: row[0]):
+            deltas = {(category_id, payment_type_id, month): (total, count)
+                      for _, category_id, payment_type_id, month, total, count in rows}
+            created += add_to_rollups(wallet_id, deltas)
+    return created
+
+
+def get_monthly_report(rollups):
+    """Income, expense and net per month with the deltas to the previous month"""
+    months = list(rollups.order_by().values('month').annotate(
+        income=Coalesce(Sum('total', filter=Q(category__type='Income')), ZERO),
+        expense=Coalesce(Sum('total', filter=Q(category__type='Expense')), ZERO),
+    ).order_by('month'))
+
+    previous = None
+    for month in months:
+        month['net'] = month['income'] + month['expense']
+        for key in ('income', 'expense', 'net'):
+            month[f'{key}_delta'] = month[key] - previous[key] if previous else None
+        previous = month
+    return months
+
+
+def get_category_report(rollups):
+    """Total and number of transactions per income and expense category"""
+    return rollups.filter(category__type__in=['Income', 'Expense']).order_by().values(
+        'category_id', 'category__name', 'category__type'
+    ).annotate(total=Sum('total'), count=Sum('count')).order_by('category__type', 'category__name')
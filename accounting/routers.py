@@ -0,0 +1,80 @@
+"""Read replicas: the reads of the read-only pages (views with use_replica) go to one of
+settings.REPLICA_DATABASES, everything else to the primary. ReplicaMiddleware picks the database per
+request. After a write the client reads from the primary for REPLICA_PIN_SECONDS, so it never sees
+balances the replica hasn't caught up with yet.
+
+Only the accounting models are routed: sessions and users always come from the primary, so a login
+is valid at once."""
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_COOKIE = 'iae_primary_until'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class ReadRouting:
+    """Database the accounting reads of the current request go to, None for the primary"""
+
+    def __init__(self, database=None):
+        self.database = database
+
+
+read_routing = ContextVar('read_routing', default=None)
+
+
+def get_read_database():
+    routing = read_routing.get()
+    return routing.database if routing is not None else None
+
+
+def is_pinned(request):
+    """Whether the client wrote within REPLICA_PIN_SECONDS"""
+    try:
+        return float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def pin_to_primary(response):
+    """Keeps the client's reads on the primary for REPLICA_PIN_SECONDS"""
+    response.set_cookie(PIN_COOKIE, str(int(time.time() + settings.REPLICA_PIN_SECONDS)),
+                        max_age=settings.REPLICA_PIN_SECONDS, httponly=True, samesite='Lax')
+
+
+def choose_database(request, view_class):
+    """Replica for the request if the view reads only and the client didn't just write, otherwise None"""
+    if (settings.REPLICA_DATABASES and getattr(view_class, 'use_replica', False)
+            and request.method in SAFE_METHODS and not is_pinned(request)):
+        return random.choice(settings.REPLICA_DATABASES)
+    return None
+
+
+class ReplicaRouter:
+    """Database router of the replica setup"""
+
+    def db_for_read(self, model, **hints):
+        database = get_read_database()
+        if database is None or model._meta.app_label != 'accounting':
+            return None
+        # Reads inside a transaction of the primary, like the locks of the ledger, stay there
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return database
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.REPLICA_DATABASES}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.REPLICA_DATABASES:
+            return False
+        return None
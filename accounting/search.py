@@ -0,0 +1,75 @@
+"""Transaction description search. PostgreSQL uses a full-text GIN index with prefix matching
+and ranking, other databases fall back to icontains per word."""
+import re
+
+from django.db import connections
+from django.db.models import FloatField, Value
+
+from accounting.models import Transaction
+
+SEARCH_CONFIG = 'simple'
+SEARCH_INDEX_NAME = 'transaction_description_fts'
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def _is_postgresql(using):
+    return connections[using].vendor == 'postgresql'
+
+
+def get_search_vector():
+    from django.contrib.postgres.search import SearchVector
+
+    return SearchVector('description', config=SEARCH_CONFIG)
+
+
+def get_search_index():
+    from django.contrib.postgres.indexes import GinIndex
+
+    return GinIndex(get_search_vector(), name=SEARCH_INDEX_NAME)
+
+
+def create_search_index(using='default', **kwargs):
+    """Creates the GIN index if it is missing. Connected to post_migrate, since the index exists
+    on PostgreSQL only."""
+    if not _is_postgresql(using):
+        return
+    connection = connections[using]
+    table = Transaction._meta.db_table
+    with connection.cursor() as cursor:
+        if table not in connection.introspection.table_names(cursor):
+            return
+        if SEARCH_INDEX_NAME in connection.introspection.get_constraints(cursor, table):
+            return
+    with connection.schema_editor() as schema_editor:
+        schema_editor.add_index(Transaction, get_search_index())
+
+
+def parse_words(query):
+    return WORD_RE.findall(query or '')
+
+
+def search_transactions(queryset, query, rank=False):
+    """Transactions whose description has words starting with every word of the query.
+    With rank=True they are annotated with the search rank (0 on databases without full-text search)."""
+    words = parse_words(query)
+    if not words:
+        return queryset
+
+    if not _is_postgresql(queryset.db):
+        for word in words:
+            queryset = queryset.filter(description__icontains=word)
+        if rank:
+            queryset = queryset.annotate(rank=Value(0.0, output_field=FloatField()))
+        return queryset
+
+    from django.contrib.postgres.search import SearchQuery, SearchRank
+    from django.db.models.functions import Cast
+
+    search_query = SearchQuery(' & '.join(f'{word}:*' for word in words), config=SEARCH_CONFIG, search_type='raw')
+    # Filtering on the same expression as the index lets PostgreSQL use it
+    queryset = queryset.alias(search=get_search_vector()).filter(search=search_query)
+    if rank:
+        # ts_rank() is a real, as double precision it survives the round trip through a page cursor
+        queryset = queryset.annotate(rank=Cast(SearchRank(get_search_vector(), search_query), FloatField()))
+    return queryset
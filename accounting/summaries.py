@@ -0,0 +1,179 @@
+import uuid
+from decimal import Decimal
+
+from django.db import transaction as db_transaction
+from django.db.models import Count, DecimalField, F, Max, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from accounting.models import CarryForward, PaymentType, Transaction, Wallet, WalletSummary
+
+ZERO = Value(Decimal(0), output_field=DecimalField(max_digits=16, decimal_places=2))
+
+INCOME = Q(category__type='Income')
+EXPENSE = Q(category__type='Expense')
+
+
+def new_version():
+    """Update kwargs marking the wallet as changed: the version keys the cached data and the page
+    ETags, modified is the Last-Modified of the pages"""
+    return {'version': uuid.uuid4(), 'modified': timezone.now()}
+
+
+def _sum(field, condition=None):
+    return Coalesce(Sum(field, filter=condition), ZERO)
+
+
+def _subquery(queryset, aggregate, default):
+    """Scalar subquery with the aggregate over the rows of the outer wallet"""
+    queryset = queryset.filter(wallet=OuterRef('pk')).order_by().values('wallet').annotate(result=aggregate)
+    if default is None:
+        return Subquery(queryset.values('result'))
+    return Coalesce(Subquery(queryset.values('result')), default)
+
+
+def _latest(first, second):
+    """The later of two dates that may be NULL"""
+    return Greatest(Coalesce(first, second), Coalesce(second, first))
+
+
+def _annotate_summary(wallets):
+    # Archived transactions count through the carry-forward, see accounting.archive
+    return wallets.annotate(
+        balance=_subquery(PaymentType.objects.all(), Sum('balance'), ZERO),
+        income_all_time_sum=(_subquery(Transaction.objects.filter(INCOME), Sum('value'), ZERO)
+                             + _subquery(CarryForward.objects.filter(INCOME), Sum('total'), ZERO)),
+        expense_all_time_sum=(_subquery(Transaction.objects.filter(EXPENSE), Sum('value'), ZERO)
+                              + _subquery(CarryForward.objects.filter(EXPENSE), Sum('total'), ZERO)),
+        transaction_count=(_subquery(Transaction.objects.all(), Count('pk'), Value(0))
+                           + _subquery(CarryForward.objects.all(), Sum('count'), Value(0))),
+        last_transaction_date=_latest(_subquery(Transaction.objects.all(), Max('date'), None),
+                                      _subquery(CarryForward.objects.all(), Max('last_date'), None)),
+    )
+
+
+def get_transactions_totals(queryset):
+    """Income and expense sums of the queryset in one aggregate query"""
+    return queryset.order_by().aggregate(income_sum=_sum('value', INCOME), expense_sum=_sum('value', EXPENSE))
+
+
+def compute_wallet_summary(wallet):
+    """Wallet totals computed from scratch in one query"""
+    return _annotate_summary(Wallet.objects.filter(pk=wallet.pk)).values(
+        'balance', 'income_all_time_sum', 'expense_all_time_sum', 'transaction_count', 'last_transaction_date'
+    ).get()
+
+
+def _summary_from_row(wallet_id, row):
+    return WalletSummary(wallet_id=wallet_id,
+                         balance=row['balance'],
+                         income_all_time=row['income_all_time_sum'],
+                         expense_all_time=row['expense_all_time_sum'],
+                         transaction_count=row['transaction_count'],
+                         last_transaction_date=row['last_transaction_date'])
+
+
+def rebuild_wallet_summary(wallet):
+    """Regenerates the summary of one wallet from its payment types and transactions"""
+    row = compute_wallet_summary(wallet)
+    summary, _ = WalletSummary.objects.update_or_create(wallet_id=wallet.pk, defaults={
+        'balance': row['balance'],
+        'income_all_time': row['income_all_time_sum'],
+        'expense_all_time': row['expense_all_time_sum'],
+        'transaction_count': row['transaction_count'],
+        'last_transaction_date': row['last_transaction_date'],
+        **new_version(),
+    })
+    return summary
+
+
+def rebuild_wallet_summaries(wallets=None, batch_size=1000):
+    """Regenerates summaries of the given wallets (all by default) in batches. Returns the number of wallets."""
+    if wallets is None:
+        wallets = Wallet.objects.all()
+    rows = _annotate_summary(wallets.order_by('pk')).values(
+        'pk', 'balance', 'income_all_time_sum', 'expense_all_time_sum', 'transaction_count', 'last_transaction_date'
+    )
+
+    rebuilt = 0
+    batch = []
+    for row in rows.iterator(chunk_size=batch_size):
+        batch.append(_summary_from_row(row['pk'], row))
+        if len(batch) >= batch_size:
+            rebuilt += _replace_summaries(batch)
+            batch = []
+    if batch:
+        rebuilt += _replace_summaries(batch)
+    return rebuilt
+
+
+def _replace_summaries(summaries):
+    with db_transaction.atomic():
+        WalletSummary.objects.filter(wallet_id__in=[summary.wallet_id for summary in summaries]).delete()
+        WalletSummary.objects.bulk_create(summaries)
+    return len(summaries)
+
+
+def get_summary(wallet):
+    """Stored wallet summary, created with the wallet. Wallets from before summaries existed get theirs
+    stored on the first read, or all at once with `rebuild_wallet_summaries --missing` during deploy."""
+    summary = WalletSummary.objects.filter(wallet_id=wallet.pk).first()
+    if summary is None:
+        summary = rebuild_wallet_summary(wallet)
+    return summary
+
+
+def apply_summary_delta(wallet_id, income=0, expense=0, balance=0, count=0, date=None):
+    """Adds the deltas to the stored summary in one UPDATE"""
+    changes = {
+        'income_all_time': F('income_all_time') + income,
+        'expense_all_time': F('expense_all_time') + expense,
+        'balance': F('balance') + balance,
+        'transaction_count': F('transaction_count') + count,
+        **new_version(),
+    }
+    if date is not None:
+        changes['last_transaction_date'] = Greatest(Coalesce('last_transaction_date', Value(date)), Value(date))
+
+    if not WalletSummary.objects.filter(wallet_id=wallet_id).update(**changes):
+        # No summary yet: the change is already in the database, so build it from scratch
+        rebuild_wallet_summary(Wallet(pk=wallet_id))
+
+
+def bump_version(wallet_id):
+    """Replaces the version, which invalidates the cached data of the wallet. Without a summary
+    nothing is cached yet."""
+    WalletSummary.objects.filter(wallet_id=wallet_id).update(**new_version())
+
+
+def refresh_balance(wallet_id):
+    """Sets the balance to the sum of the payment type balances, after they were corrected"""
+    balance = PaymentType.objects.filter(wallet_id=wallet_id).order_by().values('wallet').annotate(
+        result=Sum('balance')).values('result')
+    if not WalletSummary.objects.filter(wallet_id=wallet_id).update(balance=Coalesce(Subquery(balance), ZERO),
+                                                                     **new_version()):
+        rebuild_wallet_summary(Wallet(pk=wallet_id))
+
+
+def refresh_last_transaction_date(wallet_id):
+    dates = Wallet.objects.filter(pk=wallet_id).values(
+        date=_subquery(Transaction.objects.all(), Max('date'), None),
+        archived=_subquery(CarryForward.objects.all(), Max('last_date'), None),
+    ).first() or {}
+    last_transaction_date = max(filter(None, dates.values()), default=None)
+    WalletSummary.objects.filter(wallet_id=wallet_id).update(last_transaction_date=last_transaction_date)
+
+
+def get_wallet_summary(wallet, queryset=None, summary=None):
+    """Balance and all-time income/expense from the stored summary (fetched unless given) and, if a
+    (filtered) transactions queryset is given, its income/expense computed with one aggregate query"""
+    if summary is None:
+        summary = get_summary(wallet)
+    result = {
+        'balance': summary.balance,
+        'income_all_time_sum': summary.income_all_time,
+        'expense_all_time_sum': summary.expense_all_time,
+    }
+    if queryset is not None:
+        result.update(get_transactions_totals(queryset))
+    return result
@@ -0,0 +1,114 @@
+"""Synthetic wallets for profiling with production-sized data. Transactions go through
+ledger.create_transactions, so balances, summaries, rollups and usage counters match the rows.
+The same seed and options always generate the same data."""
+import itertools
+import random
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connections, router, transaction as db_transaction
+
+from accounting import ledger
+from accounting.imports import BATCH_SIZE
+from accounting.models import Category, PaymentType, Transaction, Wallet, WalletSummary
+
+END = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+PAYMENT_TYPES = ['Cash', 'Card', 'Bank account', 'Savings', 'Credit card', 'Brokerage']
+INCOME_CATEGORIES = ['Salary', 'Freelance', 'Interest', 'Gifts', 'Refunds', 'Dividends']
+EXPENSE_CATEGORIES = ['Food', 'Rent', 'Transport', 'Utilities', 'Restaurants', 'Health', 'Clothes',
+                      'Entertainment', 'Travel', 'Education', 'Sports', 'Household', 'Phone', 'Subscriptions']
+WORDS = ['grocery', 'store', 'market', 'coffee', 'lunch', 'dinner', 'taxi', 'bus', 'train', 'ticket',
+         'fuel', 'pharmacy', 'doctor', 'rent', 'electricity', 'water', 'internet', 'phone', 'gym', 'cinema',
+         'book', 'course', 'gift', 'birthday', 'shoes', 'jacket', 'hotel', 'flight', 'insurance', 'repair',
+         'salary', 'bonus', 'invoice', 'project', 'refund', 'interest', 'monthly', 'weekly', 'online', 'cash']
+
+
+def _names(names, count):
+    """count names from the list, numbered once it runs out"""
+    return [names[i % len(names)] + (f' {i // len(names) + 1}' if i >= len(names) else '') for i in range(count)]
+
+
+def _cum_weights(count):
+    """Skewed weights for random.choices: the first objects are used much more than the last"""
+    return list(itertools.accumulate(1 / rank for rank in range(1, count + 1)))
+
+
+def _value(rng, mu, sigma):
+    return Decimal(max(1, round(rng.lognormvariate(mu, sigma) * 100))) / 100
+
+
+def generate_transactions(rng, wallet, payment_types, income_categories, expense_categories, count, start, end,
+                          income_share=0.1, words=WORDS):
+    """count unsaved transactions of the wallet in date order between start and end"""
+    payment_type_weights = _cum_weights(len(payment_types))
+    income_weights = _cum_weights(len(income_categories))
+    expense_weights = _cum_weights(len(expense_categories))
+    step = (end - start) / max(count, 1)
+
+    for number in range(count):
+        if income_categories and (not expense_categories or rng.random() < income_share):
+            category = rng.choices(income_categories, cum_weights=income_weights)[0]
+            value = _value(rng, 7, 0.5)
+        else:
+            category = rng.choices(expense_categories, cum_weights=expense_weights)[0]
+            value = -_value(rng, 3, 1)
+        description = ' '.join(rng.choices(words, k=rng.randint(0, 4))) if words else ''
+        yield Transaction(wallet_id=wallet.pk, category=category,
+                          payment_type_id=rng.choices(payment_types, cum_weights=payment_type_weights)[0].pk,
+                          value=value, description=description.capitalize(),
+                          date=start + step * number + rng.random() * step)
+
+
+def _batches(iterable, batch_size):
+    iterator = iter(iterable)
+    while batch := list(itertools.islice(iterator, batch_size)):
+        yield batch
+
+
+def generate_wallet(user, number, seed=0, payment_types=4, categories=15, transactions=10000, days=5 * 365,
+                    end=END, income_share=0.1, words=WORDS, batch_size=BATCH_SIZE):
+    """Creates the wallet of the user with its payment types, categories and transactions"""
+    rng = random.Random(f'{seed}:{number}')
+    income_count = categories // 4 or min(1, categories - 1)
+    with db_transaction.atomic():
+        wallet = Wallet.objects.create(owner=user)
+        WalletSummary.objects.create(wallet=wallet)
+        PaymentType.objects.bulk_create(PaymentType(wallet=wallet, name=name, opening_balance=0)
+                                        for name in _names(PAYMENT_TYPES, payment_types))
+        Category.objects.bulk_create(
+            [Category(wallet=wallet, name=name, type='Income')
+             for name in _names(INCOME_CATEGORIES, income_count)] +
+            [Category(wallet=wallet, name=name, type='Expense')
+             for name in _names(EXPENSE_CATEGORIES, categories - income_count)] +
+            [Category(wallet=wallet, name='Transfer', type='Transfer', service=True)])
+
+        wallet_payment_types = list(wallet.paymenttype_set.order_by('pk'))
+        wallet_categories = list(wallet.category_set.filter(service=False).order_by('pk'))
+        rows = generate_transactions(rng, wallet, wallet_payment_types,
+                                     [category for category in wallet_categories if category.type == 'Income'],
+                                     [category for category in wallet_categories if category.type == 'Expense'],
+                                     transactions, end - timedelta(days=days), end, income_share, words)
+        ledger.create_transactions(wallet.pk, _batches(rows, batch_size))
+    return wallet
+
+
+def analyze():
+    """Updates the planner statistics, which don't know the new rows until autovacuum gets to them"""
+    with connections[router.db_for_write(Transaction)].cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+
+def generate_wallets(users=1, prefix='synthetic', password=None, **options):
+    """Creates the users prefix-1 ... prefix-N, each with a generated wallet. Returns the wallets."""
+    user_model = get_user_model()
+    # Hashing once keeps large user counts fast
+    password = make_password(password)
+    wallets = []
+    for number in range(1, users + 1):
+        user = user_model.objects.create(username=f'{prefix}-{number}', password=password)
+        wallets.append(generate_wallet(user, number, **options))
+    analyze()
+    return wallets
@@ -0,0 +1,127 @@
+import json
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.test import TestCase, Client
+from django.urls import reverse
+
+from accounting.api import MAX_BATCH_SIZE, TransactionsApi
+from accounting.models import Wallet, PaymentType, Category, Transaction, WalletSummary
+from accounting.summaries import rebuild_wallet_summary
+
+
+class TestApi(TestCase):
+    """JSON API with batched transaction writes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='testuser', password='1234')
+        cls.wallet = Wallet.objects.create(owner=cls.user)
+        cls.cash = PaymentType.objects.create(wallet=cls.wallet, name='Cash', balance=100)
+        cls.card = PaymentType.objects.create(wallet=cls.wallet, name='Card', balance=0)
+        cls.food = Category.objects.create(name='Food', wallet=cls.wallet, type='Expense')
+        cls.salary = Category.objects.create(name='Salary', wallet=cls.wallet, type='Income')
+        for day in range(1, 6):
+            Transaction.objects.create(wallet=cls.wallet, payment_type=cls.cash, category=cls.food, value=-day,
+                                       date=datetime(2021, 3, day, tzinfo=timezone.utc))
+        rebuild_wallet_summary(cls.wallet)
+
+        other_user = User.objects.create_user(username='otheruser', password='1234')
+        cls.other_category = Category.objects.create(name='Food', wallet=Wallet.objects.create(owner=other_user),
+                                                     type='Expense')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.login(username='testuser', password='1234')
+
+    def post(self, transactions, client=None):
+        return (client or self.client).post(reverse('api_transactions'),
+                                            data=json.dumps({'transactions': transactions}),
+                                            content_type='application/json')
+
+    def test_anonymous(self):
+        self.assertEqual(Client().get(reverse('api_transactions')).status_code, 401)
+
+    def test_payment_types_and_categories(self):
+        payment_types = self.client.get(reverse('api_payment_types')).json()['results']
+        categories = self.client.get(reverse('api_categories')).json()['results']
+
+        self.assertEqual({row['name']: row['balance'] for row in payment_types}, {'Cash': '100.00', 'Card': '0.00'})
+        self.assertEqual({row['name'] for row in categories}, {'Food', 'Salary'})
+
+    def test_list_pages(self):
+        first = self.client.get(reverse('api_transactions'), data={'limit': 3}).json()
+        second = self.client.get(reverse('api_transactions'), data={'limit': 3, 'cursor': first['next']}).json()
+
+        self.assertEqual([row['value'] for row in first['results']], ['-5.00', '-4.00', '-3.00'])
+        self.assertEqual(first['results'][0], {'id': first['results'][0]['id'], 'date': '2021-03-05T00:00:00+00:00',
+                                               'payment_type': self.cash.pk, 'category': self.food.pk,
+                                               'value': '-5.00', 'description': ''})
+        self.assertEqual([row['value'] for row in second['results']], ['-2.00', '-1.00'])
+        self.assertIsNone(second['next'])
+
+    def test_list_filters(self):
+        response = self.client.get(reverse('api_transactions'), data={'date__gte': '2021-03-04'})
+        self.assertEqual(len(response.json()['results']), 2)
+
+        for params in ({'category': self.other_category.pk}, {'cursor': 'invalid'}, {'limit': 0}):
+            with self.subTest(**params):
+                self.assertEqual(self.client.get(reverse('api_transactions'), data=params).status_code, 400)
+
+    def test_create_batch(self):
+        response = self.post([
+            {'payment_type': self.cash.pk, 'category': self.food.pk, 'value': '10.5', 'description': 'Lunch',
+             'date': '2021-04-01T12:00:00+00:00'},
+            {'payment_type': self.card.pk, 'category': self.salary.pk, 'value': 1000},
+            {'payment_type': self.card.pk, 'category': self.food.pk, 'value': 20},
+        ])
+
+        self.assertEqual(response.status_code, 201)
+        rows = response.json()['results']
+        self.assertEqual([row['value'] for row in rows], ['-10.50', '1000.00', '-20.00'])
+        self.assertEqual(Transaction.objects.get(pk=rows[0]['id']).description, 'Lunch')
+        self.cash.refresh_from_db()
+        self.card.refresh_from_db()
+        self.assertEqual(self.cash.balance, Decimal('89.50'))
+        self.assertEqual(self.card.balance, 980)
+        self.assertEqual(WalletSummary.objects.get(wallet=self.wallet).transaction_count, 8)
+
+    def test_invalid_batch_creates_nothing(self):
+        response = self.post([
+            {'payment_type': self.cash.pk, 'category': self.food.pk, 'value': 10},
+            {'payment_type': self.cash.pk, 'category': self.other_category.pk, 'value': '1.234'},
+            'transaction',
+            {'payment_type': [self.cash.pk], 'category': {'id': self.food.pk}, 'value': 1},
+            {'payment_type': True, 'category': str(self.food.pk), 'value': 1},
+        ])
+
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()['errors']
+        self.assertEqual([error['index'] for error in errors], [1, 2, 3, 4])
+        self.assertEqual(set(errors[0]['errors']), {'category', 'value'})
+        self.assertEqual(set(errors[2]['errors']), {'payment_type', 'category'})
+        self.assertEqual(set(errors[3]['errors']), {'payment_type', 'category'})
+        self.assertEqual(Transaction.objects.filter(wallet=self.wallet).count(), 5)
+
+    def test_invalid_requests(self):
+        too_many = [{'payment_type': self.cash.pk, 'category': self.food.pk, 'value': 1}] * (MAX_BATCH_SIZE + 1)
+        for body in ('not json', json.dumps({'transactions': []}), json.dumps([]),
+                     json.dumps({'transactions': too_many})):
+            with self.subTest(body=body[:20]):
+                response = self.client.post(reverse('api_transactions'), data=body, content_type='application/json')
+                self.assertEqual(response.status_code, 400)
+
+    def test_csrf(self):
+        client = Client(enforce_csrf_checks=True)
+        client.login(username='testuser', password='1234')
+
+        self.assertEqual(self.post([], client=client).status_code, 403)
+
+    def test_large_batch_query_count(self):
+        response = self.post([{'payment_type': (self.cash, self.card)[i % 2].pk, 'category': self.food.pk,
+                               'value': 1} for i in range(MAX_BATCH_SIZE)])
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len({row['id'] for row in response.json()['results']}), MAX_BATCH_SIZE)
+        self.assertLessEqual(response.wsgi_request.query_stats.count, TransactionsApi.query_budget)
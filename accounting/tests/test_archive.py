@@ -0,0 +1,150 @@
+from datetime import datetime, timezone
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from accounting import ledger
+from accounting.archive import archive_transactions, archive_wallet
+from accounting.models import Wallet, PaymentType, Category, Transaction, ArchivedTransaction, CarryForward, \
+    MonthlyRollup, WalletSummary
+from accounting.rollups import rebuild_monthly_rollups
+from accounting.summaries import compute_wallet_summary, rebuild_wallet_summary
+from accounting.usage import rebuild_usage
+
+BEFORE = datetime(2021, 3, 1, tzinfo=timezone.utc)
+ROLLUP_FIELDS = ('category_id', 'payment_type_id', 'month', 'total', 'count')
+USAGE_FIELDS = ('pk', 'usage_count', 'last_used')
+
+
+class TestArchive(TestCase):
+    """Old transactions moved to the archive, with the totals carried forward"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='testuser', password='1234')
+        cls.wallet = Wallet.objects.create(owner=cls.user)
+        cls.cash = PaymentType.objects.create(wallet=cls.wallet, name='Cash', balance=1000)
+        cls.card = PaymentType.objects.create(wallet=cls.wallet, name='Card', balance=1000)
+        cls.food = Category.objects.create(name='Food', wallet=cls.wallet, type='Expense')
+        cls.salary = Category.objects.create(name='Salary', wallet=cls.wallet, type='Income')
+        for month in (1, 2, 3, 4):
+            for day in range(1, 11):
+                ledger.create_transaction(Transaction(
+                    wallet=cls.wallet, payment_type=(cls.cash, cls.card)[day % 2],
+                    category=cls.salary if day == 1 else cls.food, value=100 if day == 1 else -day,
+                    date=datetime(2021, month, day, 12, tzinfo=timezone.utc)))
+        rebuild_monthly_rollups()
+
+        other_user = User.objects.create_user(username='other', password='1234')
+        cls.other_wallet = Wallet.objects.create(owner=other_user)
+        other_cash = PaymentType.objects.create(wallet=cls.other_wallet, name='Cash')
+        other_food = Category.objects.create(name='Food', wallet=cls.other_wallet, type='Expense')
+        ledger.create_transaction(Transaction(wallet=cls.other_wallet, payment_type=other_cash, category=other_food,
+                                              value=-5, date=datetime(2020, 1, 1, tzinfo=timezone.utc)))
+
+    def setUp(self):
+        cache.clear()
+
+    def derived_data(self):
+        summary = WalletSummary.objects.get(wallet=self.wallet)
+        return {
+            'summary': (summary.balance, summary.income_all_time, summary.expense_all_time,
+                        summary.transaction_count, summary.last_transaction_date),
+            'rollups': set(MonthlyRollup.objects.filter(wallet=self.wallet).values_list(*ROLLUP_FIELDS)),
+            'usage': (set(PaymentType.objects.filter(wallet=self.wallet).values_list(*USAGE_FIELDS))
+                      | set(Category.objects.filter(wallet=self.wallet).values_list(*USAGE_FIELDS))),
+        }
+
+    def rebuild(self):
+        rebuild_wallet_summary(self.wallet)
+        rebuild_monthly_rollups()
+        rebuild_usage()
+
+    def test_archive_wallet(self):
+        before = self.derived_data()
+        version = WalletSummary.objects.get(wallet=self.wallet).version
+
+        # Batches of 7 split a month between database transactions
+        self.assertEqual(archive_wallet(self.wallet.pk, BEFORE, batch_size=7), 20)
+
+        self.assertEqual(Transaction.objects.filter(wallet=self.wallet).count(), 20)
+        self.assertFalse(Transaction.objects.filter(wallet=self.wallet, date__lt=BEFORE).exists())
+        self.assertEqual(ArchivedTransaction.objects.filter(wallet=self.wallet).count(), 20)
+        # Per month: cash food, card food and card salary
+        self.assertEqual(CarryForward.objects.filter(wallet=self.wallet).count(), 6)
+        self.assertEqual(CarryForward.objects.get(month=datetime(2021, 2, 1).date(), payment_type=self.card,
+                                                  category=self.food).count, 4)
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.archived_until, BEFORE)
+        self.assertNotEqual(WalletSummary.objects.get(wallet=self.wallet).version, version)
+
+        # Nothing changes, not even after rebuilding from the transactions and the carry-forward
+        self.assertEqual(self.derived_data(), before)
+        self.rebuild()
+        self.assertEqual(self.derived_data(), before)
+
+    def test_ids_are_kept(self):
+        ids = set(Transaction.objects.filter(wallet=self.wallet, date__lt=BEFORE).values_list('pk', flat=True))
+        archive_wallet(self.wallet.pk, BEFORE)
+
+        self.assertEqual(set(ArchivedTransaction.objects.filter(wallet=self.wallet).values_list('pk', flat=True)), ids)
+
+    def test_archive_again(self):
+        archive_wallet(self.wallet.pk, datetime(2021, 2, 1, tzinfo=timezone.utc))
+        before = self.derived_data()
+        # A transaction back-dated into an archived month stays in the transaction table until the next run
+        ledger.create_transaction(Transaction(wallet=self.wallet, payment_type=self.cash, category=self.food,
+                                              value=-1, date=datetime(2021, 1, 20, tzinfo=timezone.utc)))
+        self.rebuild()
+        archive_wallet(self.wallet.pk, BEFORE)
+
+        self.assertEqual(CarryForward.objects.get(month=datetime(2021, 1, 1).date(), payment_type=self.cash).count, 6)
+        self.rebuild()
+        after = self.derived_data()
+        self.assertEqual(after['summary'][3], before['summary'][3] + 1)
+        self.assertEqual(compute_wallet_summary(self.wallet)['transaction_count'], 41)
+
+    def test_archive_transactions(self):
+        output = StringIO()
+        call_command('archive_transactions', before='2021-03-01', stdout=output)
+
+        self.assertIn('Archived 21 transactions', output.getvalue())
+        self.assertEqual(archive_transactions(BEFORE), 0)
+
+    def test_move_transactions(self):
+        archive_wallet(self.wallet.pk, BEFORE)
+        ledger.move_transactions(self.cash, self.card)
+
+        self.assertFalse(ArchivedTransaction.objects.filter(payment_type=self.cash).exists())
+        self.assertFalse(CarryForward.objects.filter(payment_type=self.cash).exists())
+        self.assertEqual(CarryForward.objects.get(month=datetime(2021, 1, 1).date(), category=self.food).count, 9)
+        before = self.derived_data()
+        self.rebuild()
+        self.assertEqual(self.derived_data(), before)
+
+    def test_transactions_page(self):
+        archive_wallet(self.wallet.pk, BEFORE)
+        self.client.force_login(self.user)
+
+        response = self.client.get(reverse('transactions'))
+        self.assertEqual(len(response.context['transactions']), 20)
+        self.assertContains(response, 'archive=1')
+        self.assertEqual(response.context['income_sum'], 400)
+
+        response = self.client.get(reverse('transactions'), {'archive': '1'})
+        self.assertEqual([transaction.date for transaction in response.context['transactions']][:2],
+                         ['10.02.21', '09.02.21'])
+        self.assertEqual(len(response.context['transactions']), 20)
+        self.assertEqual(response.context['income_sum'], 200)
+        self.assertNotContains(response, reverse('transaction_details', args=[ArchivedTransaction.objects.first().pk]))
+        self.assertContains(response, '&lsaquo; Recent')
+
+        response = self.client.get(reverse('transactions'), {'archive': '1', 'payment_type': self.cash.pk})
+        self.assertEqual(len(response.context['transactions']), 10)
+
+        response = self.client.get(reverse('export_transactions'), {'archive': '1'})
+        self.assertEqual(len(b''.join(response.streaming_content).splitlines()), 21)
@@ -0,0 +1,111 @@
+import threading
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import AsyncClient, Client, TransactionTestCase, override_settings
+from django.urls import path, reverse
+
+from accounting.async_views import AsyncMain, AsyncTransactions, read_all
+from accounting.models import Wallet, PaymentType, Category, Transaction
+from accounting.summaries import rebuild_wallet_summary
+from iae import urls
+
+# The async pages in place of the sync ones, like under ASGI
+urlpatterns = [
+    path('', AsyncMain.as_view(), name='main'),
+    path('transactions/', AsyncTransactions.as_view(), name='transactions'),
+    *urls.urlpatterns,
+]
+
+PAGE_KEYS = ('balance', 'income_sum', 'expense_sum', 'income_all_time_sum', 'expense_all_time_sum',
+             'transactions_table', 'transactions_paginator')
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class TestAsyncViews(TransactionTestCase):
+    """Async Main and Transactions pages reading concurrently. The reads run on other connections,
+    which only see committed data."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='1234')
+        self.wallet = Wallet.objects.create(owner=self.user)
+        self.cash = PaymentType.objects.create(wallet=self.wallet, name='Cash', balance=100)
+        self.card = PaymentType.objects.create(wallet=self.wallet, name='Card', balance=0)
+        self.food = Category.objects.create(name='Food', wallet=self.wallet, type='Expense')
+        self.salary = Category.objects.create(name='Salary', wallet=self.wallet, type='Income')
+        for day in range(1, 31):
+            Transaction.objects.create(wallet=self.wallet, payment_type=(self.cash, self.card)[day % 2],
+                                       category=self.food, value=-day,
+                                       date=datetime(2021, 3, day, tzinfo=timezone.utc))
+        rebuild_wallet_summary(self.wallet)
+
+        self.client = AsyncClient()
+        self.client.force_login(self.user)
+        self.sync_client = Client()
+        self.sync_client.force_login(self.user)
+
+    async def test_reads_run_concurrently(self):
+        # Each read waits for the other one, run one after another they would time out
+        barrier = threading.Barrier(2, timeout=5)
+
+        self.assertEqual(sorted(await read_all(barrier.wait, barrier.wait)), [0, 1])
+
+    async def test_transactions_match_sync_page(self):
+        for params in ({}, {'payment_type': self.cash.pk, 'date__gte': '2021-03-10'}, {'category': self.food.pk}):
+            with self.subTest(**params):
+                cache.clear()
+                response = await self.client.get(reverse('transactions'), params)
+                cache.clear()
+                expected = await sync_to_async(self.sync_client.get)(reverse('transactions'), params)
+
+                self.assertEqual(response.status_code, 200)
+                for key in PAGE_KEYS:
+                    self.assertEqual(response.context[key], expected.context[key], key)
+                self.assertEqual([str(choice[1]) for choice in response.context['form'].fields['category'].choices],
+                                 [str(choice[1]) for choice in expected.context['form'].fields['category'].choices])
+
+    async def test_transactions_query_budget(self):
+        for params in ({}, {'payment_type': self.cash.pk, 'category': self.food.pk}):
+            with self.subTest(**params):
+                cache.clear()
+                response = await self.client.get(reverse('transactions'), params)
+
+                # The concurrent reads are counted too
+                self.assertGreater(response.asgi_request.query_stats.count, 3)
+                self.assertLessEqual(response.asgi_request.query_stats.count, AsyncTransactions.query_budget)
+
+    async def test_invalid_cursor(self):
+        self.assertEqual((await self.client.get(reverse('transactions'), {'cursor': 'invalid'})).status_code, 404)
+
+    async def test_main(self):
+        # The first page sets the CSRF cookie, which is part of the ETag
+        await self.client.get(reverse('main'))
+        response = await self.client.get(reverse('main'))
+        expected = await sync_to_async(self.sync_client.get)(reverse('main'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([transaction.value for transaction in response.context['transactions']],
+                         [transaction.value for transaction in expected.context['transactions']])
+        self.assertLessEqual(response.asgi_request.query_stats.count, AsyncMain.query_budget)
+
+        revalidated = await self.client.get(reverse('main'), **{'If-None-Match': response['ETag']})
+        self.assertEqual(revalidated.status_code, 304)
+
+    async def test_create_transaction(self):
+        data = urlencode({'category': self.food.pk, 'payment_type': self.cash.pk, 'value': 5})
+        response = await self.client.post(reverse('main'), data, content_type='application/x-www-form-urlencoded')
+
+        self.assertRedirects(response, reverse('main'), fetch_redirect_response=False)
+        self.cash = await sync_to_async(PaymentType.objects.get)(pk=self.cash.pk)
+        self.assertEqual(self.cash.balance, 95)
+
+    async def test_anonymous(self):
+        for name in ('main', 'transactions'):
+            with self.subTest(name):
+                response = await AsyncClient().get(reverse(name))
+                self.assertRedirects(response, f'{reverse("login")}?next={reverse(name)}',
+                                     fetch_redirect_response=False)
@@ -0,0 +1,176 @@
+from datetime import datetime, timedelta, timezone
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db.models import Sum
+from django.test import TestCase
+from django.urls import reverse
+
+from accounting import ledger
+from accounting.archive import archive_wallet
+from accounting.balances import build_checkpoints, get_balances, running_balances
+from accounting.models import Wallet, PaymentType, Category, Transaction, BalanceCheckpoint
+
+
+def date(day, hour=12):
+    return datetime(2021, 1, 1, hour, tzinfo=timezone.utc) + timedelta(days=day)
+
+
+class TestBalances(TestCase):
+    """Historical and running balances from the balance checkpoints"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='testuser', password='1234')
+        cls.wallet = Wallet.objects.create(owner=cls.user)
+        cls.cash = PaymentType.objects.create(wallet=cls.wallet, name='Cash', balance=1000)
+        cls.card = PaymentType.objects.create(wallet=cls.wallet, name='Card', balance=500)
+        cls.food = Category.objects.create(name='Food', wallet=cls.wallet, type='Expense')
+        cls.salary = Category.objects.create(name='Salary', wallet=cls.wallet, type='Income')
+        for day in range(60):
+            for hour in (9, 18):
+                ledger.create_transaction(Transaction(
+                    wallet=cls.wallet, payment_type=(cls.cash, cls.card)[day % 3 == 0],
+                    category=cls.salary if day % 10 == 0 else cls.food, value=200 if day % 10 == 0 else -day - 1,
+                    date=date(day, hour)))
+
+        other_user = User.objects.create_user(username='other', password='1234')
+        other_wallet = Wallet.objects.create(owner=other_user)
+        other_cash = PaymentType.objects.create(wallet=other_wallet, name='Cash')
+        other_food = Category.objects.create(name='Food', wallet=other_wallet, type='Expense')
+        ledger.create_transaction(Transaction(wallet=other_wallet, payment_type=other_cash, category=other_food,
+                                              value=-5, date=date(10)))
+
+    def setUp(self):
+        cache.clear()
+
+    def expected_balance(self, payment_type, at, pk=None):
+        """Opening balance plus the transactions up to the position, from the transaction table"""
+        transactions = Transaction.objects.filter(payment_type=payment_type)
+        payment_type.refresh_from_db()
+        opening = payment_type.balance - (transactions.aggregate(total=Sum('value'))['total'] or 0)
+        if pk is not None:
+            transactions = transactions.exclude(date=at, pk__gt=pk)
+        return opening + (transactions.filter(date__lte=at).aggregate(total=Sum('value'))['total'] or 0)
+
+    def assertBalances(self, at, pk=None):
+        balances = get_balances(self.wallet, at, pk)
+        self.assertEqual(balances, {payment_type.pk: self.expected_balance(payment_type, at, pk)
+                                    for payment_type in (self.cash, self.card)})
+
+    def test_without_checkpoints(self):
+        for day in (-1, 0, 15, 59, 70):
+            self.assertBalances(date(day))
+        self.assertEqual(get_balances(self.wallet, date(-1)), {self.cash.pk: 1000, self.card.pk: 500})
+
+    def test_checkpoints(self):
+        self.assertEqual(build_checkpoints(), 60 + 1)
+        # Days with transactions of the payment type
+        self.assertEqual(BalanceCheckpoint.objects.filter(payment_type=self.card).count(), 20)
+        checkpoint = BalanceCheckpoint.objects.get(payment_type=self.card, until=date(4, 0))
+        self.assertEqual(checkpoint.balance, self.expected_balance(self.card, date(4, 0)))
+        # Nothing new since the last run
+        self.assertEqual(build_checkpoints(), 0)
+
+        for day in (-1, 0, 15, 59, 70):
+            with self.assertNumQueries(2):
+                get_balances(self.wallet, date(day))
+            self.assertBalances(date(day))
+            self.assertBalances(date(day, 0))
+        transaction = Transaction.objects.filter(date=date(30, 9)).first()
+        self.assertBalances(transaction.date, transaction.pk)
+
+    def test_back_dated_transactions(self):
+        build_checkpoints()
+        ledger.create_transaction(Transaction(wallet=self.wallet, payment_type=self.cash, category=self.food,
+                                              value=-50, date=date(20)))
+
+        # Checkpoints of the cash after the transaction are deleted, the card keeps its own
+        self.assertFalse(BalanceCheckpoint.objects.filter(payment_type=self.cash, until__gt=date(20)).exists())
+        self.assertTrue(BalanceCheckpoint.objects.filter(payment_type=self.cash, until__lt=date(20)).exists())
+        self.assertEqual(BalanceCheckpoint.objects.filter(payment_type=self.card).count(), 20)
+        self.assertBalances(date(40))
+
+        transaction = Transaction.objects.get(date=date(45, 9))
+        transaction.date = date(5)
+        transaction.payment_type = self.card
+        ledger.update_transaction(transaction)
+        self.assertFalse(BalanceCheckpoint.objects.filter(payment_type=self.card, until__gt=date(5)).exists())
+        self.assertBalances(date(40))
+
+        ledger.delete_transaction(Transaction.objects.get(date=date(3, 18)))
+        self.assertFalse(BalanceCheckpoint.objects.filter(payment_type=self.card, until__gt=date(3)).exists())
+
+        # The next run continues from the checkpoints left
+        build_checkpoints()
+        for day in (4, 6, 22, 46):
+            self.assertEqual(BalanceCheckpoint.objects.get(payment_type=self.card, until=date(day, 0)).balance,
+                             self.expected_balance(self.card, date(day, 0)))
+        self.assertBalances(date(40))
+
+    def test_move_transactions(self):
+        build_checkpoints()
+        ledger.move_transactions(self.cash, self.card)
+
+        self.assertFalse(BalanceCheckpoint.objects.filter(payment_type__wallet=self.wallet).exists())
+        build_checkpoints()
+        self.assertBalances(date(30))
+
+    def test_archived_transactions(self):
+        build_checkpoints()
+        archive_wallet(self.wallet.pk, date(30, 0))
+        BalanceCheckpoint.objects.filter(until__gt=date(10)).delete()
+
+        for day in (5, 20, 40):
+            self.assertEqual(get_balances(self.wallet, date(day)),
+                             get_balances(self.wallet, date(day), payment_types=[self.cash.pk, self.card.pk]))
+        build_checkpoints()
+        self.assertEqual(BalanceCheckpoint.objects.count(), 61)
+
+    def test_running_balances(self):
+        build_checkpoints()
+        transactions = list(Transaction.objects.filter(payment_type=self.cash, date__lt=date(40)).order_by(
+            '-date', '-id')[:10])
+
+        with self.assertNumQueries(3):
+            balances = running_balances(self.wallet, transactions)
+        self.assertEqual(balances, {transaction.pk: self.expected_balance(self.cash, transaction.date, transaction.pk)
+                                    for transaction in transactions})
+
+    def test_transactions_page(self):
+        build_checkpoints()
+        self.client.force_login(self.user)
+
+        response = self.client.get(reverse('transactions'))
+        transactions = response.context['transactions']
+        self.cash.refresh_from_db()
+        self.assertEqual(transactions[0].running_balance, self.cash.balance)
+        for transaction in transactions:
+            stored = Transaction.objects.get(pk=transaction.pk)
+            self.assertEqual(transaction.running_balance,
+                             self.expected_balance(stored.payment_type, stored.date, stored.pk))
+
+    def test_balances_api(self):
+        self.client.force_login(self.user)
+
+        response = self.client.get(reverse('api_balances'), {'date': '2021-01-01'})
+        self.assertEqual(response.status_code, 200)
+        results = {row['id']: row['balance'] for row in response.json()['results']}
+        self.assertEqual(results, {self.cash.pk: '1000.00', self.card.pk: '500.00'})
+        self.assertEqual(response.json()['total'], '1500.00')
+
+        response = self.client.get(reverse('api_balances'))
+        self.cash.refresh_from_db()
+        results = {row['id']: row['balance'] for row in response.json()['results']}
+        self.assertEqual(results[self.cash.pk], str(self.cash.balance))
+
+        response = self.client.get(reverse('api_balances'), {'date': 'yesterday'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_command(self):
+        output = StringIO()
+        call_command('build_balance_checkpoints', wallet=[self.wallet.pk], stdout=output)
+
+        self.assertIn('Created 60 balance checkpoints', output.getvalue())
@@ -0,0 +1,58 @@
+import json
+import tempfile
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from accounting.benchmarks import compare, run_benchmarks
+
+
+class TestBenchmarks(TestCase):
+    """View benchmark harness"""
+
+    def test_run_benchmarks(self):
+        results = run_benchmarks(sizes=[50], repeat=2)
+        views = results['results']['50']
+
+        self.assertIn('GET transactions', views)
+        self.assertIn('GET login', views)
+        self.assertIn('POST main', views)
+        for name, metrics in views.items():
+            self.assertLess(metrics['status'], 400, name)
+            self.assertLessEqual(metrics['p50_ms'], metrics['p95_ms'])
+            self.assertLessEqual(metrics['p95_ms'], metrics['p99_ms'])
+        self.assertGreater(views['GET transactions']['queries'], 0)
+        self.assertGreater(views['GET transactions']['peak_memory_kb'], 0)
+        # Transactions created by the benchmark are deleted
+        self.assertEqual(run_benchmarks(sizes=[50], repeat=1)['results']['50']['GET main']['status'], 200)
+
+    def test_asgi(self):
+        results = run_benchmarks(sizes=[50], repeat=1, asgi=True)
+
+        self.assertEqual(results['meta']['handler'], 'asgi')
+        for name, metrics in results['results']['50'].items():
+            self.assertLess(metrics['status'], 400, name)
+
+    def test_compare(self):
+        baseline = {'results': {'1000': {'GET main': {'p95_ms': 10, 'queries': 6},
+                                         'GET reports': {'p95_ms': 10, 'queries': 4}}}}
+        results = {'results': {'1000': {'GET main': {'p95_ms': 11.9, 'queries': 6},
+                                        'GET reports': {'p95_ms': 12.1, 'queries': 5},
+                                        'GET new_view': {'p95_ms': 100, 'queries': 100}}}}
+
+        self.assertEqual(compare(results, baseline), [('1000', 'GET reports', 'p95_ms', 10, 12.1),
+                                                      ('1000', 'GET reports', 'queries', 4, 5)])
+
+    def test_command(self):
+        with tempfile.NamedTemporaryFile('w+', suffix='.json') as output:
+            call_command('benchmark_views', '--sizes', 20, '--repeat', 1, '--output', output.name, stdout=StringIO())
+            results = json.load(output)
+            self.assertEqual(results['meta']['repeat'], 1)
+
+            for metrics in results['results']['20'].values():
+                metrics['queries'] -= 1
+            json.dump(results, open(output.name, 'w'))
+            with self.assertRaisesMessage(CommandError, 'Regressions against the baseline'):
+                call_command('benchmark_views', '--sizes', 20, '--repeat', 1, '--baseline', output.name,
+                             '--tolerance', 100, stdout=StringIO())
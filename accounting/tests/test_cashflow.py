@@ -0,0 +1,138 @@
+import zoneinfo
+from datetime import date, datetime, timezone
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from accounting import ledger
+from accounting.archive import archive_wallet
+from accounting.cashflow import get_cashflow
+from accounting.models import Wallet, PaymentType, Category, Transaction
+
+KYIV = zoneinfo.ZoneInfo('Europe/Kyiv')
+
+
+class TestCashflow(TestCase):
+    """Income, expense and net per bucket, summed by the database"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='testuser', password='1234')
+        cls.wallet = Wallet.objects.create(owner=cls.user)
+        cls.cash = PaymentType.objects.create(wallet=cls.wallet, name='Cash')
+        cls.card = PaymentType.objects.create(wallet=cls.wallet, name='Card')
+        cls.food = Category.objects.create(name='Food', wallet=cls.wallet, type='Expense')
+        cls.salary = Category.objects.create(name='Salary', wallet=cls.wallet, type='Income')
+        cls.transfer = Category.objects.create(name='Transfer', wallet=cls.wallet, type='Transfer', service=True)
+        for payment_type, category, value, day in (
+                (cls.card, cls.salary, 1000, datetime(2021, 1, 4, 10)),
+                (cls.cash, cls.food, -10, datetime(2021, 1, 5, 10)),
+                (cls.card, cls.food, -20, datetime(2021, 1, 11, 10)),
+                # February in Kyiv
+                (cls.cash, cls.food, -5, datetime(2021, 1, 31, 23, 30)),
+                (cls.cash, cls.transfer, 100, datetime(2021, 2, 1, 10)),
+                (cls.card, cls.food, -40, datetime(2021, 4, 2, 10))):
+            ledger.create_transaction(Transaction(wallet=cls.wallet, payment_type=payment_type, category=category,
+                                                  value=value, date=day.replace(tzinfo=timezone.utc)))
+
+        other_user = User.objects.create_user(username='other', password='1234')
+        other_wallet = Wallet.objects.create(owner=other_user)
+        ledger.create_transaction(Transaction(
+            wallet=other_wallet, payment_type=PaymentType.objects.create(wallet=other_wallet, name='Cash'),
+            category=Category.objects.create(name='Food', wallet=other_wallet, type='Expense'), value=-1,
+            date=datetime(2021, 1, 5, tzinfo=timezone.utc)))
+
+    def setUp(self):
+        cache.clear()
+
+    def totals(self, rows):
+        return [(row['date'], row['income'], row['expense'], row['net']) for row in rows]
+
+    def test_months(self):
+        with self.assertNumQueries(1):
+            rows = get_cashflow(self.wallet, 'month')
+
+        # Transfers don't count, months without transactions have a row
+        self.assertEqual(self.totals(rows), [(date(2021, 1, 1), 1000, -35, 965), (date(2021, 2, 1), 0, 0, 0),
+                                             (date(2021, 3, 1), 0, 0, 0), (date(2021, 4, 1), 0, -40, -40)])
+
+    def test_time_zone(self):
+        rows = get_cashflow(self.wallet, 'month', tz=KYIV)
+
+        self.assertEqual(self.totals(rows)[:2], [(date(2021, 1, 1), 1000, -30, 970), (date(2021, 2, 1), 0, -5, -5)])
+
+    def test_weeks_and_days(self):
+        rows = get_cashflow(self.wallet, 'week', date_from=date(2021, 1, 1), date_to=date(2021, 1, 17))
+        # Weeks start on Monday
+        self.assertEqual(self.totals(rows), [(date(2020, 12, 28), 0, 0, 0), (date(2021, 1, 4), 1000, -10, 990),
+                                             (date(2021, 1, 11), 0, -20, -20)])
+
+        rows = get_cashflow(self.wallet, 'day', date_from=date(2021, 1, 4), date_to=date(2021, 1, 5))
+        self.assertEqual(self.totals(rows), [(date(2021, 1, 4), 1000, 0, 1000), (date(2021, 1, 5), 0, -10, -10)])
+
+    def test_split(self):
+        rows = get_cashflow(self.wallet, 'month', date_to=date(2021, 1, 31), split='payment_type')
+
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['split'], {self.cash.pk: {'income': 0, 'expense': -15, 'net': -15},
+                                            self.card.pk: {'income': 1000, 'expense': -20, 'net': 980}})
+
+    def test_archive(self):
+        before = get_cashflow(self.wallet, 'month')
+        archive_wallet(self.wallet.pk, datetime(2021, 3, 1, tzinfo=timezone.utc))
+        self.wallet.refresh_from_db()
+
+        with self.assertNumQueries(2):
+            self.assertEqual(get_cashflow(self.wallet, 'month'), before)
+        with self.assertNumQueries(1):
+            get_cashflow(self.wallet, 'month', date_from=date(2021, 3, 1))
+
+    def test_api(self):
+        self.client.force_login(self.user)
+        parameters = {'bucket': 'month', 'date__gte': '2021-01-01', 'date__lte': '2021-02-28',
+                      'tz': 'Europe/Kyiv', 'split': 'category'}
+
+        response = self.client.get(reverse('api_cashflow'), parameters)
+        self.assertEqual(response.json(), {
+            'bucket': 'month', 'timezone': 'Europe/Kyiv', 'split': 'category',
+            'results': [
+                {'date': '2021-01-01', 'income': '1000.00', 'expense': '-30.00', 'net': '970.00', 'split': [
+                    {'id': self.food.pk, 'income': '0.00', 'expense': '-30.00', 'net': '-30.00'},
+                    {'id': self.salary.pk, 'income': '1000.00', 'expense': '0.00', 'net': '1000.00'}]},
+                {'date': '2021-02-01', 'income': '0.00', 'expense': '-5.00', 'net': '-5.00', 'split': [
+                    {'id': self.food.pk, 'income': '0.00', 'expense': '-5.00', 'net': '-5.00'}]},
+            ]})
+
+        # Cached until the wallet changes
+        with self.assertNumQueries(3):
+            self.client.get(reverse('api_cashflow'), parameters)
+        ledger.create_transaction(Transaction(wallet=self.wallet, payment_type=self.cash, category=self.food,
+                                              value=-1, date=datetime(2021, 2, 2, tzinfo=timezone.utc)))
+        response = self.client.get(reverse('api_cashflow'), parameters)
+        self.assertEqual(response.json()['results'][1]['net'], '-6.00')
+
+    def test_invalid_parameters(self):
+        self.client.force_login(self.user)
+
+        for parameters in ({'tz': 'Mars/Olympus'}, {'bucket': 'year'},
+                           {'date__gte': '2021-02-01', 'date__lte': '2021-01-01'},
+                           {'date__lte': '9999-12-31'}, {'date__gte': '0001-01-01', 'tz': 'Asia/Tokyo'},
+                           {'date__gte': '1000-01-01', 'date__lte': '3000-01-01', 'bucket': 'day'},
+                           {'date__gte': '2000-01-01', 'bucket': 'day'}):
+            response = self.client.get(reverse('api_cashflow'), parameters)
+            self.assertEqual(response.status_code, 400, parameters)
+            response = self.client.get(reverse('cashflow'), parameters)
+            self.assertEqual(response.status_code, 400, parameters)
+            self.assertEqual(response.context['chart'], [])
+
+    def test_page(self):
+        self.client.force_login(self.user)
+
+        response = self.client.get(reverse('cashflow'), {'bucket': 'month', 'split': 'category'})
+        self.assertEqual(response.status_code, 200)
+        chart = response.context['chart']
+        self.assertEqual([row['income_width'] for row in chart], [100, 0, 0, 0])
+        self.assertEqual([group['name'] for group in chart[0]['groups']], ['Food', 'Salary'])
+        self.assertContains(response, 'width: 3.5%')
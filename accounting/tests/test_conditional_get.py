@@ -0,0 +1,73 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, Client
+from django.urls import reverse
+
+from accounting.models import Wallet, PaymentType, Category, Transaction
+from accounting.summaries import rebuild_wallet_summary
+
+
+class TestConditionalGet(TestCase):
+    """Wallet pages answer 304 Not Modified while the wallet is unchanged"""
+    pages = ('main', 'transactions', 'categories', 'payment_types')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='testuser', password='1234')
+        cls.wallet = Wallet.objects.create(owner=cls.user)
+        cls.cash = PaymentType.objects.create(wallet=cls.wallet, name='Cash', balance=100)
+        cls.food = Category.objects.create(name='Food', wallet=cls.wallet, type='Expense')
+        Transaction.objects.create(wallet=cls.wallet, payment_type=cls.cash, category=cls.food, value=-10)
+        rebuild_wallet_summary(cls.wallet)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.login(username='testuser', password='1234')
+        # The first page sets the CSRF cookie, which is part of the ETag
+        self.client.get(reverse('main'))
+
+    def revalidate(self, name, response):
+        return self.client.get(reverse(name), HTTP_IF_NONE_MATCH=response['ETag'],
+                               HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+
+    def test_not_modified(self):
+        for name in self.pages:
+            with self.subTest(name):
+                response = self.client.get(reverse(name))
+                self.assertEqual(response.status_code, 200)
+                self.assertIn('no-cache', response['Cache-Control'])
+                self.assertIn('private', response['Cache-Control'])
+
+                # Session, user with the wallet and the wallet summary
+                with self.assertNumQueries(3):
+                    revalidated = self.revalidate(name, response)
+                self.assertEqual(revalidated.status_code, 304)
+                self.assertEqual(revalidated.templates, [])
+                self.assertEqual(revalidated['ETag'], response['ETag'])
+
+    def test_if_modified_since(self):
+        response = self.client.get(reverse('transactions'))
+
+        revalidated = self.client.get(reverse('transactions'), HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(revalidated.status_code, 304)
+
+    def test_write_changes_etag(self):
+        responses = {name: self.client.get(reverse(name)) for name in self.pages}
+
+        self.client.post(reverse('main'), data={'category': self.food.pk, 'payment_type': self.cash.pk, 'value': 5})
+
+        for name, response in responses.items():
+            with self.subTest(name):
+                revalidated = self.revalidate(name, response)
+                self.assertEqual(revalidated.status_code, 200)
+                self.assertNotEqual(revalidated['ETag'], response['ETag'])
+
+    def test_new_csrf_cookie_changes_etag(self):
+        response = self.client.get(reverse('main'))
+
+        self.client.logout()
+        self.client.login(username='testuser', password='1234')
+        self.client.get(reverse('payment_types'))
+
+        self.assertEqual(self.client.get(reverse('main'), HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
@@ -0,0 +1,83 @@
+import gzip
+import io
+import json
+from datetime import datetime, timezone
+
+from django.contrib.auth.models import User
+from django.test import TestCase, Client
+from django.urls import reverse
+
+from accounting.exports import csv_chunks
+from accounting.imports import import_transactions
+from accounting.models import Wallet, PaymentType, Category, Transaction
+from accounting.summaries import rebuild_wallet_summary
+
+
+class TestExportTransactions(TestCase):
+    """Streaming CSV/JSONL export of the filtered transactions"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='testuser', password='1234')
+        cls.wallet = Wallet.objects.create(owner=cls.user)
+        cls.cash = PaymentType.objects.create(wallet=cls.wallet, name='Cash', balance=0)
+        cls.food = Category.objects.create(name='Food', wallet=cls.wallet, type='Expense')
+        cls.salary = Category.objects.create(name='Salary', wallet=cls.wallet, type='Income')
+        for day in range(1, 11):
+            Transaction.objects.create(wallet=cls.wallet, payment_type=cls.cash,
+                                       category=cls.food if day % 2 else cls.salary, value=-day if day % 2 else day,
+                                       description=f'Day "{day}"', date=datetime(2021, 3, day, tzinfo=timezone.utc))
+        rebuild_wallet_summary(cls.wallet)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.login(username='testuser', password='1234')
+
+    def export(self, **params):
+        response = self.client.get(reverse('export_transactions'), data=params)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content)
+
+    def test_csv(self):
+        response, content = self.export(category=self.food.pk)
+        lines = content.decode().splitlines()
+
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="transactions.csv"')
+        self.assertEqual(lines[0], 'date,payment_type,category,value,description')
+        self.assertEqual(lines[1], '2021-03-09 00:00:00+00:00,Cash,Food,-9.00,"Day ""9"""')
+        self.assertEqual(len(lines), 6)
+
+    def test_jsonl(self):
+        response, content = self.export(format='jsonl', date__gte='2021-03-09')
+        rows = [json.loads(line) for line in content.decode().splitlines()]
+
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        self.assertEqual([row['value'] for row in rows], ['10.00', '-9.00'])
+
+    def test_gzip(self):
+        response, content = self.export(gzip=1)
+
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="transactions.csv.gz"')
+        self.assertEqual(len(gzip.decompress(content).decode().splitlines()), 11)
+
+    def test_unknown_format(self):
+        self.assertEqual(self.client.get(reverse('export_transactions'), data={'format': 'xml'}).status_code, 404)
+
+    def test_chunks(self):
+        chunks = list(csv_chunks([(str(number),) for number in range(5)], chunk_size=2))
+
+        self.assertEqual(chunks, ['date,payment_type,category,value,description\r\n0\r\n1\r\n', '2\r\n3\r\n', '4\r\n'])
+
+    def test_export_can_be_imported(self):
+        _, content = self.export()
+        user = User.objects.create_user(username='otheruser', password='1234')
+        wallet = Wallet.objects.create(owner=user)
+        PaymentType.objects.create(wallet=wallet, name='Cash', balance=0)
+        Category.objects.create(name='Food', wallet=wallet, type='Expense')
+        Category.objects.create(name='Salary', wallet=wallet, type='Income')
+
+        import_transactions(wallet, io.StringIO(content.decode()))
+
+        fields = ('date', 'payment_type__name', 'category__name', 'value', 'description')
+        self.assertEqual(list(wallet.transaction_set.order_by('date').values_list(*fields)),
+                         list(self.wallet.transaction_set.order_by('date').values_list(*fields)))
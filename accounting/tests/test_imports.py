@@ -0,0 +1,120 @@
+import io
+import os
+import tempfile
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, Client
+from django.urls import reverse
+
+from accounting.imports import TransactionImportError, import_transactions
+from accounting.models import Wallet, PaymentType, Category, Transaction, MonthlyRollup
+from accounting.rollups import rebuild_monthly_rollups
+from accounting.summaries import compute_wallet_summary, rebuild_wallet_summary
+
+CSV = '''date,payment_type,category,value,description
+2021-01-05 10:00,Cash,Food,12.50,Bread
+2021-01-20,card,Salary,1000,January
+05.02.2021 18:30,Card,Food,-40,
+2021-02-07,Cash,Salary,500,Bonus
+'''
+
+
+class TestImportTransactions(TestCase):
+    """Bulk CSV import"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='testuser', password='1234')
+        cls.wallet = Wallet.objects.create(owner=cls.user)
+        cls.cash = PaymentType.objects.create(wallet=cls.wallet, name='Cash', balance=100)
+        cls.card = PaymentType.objects.create(wallet=cls.wallet, name='Card', balance=200)
+        Category.objects.create(name='Food', wallet=cls.wallet, type='Expense')
+        Category.objects.create(name='Salary', wallet=cls.wallet, type='Income')
+        rebuild_wallet_summary(cls.wallet)
+
+    def test_import(self):
+        imported = import_transactions(self.wallet, io.StringIO(CSV), batch_size=3)
+        self.cash.refresh_from_db()
+        self.card.refresh_from_db()
+
+        self.assertEqual(imported, 4)
+        self.assertEqual(sorted(self.wallet.transaction_set.values_list('value', flat=True)),
+                         [-40, Decimal('-12.5'), 500, 1000])
+        self.assertEqual(self.cash.balance, Decimal('587.50'))
+        self.assertEqual(self.card.balance, 1160)
+
+        self.wallet.summary.refresh_from_db()
+        summary = compute_wallet_summary(self.wallet)
+        self.assertEqual((self.wallet.summary.balance, self.wallet.summary.income_all_time,
+                          self.wallet.summary.expense_all_time, self.wallet.summary.transaction_count),
+                         (summary['balance'], summary['income_all_time_sum'], summary['expense_all_time_sum'],
+                          summary['transaction_count']))
+
+        fields = ('category_id', 'payment_type_id', 'month', 'total', 'count')
+        incremental = set(MonthlyRollup.objects.values_list(*fields))
+        rebuild_monthly_rollups()
+        self.assertEqual(incremental, set(MonthlyRollup.objects.values_list(*fields)))
+
+    def test_invalid_rows_import_nothing(self):
+        lines = CSV + '2021-03-01,Bank,Food,10,\nyesterday,Cash,Food,10,\n2021-03-01,Cash,Food,ten,\n'
+
+        with self.assertRaises(TransactionImportError) as context:
+            import_transactions(self.wallet, io.StringIO(lines), batch_size=2)
+        self.cash.refresh_from_db()
+
+        self.assertEqual(len(context.exception.errors), 3)
+        self.assertTrue(context.exception.errors[0].startswith('Line 6: Unknown payment type'))
+        self.assertFalse(Transaction.objects.exists())
+        self.assertEqual(self.cash.balance, 100)
+
+    def test_missing_columns(self):
+        with self.assertRaisesMessage(TransactionImportError, 'Missing columns: category, value'):
+            import_transactions(self.wallet, io.StringIO('date,payment_type\n2021-01-01,Cash\n'))
+
+    def test_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as file:
+            file.write(CSV)
+        self.addCleanup(os.remove, file.name)
+        out = StringIO()
+
+        call_command('import_transactions', file.name, '--wallet', self.wallet.pk, stdout=out)
+
+        self.assertIn('Imported 4 transactions', out.getvalue())
+        with self.assertRaisesMessage(CommandError, 'Wallet not found'):
+            call_command('import_transactions', file.name, '--wallet', 0)
+
+    def test_command_latin1(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', encoding='latin-1', delete=False) as file:
+            file.write(CSV.replace('Bread', 'Caf\xe9'))
+        self.addCleanup(os.remove, file.name)
+
+        with self.assertRaisesMessage(CommandError, 'the file must be UTF-8 encoded'):
+            call_command('import_transactions', file.name, '--wallet', self.wallet.pk)
+        self.assertFalse(self.wallet.transaction_set.exists())
+
+    def test_view(self):
+        client = Client()
+        client.login(username='testuser', password='1234')
+
+        response = client.post(reverse('import_transactions'),
+                               {'file': SimpleUploadedFile('history.csv', CSV.encode('utf-8-sig'))})
+        self.assertRedirects(response, reverse('transactions'))
+        self.assertEqual(self.wallet.transaction_set.count(), 4)
+
+        response = client.post(reverse('import_transactions'),
+                               {'file': SimpleUploadedFile('history.csv', b'date,payment_type,category,value\n'
+                                                                          b'2021-01-01,Cash,Rent,10\n')})
+        self.assertContains(response, 'Line 2: Unknown category')
+        self.assertEqual(self.wallet.transaction_set.count(), 4)
+
+        # A field over the csv module's size limit, like a stray quote in a large file
+        malformed = b'date,payment_type,category,value\n2021-01-01,Cash,Food,"' + b'1' * 200000 + b'"\n'
+        response = client.post(reverse('import_transactions'),
+                               {'file': SimpleUploadedFile('history.csv', malformed)})
+        self.assertContains(response, 'Line 2: field larger than field limit')
+        self.assertEqual(self.wallet.transaction_set.count(), 4)
@@ -0,0 +1,197 @@
+import random
+import threading
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase, skipUnlessDBFeature
+
+from accounting import ledger
+from accounting.models import Wallet, PaymentType, Category, Transaction, MonthlyRollup
+from accounting.rollups import rebuild_monthly_rollups
+from accounting.summaries import compute_wallet_summary, rebuild_wallet_summary
+
+
+class TestMoveTransactions(TestCase):
+    """Set-based reassignment of transactions"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='testuser', password='1234')
+        cls.wallet = Wallet.objects.create(owner=cls.user)
+        cls.cash = PaymentType.objects.create(wallet=cls.wallet, name='Cash', balance=300)
+        cls.card = PaymentType.objects.create(wallet=cls.wallet, name='Card', balance=1000)
+        cls.income_category = Category.objects.create(name='Income', wallet=cls.wallet, type='Income')
+        cls.salary_category = Category.objects.create(name='Salary', wallet=cls.wallet, type='Income')
+        for i in range(25):
+            Transaction.objects.create(wallet=cls.wallet, payment_type=cls.cash if i % 5 else cls.card,
+                                       category=cls.income_category if i % 2 else cls.salary_category, value=10)
+        rebuild_monthly_rollups()
+
+    def assertRollupsConsistent(self):
+        fields = ('category_id', 'payment_type_id', 'month', 'total', 'count')
+        incremental = set(MonthlyRollup.objects.values_list(*fields))
+        rebuild_monthly_rollups()
+
+        self.assertEqual(incremental, set(MonthlyRollup.objects.values_list(*fields)))
+
+    def test_move_payment_type(self):
+        with self.assertNumQueries(15):
+            moved = ledger.move_transactions(self.cash, self.card)
+        self.cash.refresh_from_db()
+        self.card.refresh_from_db()
+
+        self.assertEqual(moved, 20)
+        self.assertEqual(self.card.transaction_set.count(), 25)
+        self.assertEqual(self.cash.balance, 0)
+        self.assertEqual(self.card.balance, 1300)
+        self.assertRollupsConsistent()
+
+    def test_move_category_in_chunks(self):
+        progress = []
+
+        moved = ledger.move_transactions(self.salary_category, self.income_category, chunk_size=5,
+                                         progress=lambda *args: progress.append(args))
+
+        self.assertEqual(moved, 13)
+        self.assertEqual(progress, [(5, 13), (10, 13), (13, 13)])
+        self.assertFalse(self.salary_category.transaction_set.exists())
+        self.assertRollupsConsistent()
+
+    def test_reassign_transactions_command(self):
+        out = StringIO()
+
+        call_command('reassign_transactions', '--payment-type', self.cash.pk, self.card.pk, '--chunk-size', 8,
+                     '--delete', stdout=out)
+        self.card.refresh_from_db()
+
+        self.assertIn('8/20 transactions moved', out.getvalue())
+        self.assertIn('Moved 20 transactions from "Cash" to "Card"', out.getvalue())
+        self.assertFalse(PaymentType.objects.filter(pk=self.cash.pk).exists())
+        self.assertEqual(self.card.balance, 1300)
+
+
+class TestLedgerOperations(TestCase):
+    """Balances applied by the ledger operations"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='testuser', password='1234')
+        cls.wallet = Wallet.objects.create(owner=cls.user)
+        cls.cash = PaymentType.objects.create(wallet=cls.wallet, name='Cash', balance=300)
+        cls.card = PaymentType.objects.create(wallet=cls.wallet, name='Card', balance=1000)
+        cls.category = Category.objects.create(name='Food', wallet=cls.wallet, type='Expense')
+        Category.objects.create(name='Transfer', wallet=cls.wallet, type='Transfer', service=True)
+        rebuild_wallet_summary(cls.wallet)
+
+    def assertBalances(self, cash, card):
+        self.cash.refresh_from_db()
+        self.card.refresh_from_db()
+        self.assertEqual((self.cash.balance, self.card.balance), (cash, card))
+
+    def test_create_update_delete(self):
+        transaction = ledger.create_transaction(Transaction(wallet=self.wallet, payment_type=self.cash,
+                                                            category=self.category, value=-100))
+        self.assertBalances(200, 1000)
+
+        transaction.payment_type = self.card
+        transaction.value = -40
+        ledger.update_transaction(transaction)
+        self.assertBalances(300, 960)
+
+        self.assertTrue(ledger.delete_transaction(transaction))
+        self.assertFalse(ledger.delete_transaction(transaction))
+        self.assertBalances(300, 1000)
+
+    def test_delete_uses_stored_value(self):
+        transaction = ledger.create_transaction(Transaction(wallet=self.wallet, payment_type=self.cash,
+                                                            category=self.category, value=-100))
+        stale = Transaction.objects.get(pk=transaction.pk)
+        transaction.value = -30
+        ledger.update_transaction(transaction)
+
+        ledger.delete_transaction(stale)
+
+        self.assertBalances(300, 1000)
+
+    def test_transfer(self):
+        transactions = ledger.transfer(self.wallet, self.card, self.cash, Decimal(250), 'Cash withdrawal')
+
+        self.assertEqual([t.value for t in transactions], [-250, 250])
+        self.assertBalances(550, 750)
+        self.assertEqual(self.wallet.summary.balance, 1300)
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class TestConcurrentWrites(TransactionTestCase):
+    """Balances stay exact under parallel writes to the same payment types"""
+    threads = 8
+    operations = 30
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='1234')
+        self.wallet = Wallet.objects.create(owner=self.user)
+        self.payment_types = [PaymentType.objects.create(wallet=self.wallet, name=name, balance=1000)
+                              for name in ('Cash', 'Card', 'Savings')]
+        self.categories = [Category.objects.create(name='Food', wallet=self.wallet, type='Expense'),
+                           Category.objects.create(name='Salary', wallet=self.wallet, type='Income'),
+                           Category.objects.create(name='Transfer', wallet=self.wallet, type='Transfer',
+                                                   service=True)]
+        rebuild_wallet_summary(self.wallet)
+
+    def write(self, seed, errors):
+        generator = random.Random(seed)
+        transactions = []
+        try:
+            for _ in range(self.operations):
+                operation = generator.choice(('create', 'create', 'update', 'delete', 'transfer'))
+                if operation in ('update', 'delete') and transactions:
+                    transaction = transactions.pop(generator.randrange(len(transactions)))
+                    if operation == 'delete':
+                        ledger.delete_transaction(transaction)
+                        continue
+                    transaction.payment_type = generator.choice(self.payment_types)
+                    transaction.value = Decimal(generator.randint(-500, 500))
+                    ledger.update_transaction(transaction)
+                    transactions.append(transaction)
+                elif operation == 'transfer':
+                    payment_type_from, payment_type_to = generator.sample(self.payment_types, 2)
+                    ledger.transfer(self.wallet, payment_type_from, payment_type_to,
+                                    Decimal(generator.randint(1, 100)))
+                else:
+                    transactions.append(ledger.create_transaction(Transaction(
+                        wallet=self.wallet, payment_type=generator.choice(self.payment_types),
+                        category=generator.choice(self.categories[:2]), value=Decimal(generator.randint(-500, 500)))))
+        except Exception as e:
+            errors.append(e)
+        finally:
+            connection.close()
+
+    def test_parallel_writes(self):
+        errors = []
+        threads = [threading.Thread(target=self.write, args=(seed, errors)) for seed in range(self.threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        for payment_type in self.payment_types:
+            payment_type.refresh_from_db()
+            total = payment_type.transaction_set.aggregate(total=Sum('value'))['total'] or 0
+            self.assertEqual(payment_type.balance, 1000 + total)
+
+        stored = self.wallet.summary
+        stored.refresh_from_db()
+        summary = compute_wallet_summary(self.wallet)
+        self.assertEqual((stored.balance, stored.income_all_time, stored.expense_all_time, stored.transaction_count),
+                         (summary['balance'], summary['income_all_time_sum'], summary['expense_all_time_sum'],
+                          summary['transaction_count']))
+
+        fields = ('category_id', 'payment_type_id', 'month', 'total', 'count')
+        incremental = set(MonthlyRollup.objects.values_list(*fields))
+        rebuild_monthly_rollups()
+        self.assertEqual(incremental, set(MonthlyRollup.objects.values_list(*fields)))
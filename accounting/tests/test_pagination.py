@@ -0,0 +1,81 @@
+import datetime
+
+from django.contrib.auth.models import User
+from django.test import TestCase, Client
+from django.urls import reverse
+from django.utils import timezone
+
+from accounting.models import Wallet, PaymentType, Category, Transaction
+from accounting.pagination import paginate_by_cursor
+from accounting.summaries import rebuild_wallet_summary
+
+
+class TestCursorPagination(TestCase):
+    """Keyset pagination of the transactions"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='testuser', password='1234')
+        cls.wallet = Wallet.objects.create(owner=cls.user)
+        cls.cash = PaymentType.objects.create(wallet=cls.wallet, name='Cash')
+        cls.card = PaymentType.objects.create(wallet=cls.wallet, name='Card')
+        cls.income_category = Category.objects.create(name='Income', wallet=cls.wallet, type='Income')
+
+        # Pairs of transactions share the date to check the id tie-breaker
+        now = timezone.now()
+        for i in range(120):
+            Transaction.objects.create(wallet=cls.wallet, payment_type=cls.cash if i % 3 else cls.card,
+                                       category=cls.income_category, value=i,
+                                       date=now - datetime.timedelta(days=i // 2))
+        cls.ordered = list(cls.wallet.transaction_set.order_by('-date', '-id'))
+        rebuild_wallet_summary(cls.wallet)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.login(username='testuser', password='1234')
+
+    def test_walk_forward_and_back(self):
+        queryset = self.wallet.transaction_set.all()
+        pages = []
+        page = paginate_by_cursor(queryset, 50)
+        pages.append(page.object_list)
+        while page.has_next():
+            page = paginate_by_cursor(queryset, 50, page.next_cursor)
+            pages.append(page.object_list)
+
+        self.assertEqual([len(page) for page in pages], [50, 50, 20])
+        self.assertEqual(sum(pages, []), self.ordered)
+        self.assertFalse(paginate_by_cursor(queryset, 50).has_previous())
+
+        previous = paginate_by_cursor(queryset, 50, page.previous_cursor)
+        self.assertEqual(previous.object_list, pages[1])
+        self.assertTrue(previous.has_next())
+        first = paginate_by_cursor(queryset, 50, previous.previous_cursor)
+        self.assertEqual(first.object_list, pages[0])
+        self.assertFalse(first.has_previous())
+
+    def test_page_costs_one_query(self):
+        page = paginate_by_cursor(self.wallet.transaction_set.all(), 50)
+
+        with self.assertNumQueries(1):
+            paginate_by_cursor(self.wallet.transaction_set.all(), 50, page.next_cursor)
+
+    def test_transactions_GET_cursor_with_filter(self):
+        """Transactions page. Cursor links keep the filter."""
+        response = self.client.get(reverse('transactions'), data={'payment_type': self.cash.pk})
+        page = response.context_data['page_obj']
+
+        self.assertEqual(len(response.context_data['transactions']), 50)
+        self.assertIn(f'payment_type={self.cash.pk}', page.next_querystring)
+        self.assertContains(response, page.next_querystring.replace('&', '&amp;'))
+
+        response = self.client.get(reverse('transactions') + '?' + page.next_querystring)
+        expected = [transaction for transaction in self.ordered if transaction.payment_type_id == self.cash.pk]
+
+        self.assertEqual(list(response.context_data['transactions']), expected[50:])
+        self.assertFalse(response.context_data['page_obj'].has_next())
+
+    def test_transactions_GET_invalid_cursor(self):
+        response = self.client.get(reverse('transactions'), data={'cursor': 'invalid'})
+
+        self.assertEqual(response.status_code, 404)
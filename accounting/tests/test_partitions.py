@@ -0,0 +1,153 @@
+from datetime import datetime, timezone
+from decimal import Decimal
+from io import StringIO
+from unittest import skipIf, skipUnless
+
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+
+from accounting import ledger
+from accounting.models import Wallet, PaymentType, Category, Transaction
+from accounting.partitions import DEFAULT_PARTITION, TABLE, PartitionError, create_partitions, detach_partitions, \
+    get_partitions, is_partitioned, partition_table
+from accounting.summaries import rebuild_wallet_summary
+
+
+def utc(year, month, day=1):
+    return datetime(year, month, day, tzinfo=timezone.utc)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Partitioning needs PostgreSQL')
+class TestPartitions(TestCase):
+    """Transaction table partitioned by date. The conversion is DDL, rolled back after each test."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='testuser', password='1234')
+        cls.wallet = Wallet.objects.create(owner=cls.user)
+        cls.cash = PaymentType.objects.create(wallet=cls.wallet, name='Cash', balance=100)
+        cls.food = Category.objects.create(name='Food', wallet=cls.wallet, type='Expense')
+        for month in (1, 2, 3):
+            for day in (1, 15):
+                Transaction.objects.create(wallet=cls.wallet, payment_type=cls.cash, category=cls.food,
+                                           value=-month, date=utc(2021, month, day))
+        rebuild_wallet_summary(cls.wallet)
+
+    def rows_of(self, partition):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM {connection.ops.quote_name(partition)}')
+            return cursor.fetchone()[0]
+
+    def test_partition_table(self):
+        ids = set(Transaction.objects.values_list('pk', flat=True))
+        partitions = partition_table('month', ahead=1)
+
+        self.assertTrue(is_partitioned())
+        self.assertEqual(partitions[0].name, f'{TABLE}_y2021m01')
+        self.assertEqual(partitions[0].start, utc(2021, 1))
+        self.assertEqual(partitions[1].start, utc(2021, 2))
+        self.assertEqual(get_partitions()[1], 'month')
+        self.assertEqual([partition.name for partition in get_partitions()[0]],
+                         [partition.name for partition in partitions])
+        self.assertEqual(set(Transaction.objects.values_list('pk', flat=True)), ids)
+        self.assertEqual(self.rows_of(f'{TABLE}_y2021m02'), 2)
+        self.assertEqual(self.rows_of(DEFAULT_PARTITION), 0)
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, TABLE)
+        self.assertTrue({'transaction_wallet_date_idx', 'transaction_wallet_pt_idx'} <= set(constraints))
+        self.assertEqual(sorted(constraint['foreign_key'][0] for constraint in constraints.values()
+                                if constraint['foreign_key']),
+                         ['accounting_category', 'accounting_paymenttype', 'accounting_wallet'])
+
+        # New ids continue the old ones
+        transaction = Transaction.objects.create(wallet=self.wallet, payment_type=self.cash, category=self.food,
+                                                 value=-1, date=utc(2021, 3, 20))
+        self.assertGreater(transaction.pk, max(ids))
+
+        with self.assertRaises(PartitionError):
+            partition_table('month')
+
+    def test_ledger(self):
+        partition_table('year')
+        self.assertEqual(get_partitions()[1], 'year')
+
+        transaction = ledger.create_transaction(Transaction(wallet=self.wallet, payment_type=self.cash,
+                                                            category=self.food, value=-10, date=utc(2021, 3, 2)))
+        ledger.create_transactions(self.wallet.pk, [[Transaction(wallet=self.wallet, payment_type=self.cash,
+                                                                 category=self.food, value=-5,
+                                                                 date=utc(2021, 4, 1))]])
+        # A new date in another year moves the row to that partition
+        transaction.date = utc(2020, 6, 1)
+        ledger.update_transaction(transaction)
+        self.assertEqual(self.rows_of(DEFAULT_PARTITION), 1)
+        self.assertEqual(Transaction.objects.get(pk=transaction.pk).date, utc(2020, 6, 1))
+        self.assertTrue(ledger.delete_transaction(transaction))
+
+        self.cash.refresh_from_db()
+        self.assertEqual(self.cash.balance, 95)
+
+    def test_transactions_page(self):
+        partition_table('month', ahead=1)
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('transactions'), {'date__gte': '2021-02-01', 'date__lte': '2021-02-28'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['expense_sum'], Decimal(-4))
+        self.assertEqual([transaction.date for transaction in response.context['transactions']],
+                         ['15.02.21', '01.02.21'])
+
+    def test_pruning(self):
+        partition_table('month', ahead=1)
+        plan = self.wallet.transaction_set.filter(date__gte=utc(2021, 2, 1), date__lt=utc(2021, 3, 1)).explain()
+
+        self.assertIn(f'{TABLE}_y2021m02', plan)
+        self.assertNotIn(f'{TABLE}_y2021m01', plan)
+        self.assertNotIn(f'{TABLE}_y2021m03', plan)
+
+    def test_create_partitions(self):
+        partition_table('month', ahead=0)
+        # Older than every partition
+        Transaction.objects.create(wallet=self.wallet, payment_type=self.cash, category=self.food, value=-1,
+                                   date=utc(2019, 5, 3))
+        self.assertEqual(self.rows_of(DEFAULT_PARTITION), 1)
+
+        created = [partition.name for partition in create_partitions(ahead=2)]
+
+        self.assertEqual(created[0], f'{TABLE}_y2019m05')
+        self.assertEqual(len(created), 3)
+        self.assertEqual(self.rows_of(DEFAULT_PARTITION), 0)
+        self.assertEqual(self.rows_of(f'{TABLE}_y2019m05'), 1)
+        self.assertEqual(create_partitions(ahead=2), [])
+
+    def test_detach_partitions(self):
+        partition_table('month', ahead=1)
+        detached = detach_partitions(utc(2021, 3, 1))
+
+        self.assertEqual([partition.name for partition in detached], [f'{TABLE}_y2021m01', f'{TABLE}_y2021m02'])
+        self.assertEqual(Transaction.objects.count(), 2)
+        # The rows stay in the detached table
+        self.assertEqual(self.rows_of(f'{TABLE}_y2021m01'), 2)
+
+    def test_commands(self):
+        output = StringIO()
+        call_command('partition_transactions', interval='year', ahead=1, stdout=output)
+        self.assertIn('Partitioned transactions', output.getvalue())
+        call_command('create_transaction_partitions', stdout=output)
+
+        call_command('detach_transaction_partitions', before='2022-01-01', drop=True, stdout=output)
+        self.assertIn(f'Dropped {TABLE}_y2021', output.getvalue())
+        self.assertFalse(Transaction.objects.exists())
+
+        with self.assertRaises(CommandError):
+            call_command('detach_transaction_partitions', before='2022-13-01')
+
+
+@skipIf(connection.vendor == 'postgresql', 'Partitioning is supported')
+class TestPartitionsUnsupported(TestCase):
+    def test_commands(self):
+        self.assertFalse(is_partitioned())
+        with self.assertRaisesMessage(CommandError, 'PostgreSQL'):
+            call_command('partition_transactions')
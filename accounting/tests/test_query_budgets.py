@@ -0,0 +1,177 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from accounting import urls
+from accounting.middleware import QueryBudgetExceeded
+from accounting.models import Wallet, PaymentType, Category, Transaction
+from accounting.summaries import rebuild_wallet_summary
+from accounting.views import Reports
+
+
+class QueryBudgetAssertions:
+    """Needs self.card, self.food_category and self.transaction of the logged in wallet for the
+    detail URLs"""
+
+    def get_url(self, pattern):
+        kwargs = {}
+        if 'pk' in pattern.pattern.converters:
+            model = pattern.callback.view_class.model
+            kwargs['pk'] = {PaymentType: self.card, Category: self.food_category}.get(model, self.transaction).pk
+        return reverse(pattern.name, kwargs=kwargs)
+
+    def assertWithinBudget(self, response):
+        view_class = response.resolver_match.func.view_class
+        stats = response.wsgi_request.query_stats
+
+        self.assertLess(response.status_code, 400)
+        self.assertLessEqual(stats.count, view_class.query_budget,
+                             f'{view_class.__name__} ran {stats.count} queries, the budget is '
+                             f'{view_class.query_budget}')
+
+
+class TestQueryBudgets(QueryBudgetAssertions, TestCase):
+    """Every accounting view stays within its declared query_budget"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='testuser', password='1234')
+        cls.wallet = Wallet.objects.create(owner=cls.user)
+        cls.cash = PaymentType.objects.create(wallet=cls.wallet, name='Cash', balance=1000)
+        cls.card = PaymentType.objects.create(wallet=cls.wallet, name='Card', balance=1000)
+        cls.income_category = Category.objects.create(name='Income', wallet=cls.wallet, type='Income')
+        cls.expense_category = Category.objects.create(name='Expense', wallet=cls.wallet, type='Expense')
+        cls.food_category = Category.objects.create(name='Food', wallet=cls.wallet, type='Expense')
+        cls.transfer_category = Category.objects.create(name='Transfer', wallet=cls.wallet, type='Transfer',
+                                                        service=True)
+        # Enough rows to fill the pages, so per-row queries would show up
+        for i in range(60):
+            Transaction.objects.create(wallet=cls.wallet, payment_type=cls.cash if i % 2 else cls.card,
+                                       category=cls.expense_category if i % 3 else cls.income_category,
+                                       value=-i if i % 3 else i, description=f'Transaction {i}')
+        cls.transaction = cls.wallet.transaction_set.filter(category=cls.expense_category).first()
+        rebuild_wallet_summary(cls.wallet)
+
+    def setUp(self):
+        # Budgets hold for requests that find nothing cached
+        cache.clear()
+        self.client = Client()
+        self.client.login(username='testuser', password='1234')
+
+    def test_every_view_declares_budget(self):
+        for pattern in urls.urlpatterns:
+            self.assertIsInstance(getattr(pattern.callback.view_class, 'query_budget', None), int, pattern.name)
+
+    def test_GET_budgets(self):
+        for pattern in urls.urlpatterns:
+            with self.subTest(pattern.name):
+                self.assertWithinBudget(self.client.get(self.get_url(pattern)))
+
+    def test_transactions_GET_filter_budget(self):
+        response = self.client.get(reverse('transactions'), data={
+            'category': [self.expense_category.pk, self.income_category.pk],
+            'payment_type': self.cash.pk,
+            'value__gte': -30,
+            'date__gte': '2000-01-01',
+            'description': 'Transaction'
+        })
+
+        self.assertWithinBudget(response)
+
+    def test_export_filter_budget(self):
+        response = self.client.get(reverse('export_transactions'), data={
+            'category': [self.expense_category.pk, self.income_category.pk],
+            'payment_type': self.cash.pk,
+            'description': 'Transaction',
+        })
+
+        self.assertWithinBudget(response)
+
+    def test_POST_budgets(self):
+        requests = [
+            ('main', [], {'category': self.expense_category.pk, 'payment_type': self.cash.pk, 'value': 10}),
+            ('update_transaction', [self.transaction.pk], {
+                'category': self.food_category.pk, 'payment_type': self.cash.pk, 'value': 10,
+                'date': '2020-01-01T10:00'}),
+            ('transfer_between_payment_types', [], {'payment_type_from': self.cash.pk,
+                                                    'payment_type_to': self.card.pk, 'value': 10}),
+            ('create_payment_type', [], {'name': 'Bank', 'balance': 10}),
+            ('update_payment_type', [self.card.pk], {'name': 'Debit card'}),
+            ('create_category', [], {'name': 'Salary', 'type': 'Income'}),
+            ('update_category', [self.food_category.pk], {'name': 'Groceries'}),
+            ('delete_transaction', [self.transaction.pk], {}),
+            ('import_transactions', [], {'file': SimpleUploadedFile('import.csv', b'date,payment_type,category,value\n'
+                                                                                  b'2020-01-01,Cash,Food,10\n'
+                                                                                  b'2020-02-01,Card,Income,10\n')}),
+            ('delete_category', [self.food_category.pk], {'name': self.expense_category.pk}),
+            ('delete_payment_type', [self.card.pk], {'name': self.cash.pk}),
+        ]
+        for name, args, data in requests:
+            with self.subTest(name):
+                self.assertWithinBudget(self.client.post(reverse(name, args=args), data=data))
+
+    def test_object_fetched_once(self):
+        for name in ('transaction_details', 'update_transaction', 'delete_transaction'):
+            with self.subTest(name), CaptureQueriesContext(connection) as queries:
+                self.client.get(reverse(name, args=[self.transaction.pk]))
+
+            selects = [query['sql'] for query in queries
+                       if query['sql'].startswith('SELECT') and 'FROM "accounting_transaction"' in query['sql']]
+            self.assertEqual(len(selects), 1)
+            self.assertIn('"accounting_category"', selects[0])
+
+    def test_over_budget(self):
+        with mock.patch.object(Reports, 'query_budget', 1):
+            with self.assertRaisesMessage(QueryBudgetExceeded, 'the budget is 1'):
+                self.client.get(reverse('reports'))
+
+            with override_settings(QUERY_BUDGET_STRICT=False), self.assertLogs('accounting.middleware', 'WARNING'):
+                self.assertEqual(self.client.get(reverse('reports')).status_code, 200)
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse('main'))
+
+        self.assertIn(f'db;desc="{response.wsgi_request.query_stats.count} queries"', response['Server-Timing'])
+
+
+
+# Registering a wallet per view stays fast
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class TestQueryBudgetsNewWallet(QueryBudgetAssertions, TestCase):
+    """The budgets hold on the cold path of a wallet that was just registered: nothing built or
+    cached yet"""
+
+    def register(self, username):
+        self.client = Client()
+        self.client.post(reverse('registry'), {'username': username, 'password1': 'Secret-Pass-42',
+                                               'password2': 'Secret-Pass-42'})
+        self.wallet = Wallet.objects.get(owner__username=username)
+        self.card = self.wallet.paymenttype_set.get()
+        self.food_category = self.wallet.category_set.get(name='Expense')
+        cache.clear()
+
+    def add_transaction(self):
+        response = self.client.post(reverse('main'), data={
+            'category': self.food_category.pk, 'payment_type': self.card.pk, 'value': 10})
+        self.transaction = self.wallet.transaction_set.get()
+        cache.clear()
+        return response
+
+    def test_first_POST_budget(self):
+        self.register('newuser')
+
+        self.assertWithinBudget(self.add_transaction())
+
+    def test_GET_budgets(self):
+        for number, pattern in enumerate(urls.urlpatterns):
+            with self.subTest(pattern.name):
+                self.register(f'newuser-{number}')
+                if 'pk' in pattern.pattern.converters:
+                    self.add_transaction()
+                self.assertWithinBudget(self.client.get(self.get_url(pattern)))
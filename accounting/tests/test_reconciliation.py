@@ -0,0 +1,132 @@
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase, skipUnlessDBFeature
+
+from accounting import ledger
+from accounting.archive import archive_wallet
+from accounting.balances import build_checkpoints
+from accounting.models import Wallet, PaymentType, Category, Transaction, BalanceCheckpoint, ReconciliationRun
+from accounting.reconciliation import get_drift, reconcile
+from accounting.summaries import compute_wallet_summary, get_summary
+
+
+def create_wallet(username, transactions=10):
+    wallet = Wallet.objects.create(owner=User.objects.create_user(username=username, password='1234'))
+    # Created before opening balances, it gets one from the first run
+    cash = PaymentType.objects.create(wallet=wallet, name='Cash', balance=1000)
+    card = ledger.create_payment_type(PaymentType(wallet=wallet, name='Card', balance=300))
+    food = Category.objects.create(name='Food', wallet=wallet, type='Expense')
+    for day in range(1, transactions + 1):
+        ledger.create_transaction(Transaction(wallet=wallet, payment_type=(cash, card)[day % 2], category=food,
+                                              value=-day, date=datetime(2021, 1, day, tzinfo=timezone.utc)))
+    return wallet, cash, card
+
+
+class TestReconciliation(TestCase):
+    """Payment type balances compared with their opening balances plus their transactions"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.wallet, cls.cash, cls.card = create_wallet('testuser')
+        cls.other_wallet, cls.other_cash, _ = create_wallet('other')
+
+    def drift(self, payment_type, delta):
+        """Balance change that bypasses the ledger"""
+        PaymentType.objects.filter(pk=payment_type.pk).update(balance=F('balance') + delta)
+
+    def test_opening_balances(self):
+        self.assertIsNone(PaymentType.objects.get(pk=self.cash.pk).opening_balance)
+        self.assertEqual(PaymentType.objects.get(pk=self.card.pk).opening_balance, 300)
+
+        run = reconcile()
+        self.assertEqual((run.wallets, run.drifted), (2, 0))
+        self.assertEqual(PaymentType.objects.get(pk=self.cash.pk).opening_balance, 1000)
+
+    def test_drift(self):
+        reconcile()
+        self.drift(self.cash, 7)
+        self.drift(self.card, Decimal('-0.5'))
+
+        with self.assertNumQueries(1):
+            drift = get_drift(PaymentType.objects.all())
+        self.assertEqual([(row['pk'], row['balance'] - row['expected']) for row in drift],
+                         [(self.cash.pk, 7), (self.card.pk, Decimal('-0.5'))])
+
+        run = reconcile()
+        self.assertEqual((run.drifted, run.fixed), (2, 0))
+        self.assertEqual(PaymentType.objects.get(pk=self.cash.pk).balance, 1000 - 30 + 7)
+
+    def test_fix(self):
+        reconcile()
+        build_checkpoints()
+        self.drift(self.cash, 7)
+        version = get_summary(self.wallet).version
+
+        run = reconcile(fix=True)
+        self.assertEqual((run.drifted, run.fixed), (1, 1))
+        self.assertEqual(PaymentType.objects.get(pk=self.cash.pk).balance, 1000 - 30)
+        self.assertEqual(get_summary(self.wallet).balance, compute_wallet_summary(self.wallet)['balance'])
+        self.assertNotEqual(get_summary(self.wallet).version, version)
+        self.assertFalse(BalanceCheckpoint.objects.filter(payment_type=self.cash).exists())
+        self.assertEqual(reconcile().drifted, 0)
+
+    def test_archived_and_moved_transactions(self):
+        reconcile()
+        archive_wallet(self.wallet.pk, datetime(2021, 1, 5, tzinfo=timezone.utc))
+        self.assertEqual(reconcile().drifted, 0)
+
+        ledger.move_transactions(self.cash, self.card)
+        self.assertEqual(PaymentType.objects.get(pk=self.card.pk).opening_balance, 1300)
+        self.assertEqual(reconcile().drifted, 0)
+
+    def test_incremental(self):
+        # Without a full run yet it checks every wallet
+        self.assertFalse(reconcile(incremental=True).incremental)
+        self.drift(self.other_cash, 1)
+        ledger.create_transaction(Transaction(wallet=self.wallet, payment_type=self.cash,
+                                              category=self.wallet.category_set.get(), value=-1))
+
+        # Only the wallet written through the ledger since the last run
+        run = reconcile(incremental=True)
+        self.assertEqual((run.wallets, run.drifted), (1, 0))
+        self.assertEqual(reconcile().drifted, 1)
+        self.assertEqual(ReconciliationRun.objects.filter(finished__isnull=False).count(), 3)
+
+    def test_incremental_becomes_full(self):
+        """Drift from writes that bypass the ledger is found by the periodic full run"""
+        reconcile()
+        ReconciliationRun.objects.update(started=F('started') - timedelta(days=8))
+        self.drift(self.other_cash, 1)
+
+        run = reconcile(incremental=True)
+        self.assertEqual((run.incremental, run.wallets, run.drifted), (False, 2, 1))
+        run = reconcile(incremental=True)
+        self.assertEqual((run.incremental, run.wallets), (True, 0))
+
+    def test_command(self):
+        self.drift(self.card, 2)
+        output = StringIO()
+        call_command('reconcile_balances', fix=True, chunk_size=1, stdout=output)
+
+        self.assertIn(f'payment type {self.card.pk} "Card": balance 277.00, expected 275.00, drift 2.00',
+                      output.getvalue())
+        self.assertIn('1 drifted payment types in 2 wallets, 1 fixed', output.getvalue())
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class TestParallelReconciliation(TransactionTestCase):
+    """Chunks of wallets checked by several threads"""
+
+    def test_workers(self):
+        wallets = [create_wallet(f'user{number}', transactions=4) for number in range(5)]
+        for wallet, cash, card in wallets[::2]:
+            PaymentType.objects.filter(pk=card.pk).update(balance=F('balance') + 1)
+
+        run = reconcile(fix=True, chunk_size=2, workers=3)
+        self.assertEqual((run.wallets, run.drifted, run.fixed), (5, 3, 3))
+        self.assertEqual(reconcile(workers=3).drifted, 0)
@@ -0,0 +1,150 @@
+import datetime
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, Client, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounting.models import Wallet, PaymentType, Category, Transaction, MonthlyRollup
+from accounting.rollups import rebuild_monthly_rollups
+from accounting.summaries import rebuild_wallet_summary
+
+
+class TestMonthlyRollups(TestCase):
+    """Monthly rollups and reports page"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='testuser', password='1234')
+        cls.wallet = Wallet.objects.create(owner=cls.user)
+        cls.cash = PaymentType.objects.create(wallet=cls.wallet, name='Cash')
+        cls.card = PaymentType.objects.create(wallet=cls.wallet, name='Card')
+        cls.income_category = Category.objects.create(name='Income', wallet=cls.wallet, type='Income')
+        cls.expense_category = Category.objects.create(name='Expense', wallet=cls.wallet, type='Expense')
+        cls.food_category = Category.objects.create(name='Food', wallet=cls.wallet, type='Expense')
+        cls.transfer_category = Category.objects.create(name='Transfer', wallet=cls.wallet, type='Transfer',
+                                                        service=True)
+        cls.january = timezone.make_aware(datetime.datetime(2023, 1, 15))
+        cls.february = timezone.make_aware(datetime.datetime(2023, 2, 10))
+        rebuild_wallet_summary(cls.wallet)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.login(username='testuser', password='1234')
+
+    def create(self, value, category, payment_type, date):
+        return Transaction.objects.create(wallet=self.wallet, payment_type=payment_type, category=category,
+                                          value=value, date=date)
+
+    def assertRollupsConsistent(self):
+        """Incremental rollups equal the rebuilt ones"""
+        fields = ('category_id', 'payment_type_id', 'month', 'total', 'count')
+        incremental = set(MonthlyRollup.objects.filter(wallet=self.wallet).exclude(count=0).values_list(*fields))
+        rebuild_monthly_rollups(Wallet.objects.filter(pk=self.wallet.pk))
+        rebuilt = set(MonthlyRollup.objects.filter(wallet=self.wallet).values_list(*fields))
+
+        self.assertEqual(incremental, rebuilt)
+
+    def test_rebuild_monthly_rollups(self):
+        self.create(1000, self.income_category, self.cash, self.january)
+        self.create(500, self.income_category, self.cash, self.january)
+        self.create(-200, self.food_category, self.card, self.february)
+
+        created = rebuild_monthly_rollups()
+        rollup = MonthlyRollup.objects.get(category=self.income_category)
+
+        self.assertEqual(created, 2)
+        self.assertEqual(rollup.month, datetime.date(2023, 1, 1))
+        self.assertEqual(rollup.total, 1500)
+        self.assertEqual(rollup.count, 2)
+
+    @skipUnlessDBFeature('has_select_for_update')
+    def test_rebuild_monthly_rollups_lock(self):
+        """The summary rows are locked before the rollups are deleted"""
+        with CaptureQueriesContext(connection) as queries:
+            rebuild_monthly_rollups(Wallet.objects.filter(pk=self.wallet.pk))
+
+        statements = [query['sql'] for query in queries.captured_queries]
+        lock = next(index for index, sql in enumerate(statements) if 'FOR UPDATE' in sql)
+        delete = next(index for index, sql in enumerate(statements) if sql.startswith('DELETE'))
+        self.assertIn('accounting_walletsummary', statements[lock])
+        self.assertLess(lock, delete)
+
+    def test_rebuild_monthly_rollups_command(self):
+        self.create(1000, self.income_category, self.cash, self.january)
+        out = StringIO()
+
+        call_command('rebuild_monthly_rollups', stdout=out)
+
+        self.assertIn('Rebuilt 1 monthly rollups', out.getvalue())
+
+    def test_write_paths(self):
+        """Rollups follow transactions through the write views."""
+        self.client.post(reverse('main'), data={'category': self.income_category.pk,
+                                                'payment_type': self.cash.pk, 'value': 500})
+        self.client.post(reverse('main'), data={'category': self.food_category.pk,
+                                                'payment_type': self.card.pk, 'value': 200})
+        self.assertRollupsConsistent()
+
+        food = self.wallet.transaction_set.get(category=self.food_category)
+        self.client.post(reverse('update_transaction', args=[food.pk]), data={
+            'category': self.expense_category.pk, 'payment_type': self.cash.pk, 'value': 300,
+            'date': '2020-01-01T10:00'})
+        self.assertRollupsConsistent()
+
+        self.client.post(reverse('transfer_between_payment_types'), data={
+            'payment_type_from': self.cash.pk, 'payment_type_to': self.card.pk, 'value': 100})
+        self.assertRollupsConsistent()
+
+        self.client.post(reverse('delete_category', args=[self.expense_category.pk]),
+                         data={'name': self.food_category.pk})
+        self.assertRollupsConsistent()
+
+        self.client.post(reverse('delete_payment_type', args=[self.card.pk]), data={'name': self.cash.pk})
+        self.assertRollupsConsistent()
+
+        income = self.wallet.transaction_set.get(category=self.income_category)
+        self.client.post(reverse('delete_transaction', args=[income.pk]))
+        self.assertRollupsConsistent()
+
+    def test_reports_GET(self):
+        """Reports page. Monthly totals, deltas and category breakdown."""
+        self.create(1000, self.income_category, self.cash, self.january)
+        self.create(-300, self.food_category, self.cash, self.january)
+        self.create(1200, self.income_category, self.card, self.february)
+        self.create(-100, self.expense_category, self.cash, self.february)
+        self.create(-50, self.transfer_category, self.cash, self.february)
+        rebuild_monthly_rollups()
+
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('reports'))
+        months = response.context_data['months']
+        categories = list(response.context_data['categories'])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'accounting/reports.html')
+        self.assertEqual(len(months), 2)
+        self.assertEqual(months[0]['net'], 700)
+        self.assertIsNone(months[0]['net_delta'])
+        self.assertEqual(months[1]['income'], 1200)
+        self.assertEqual(months[1]['expense'], -100)
+        self.assertEqual(months[1]['income_delta'], 200)
+        self.assertEqual(months[1]['expense_delta'], 200)
+        self.assertEqual(months[1]['net_delta'], 400)
+        self.assertEqual([(category['category__name'], category['total']) for category in categories],
+                         [('Expense', -100), ('Food', -300), ('Income', 2200)])
+
+    def test_reports_GET_period(self):
+        """Reports page. Period filter."""
+        self.create(1000, self.income_category, self.cash, self.january)
+        self.create(1200, self.income_category, self.card, self.february)
+        rebuild_monthly_rollups()
+
+        response = self.client.get(reverse('reports'), data={'month__gte': '2023-02', 'month__lte': '2023-02'})
+
+        self.assertEqual(len(response.context_data['months']), 1)
+        self.assertEqual(response.context_data['months'][0]['income'], 1200)
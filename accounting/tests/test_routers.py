@@ -0,0 +1,110 @@
+import time
+
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, connections, transaction as db_transaction
+from django.test import Client, SimpleTestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from accounting.models import Wallet, PaymentType, Category, Transaction
+from accounting.routers import PIN_COOKIE, ReadRouting, ReplicaRouter, read_routing
+from accounting.summaries import rebuild_wallet_summary
+
+REPLICA = 'replica'
+
+
+@override_settings(REPLICA_DATABASES=[REPLICA])
+class TestReplicaRouter(SimpleTestCase):
+    """Router decisions"""
+    databases = {DEFAULT_DB_ALIAS}
+
+    def test_routing(self):
+        router = ReplicaRouter()
+        self.assertIsNone(router.db_for_read(Transaction))
+
+        token = read_routing.set(ReadRouting(REPLICA))
+        try:
+            self.assertEqual(router.db_for_read(Transaction), REPLICA)
+            # Sessions and users come from the primary
+            self.assertIsNone(router.db_for_read(User))
+            with db_transaction.atomic():
+                self.assertEqual(router.db_for_read(Transaction), DEFAULT_DB_ALIAS)
+        finally:
+            read_routing.reset(token)
+
+        self.assertEqual(router.db_for_write(Transaction), DEFAULT_DB_ALIAS)
+        self.assertFalse(router.allow_migrate(REPLICA, 'accounting'))
+        self.assertIsNone(router.allow_migrate(DEFAULT_DB_ALIAS, 'accounting'))
+
+
+@override_settings(REPLICA_DATABASES=[REPLICA], REPLICA_PIN_SECONDS=10)
+class TestReplicaRouting(TransactionTestCase):
+    """Read-only pages read from the replica, clients that just wrote from the primary. The replica
+    is a second alias of the test database, like POSTGRES_REPLICA_HOSTS with the primary's host."""
+    # The replica alias is added by setUpClass, after the test runner's checks
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        default = connections.settings[DEFAULT_DB_ALIAS]
+        connections.settings[REPLICA] = {**default, 'TEST': {**default['TEST'], 'MIRROR': DEFAULT_DB_ALIAS}}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.settings[REPLICA]
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='1234')
+        self.wallet = Wallet.objects.create(owner=self.user)
+        self.cash = PaymentType.objects.create(wallet=self.wallet, name='Cash', balance=100)
+        self.food = Category.objects.create(name='Food', wallet=self.wallet, type='Expense')
+        self.transaction = Transaction.objects.create(wallet=self.wallet, payment_type=self.cash, category=self.food,
+                                                      value=-10)
+        rebuild_wallet_summary(self.wallet)
+
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def get(self, name, *args):
+        with CaptureQueriesContext(connections[REPLICA]) as replica_queries:
+            response = self.client.get(reverse(name, args=args))
+        self.assertEqual(response.status_code, 200)
+        return response, len(replica_queries)
+
+    def test_read_only_pages_use_replica(self):
+        pages = (('transactions',), ('transaction_details', self.transaction.pk), ('categories',),
+                 ('payment_types',), ('reports',))
+        for name, *args in pages:
+            with self.subTest(name):
+                response, replica_queries = self.get(name, *args)
+                self.assertEqual(response.wsgi_request.read_database, REPLICA)
+                self.assertGreater(replica_queries, 0)
+
+        response, replica_queries = self.get('main')
+        self.assertIsNone(response.wsgi_request.read_database)
+        self.assertEqual(replica_queries, 0)
+
+    def test_write_pins_to_primary(self):
+        response = self.client.post(reverse('main'), data={'category': self.food.pk, 'payment_type': self.cash.pk,
+                                                           'value': 5})
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+        response, replica_queries = self.get('transactions')
+        self.assertIsNone(response.wsgi_request.read_database)
+        self.assertEqual(replica_queries, 0)
+        self.assertEqual(response.context['balance'], 95)
+
+        # The window is over
+        self.client.cookies[PIN_COOKIE] = str(int(time.time()) - 1)
+        self.assertEqual(self.get('transactions')[0].wsgi_request.read_database, REPLICA)
+
+    @override_settings(REPLICA_DATABASES=[])
+    def test_without_replicas(self):
+        response = self.client.post(reverse('main'), data={'category': self.food.pk, 'payment_type': self.cash.pk,
+                                                           'value': 5})
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+        self.assertIsNone(self.get('transactions')[0].wsgi_request.read_database)
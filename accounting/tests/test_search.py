@@ -0,0 +1,114 @@
+from datetime import datetime, timezone
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, Client
+from django.urls import reverse
+
+from accounting.models import Wallet, PaymentType, Category, Transaction
+from accounting.search import create_search_index, parse_words, search_transactions, SEARCH_INDEX_NAME
+from accounting.summaries import rebuild_wallet_summary
+
+
+class TestSearch(TestCase):
+    """Description search"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='testuser', password='1234')
+        cls.wallet = Wallet.objects.create(owner=cls.user)
+        cls.cash = PaymentType.objects.create(wallet=cls.wallet, name='Cash')
+        cls.category = Category.objects.create(name='Expense', wallet=cls.wallet, type='Expense')
+        cls.coffee = cls.create('Coffee shop')
+        cls.shopping = cls.create('Shopping mall, coffee')
+        cls.taxi = cls.create('Taxi home')
+        cls.empty = cls.create(None)
+        rebuild_wallet_summary(cls.wallet)
+
+    @classmethod
+    def create(cls, description):
+        return Transaction.objects.create(wallet=cls.wallet, payment_type=cls.cash, category=cls.category,
+                                          value=-10, description=description)
+
+    def test_parse_words(self):
+        self.assertEqual(parse_words("coffee & 'shop':*"), ['coffee', 'shop'])
+        self.assertEqual(parse_words(None), [])
+
+    def test_search_prefix(self):
+        result = search_transactions(self.wallet.transaction_set.all(), 'shop')
+
+        self.assertEqual(set(result), {self.coffee, self.shopping})
+
+    def test_search_every_word(self):
+        result = search_transactions(self.wallet.transaction_set.all(), 'COFFEE  sho')
+
+        self.assertEqual(set(result), {self.coffee, self.shopping})
+        self.assertEqual(list(search_transactions(self.wallet.transaction_set.all(), 'taxi shop')), [])
+
+    def test_search_empty_query(self):
+        """Query without words doesn't filter."""
+        result = search_transactions(self.wallet.transaction_set.all(), ' ,:* ')
+
+        self.assertEqual(result.count(), 4)
+
+    def test_search_rank(self):
+        result = search_transactions(self.wallet.transaction_set.all(), 'taxi', rank=True)
+
+        self.assertEqual([transaction.rank >= 0 for transaction in result], [True])
+
+    def test_create_search_index(self):
+        """The index is created on PostgreSQL only."""
+        create_search_index(using='default')
+
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, Transaction._meta.db_table)
+        self.assertEqual(SEARCH_INDEX_NAME in constraints, connection.vendor == 'postgresql')
+
+    def test_transactions_GET_description_filter(self):
+        client = Client()
+        client.login(username='testuser', password='1234')
+
+        response = client.get(reverse('transactions'), data={'description': 'coff'})
+
+        self.assertEqual(set(response.context_data['transactions']), {self.coffee, self.shopping})
+
+    def test_transactions_GET_relevance_ordering(self):
+        """Most relevant first on PostgreSQL. Other databases rank every match the same, newest first."""
+        beans = Transaction.objects.create(wallet=self.wallet, payment_type=self.cash, category=self.category,
+                                           value=-10, description='Coffee beans, coffee',
+                                           date=datetime(2020, 1, 1, tzinfo=timezone.utc))
+        rebuild_wallet_summary(self.wallet)
+        client = Client()
+        client.login(username='testuser', password='1234')
+
+        response = client.get(reverse('transactions'), data={'description': 'coffee', 'ordering': 'relevance'})
+
+        transactions = list(response.context_data['transactions'])
+        self.assertEqual(set(transactions), {self.coffee, self.shopping, beans})
+        self.assertEqual(transactions.index(beans), 0 if connection.vendor == 'postgresql' else 2)
+
+    def test_api_relevance_pages(self):
+        """Cursors of pages ordered by relevance carry the rank"""
+        client = Client()
+        client.login(username='testuser', password='1234')
+        query = {'description': 'coffee', 'ordering': 'relevance', 'limit': 1}
+        expected = search_transactions(self.wallet.transaction_set.all(), 'coffee', rank=True)
+
+        first = client.get(reverse('api_transactions'), data=query).json()
+        second = client.get(reverse('api_transactions'), data={**query, 'cursor': first['next']}).json()
+        back = client.get(reverse('api_transactions'), data={**query, 'cursor': second['previous']}).json()
+
+        self.assertEqual([first['results'][0]['id'], second['results'][0]['id']],
+                         [transaction.pk for transaction in expected.order_by('-rank', '-date', '-id')])
+        self.assertIsNone(second['next'])
+        self.assertEqual(back['results'], first['results'])
+
+    def test_api_relevance_without_description(self):
+        """Without a description there is nothing to rank, transactions stay newest first"""
+        client = Client()
+        client.login(username='testuser', password='1234')
+
+        response = client.get(reverse('api_transactions'), data={'ordering': 'relevance'}).json()
+
+        self.assertEqual([row['id'] for row in response['results']],
+                         [transaction.pk for transaction in self.wallet.transaction_set.order_by('-date', '-id')])
@@ -0,0 +1,174 @@
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, Client
+from django.urls import reverse
+
+from accounting.models import Wallet, PaymentType, Category, Transaction, WalletSummary
+from accounting.summaries import get_wallet_summary, get_transactions_totals, compute_wallet_summary, \
+    get_summary, rebuild_wallet_summary
+
+
+class TestWalletSummary(TestCase):
+    """Database-side wallet aggregates"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='testuser', password='1234')
+        cls.wallet = Wallet.objects.create(owner=cls.user)
+        cls.cash = PaymentType.objects.create(wallet=cls.wallet, name='Cash', balance=100)
+        cls.card = PaymentType.objects.create(wallet=cls.wallet, name='Card', balance=250)
+        cls.income_category = Category.objects.create(name='Income', wallet=cls.wallet, type='Income')
+        cls.expense_category = Category.objects.create(name='Expense', wallet=cls.wallet, type='Expense')
+        cls.transfer_category = Category.objects.create(name='Transfer', wallet=cls.wallet, type='Transfer',
+                                                        service=True)
+
+        cls.user2 = User.objects.create_user(username='testuser2', password='1234')
+        cls.wallet2 = Wallet.objects.create(owner=cls.user2)
+        cls.payment_type2 = PaymentType.objects.create(wallet=cls.wallet2, name='Cash', balance=1000)
+        cls.income_category2 = Category.objects.create(name='Income', wallet=cls.wallet2, type='Income')
+
+        for value, category, payment_type in [(500, cls.income_category, cls.cash),
+                                              (300, cls.income_category, cls.card),
+                                              (-200, cls.expense_category, cls.cash),
+                                              (-50, cls.transfer_category, cls.cash),
+                                              (50, cls.transfer_category, cls.card)]:
+            Transaction.objects.create(wallet=cls.wallet, payment_type=payment_type, category=category, value=value)
+        Transaction.objects.create(wallet=cls.wallet2, payment_type=cls.payment_type2,
+                                   category=cls.income_category2, value=700)
+
+    def test_compute_wallet_summary(self):
+        """All-time figures ignore transfers and other wallets."""
+        with self.assertNumQueries(1):
+            summary = compute_wallet_summary(self.wallet)
+
+        self.assertEqual(summary['balance'], 350)
+        self.assertEqual(summary['income_all_time_sum'], 800)
+        self.assertEqual(summary['expense_all_time_sum'], -200)
+        self.assertEqual(summary['transaction_count'], 5)
+        self.assertEqual(summary['last_transaction_date'], self.wallet.transaction_set.latest('date').date)
+
+    def test_wallet_summary(self):
+        """Stored summary is read with one query."""
+        rebuild_wallet_summary(self.wallet)
+
+        with self.assertNumQueries(1):
+            summary = get_wallet_summary(self.wallet)
+
+        self.assertEqual(summary['balance'], 350)
+        self.assertEqual(summary['income_all_time_sum'], 800)
+        self.assertEqual(summary['expense_all_time_sum'], -200)
+        self.assertNotIn('income_sum', summary)
+
+    def test_wallet_summary_with_queryset(self):
+        """Filtered figures come from the given queryset."""
+        queryset = self.wallet.transaction_set.filter(payment_type=self.cash)
+        rebuild_wallet_summary(self.wallet)
+
+        with self.assertNumQueries(2):
+            summary = get_wallet_summary(self.wallet, queryset=queryset)
+
+        self.assertEqual(summary['income_sum'], 500)
+        self.assertEqual(summary['expense_sum'], -200)
+        self.assertEqual(summary['income_all_time_sum'], 800)
+
+    def test_empty_wallet_summary(self):
+        """Empty wallet has zero sums instead of None."""
+        user = User.objects.create_user(username='emptyuser', password='1234')
+        wallet = Wallet.objects.create(owner=user)
+
+        summary = get_wallet_summary(wallet, queryset=wallet.transaction_set.all())
+
+        self.assertEqual(summary, {'balance': 0, 'income_all_time_sum': 0, 'expense_all_time_sum': 0,
+                                   'income_sum': 0, 'expense_sum': 0})
+
+    def test_transactions_totals(self):
+        totals = get_transactions_totals(self.wallet.transaction_set.filter(value__gte=300))
+
+        self.assertEqual(totals, {'income_sum': 800, 'expense_sum': 0})
+
+    def test_rebuild_wallet_summaries_command(self):
+        """Command regenerates stale summaries."""
+        WalletSummary.objects.create(wallet=self.wallet, balance=1, transaction_count=100)
+        out = StringIO()
+
+        call_command('rebuild_wallet_summaries', stdout=out)
+        summary = WalletSummary.objects.get(wallet=self.wallet)
+
+        self.assertIn('Rebuilt 2 wallet summaries', out.getvalue())
+        self.assertEqual(summary.balance, 350)
+        self.assertEqual(summary.transaction_count, 5)
+        self.assertEqual(WalletSummary.objects.get(wallet=self.wallet2).income_all_time, 700)
+
+    def test_missing_summary(self):
+        """Wallets from before summaries get theirs from the first read or from the command."""
+        summary = get_summary(self.wallet)
+        self.assertEqual(summary.balance, 350)
+        self.assertEqual(get_summary(self.wallet).version, summary.version)
+
+        WalletSummary.objects.filter(wallet=self.wallet).update(balance=1)
+        out = StringIO()
+        call_command('rebuild_wallet_summaries', '--missing', stdout=out)
+
+        self.assertIn('Rebuilt 1 wallet summaries', out.getvalue())
+        self.assertEqual(WalletSummary.objects.get(wallet=self.wallet).balance, 1)
+        self.assertEqual(WalletSummary.objects.get(wallet=self.wallet2).balance, 1000)
+
+
+class TestWalletSummaryWritePaths(TestCase):
+    """Every write view keeps the stored summary equal to the recomputed one"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='testuser', password='1234')
+        cls.wallet = Wallet.objects.create(owner=cls.user)
+        cls.cash = PaymentType.objects.create(wallet=cls.wallet, name='Cash')
+        cls.income_category = Category.objects.create(name='Income', wallet=cls.wallet, type='Income')
+        cls.expense_category = Category.objects.create(name='Expense', wallet=cls.wallet, type='Expense')
+        cls.transfer_category = Category.objects.create(name='Transfer', wallet=cls.wallet, type='Transfer',
+                                                        service=True)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.login(username='testuser', password='1234')
+        rebuild_wallet_summary(self.wallet)
+
+    def assertSummaryConsistent(self):
+        summary = WalletSummary.objects.get(wallet=self.wallet)
+        expected = compute_wallet_summary(self.wallet)
+
+        self.assertEqual(summary.balance, expected['balance'])
+        self.assertEqual(summary.income_all_time, expected['income_all_time_sum'])
+        self.assertEqual(summary.expense_all_time, expected['expense_all_time_sum'])
+        self.assertEqual(summary.transaction_count, expected['transaction_count'])
+        self.assertEqual(summary.last_transaction_date, expected['last_transaction_date'])
+
+    def test_write_paths(self):
+        self.client.post(reverse('create_payment_type'), data={'name': 'Card', 'balance': 1000})
+        self.assertSummaryConsistent()
+        card = self.wallet.paymenttype_set.get(name='Card')
+
+        self.client.post(reverse('main'), data={'category': self.income_category.pk,
+                                                'payment_type': self.cash.pk, 'value': 500})
+        self.client.post(reverse('main'), data={'category': self.expense_category.pk,
+                                                'payment_type': card.pk, 'value': 200})
+        self.assertSummaryConsistent()
+
+        expense = self.wallet.transaction_set.get(category=self.expense_category)
+        self.client.post(reverse('update_transaction', args=[expense.pk]), data={
+            'category': self.expense_category.pk, 'payment_type': self.cash.pk, 'value': 300,
+            'date': '2020-01-01T10:00'})
+        self.assertSummaryConsistent()
+
+        self.client.post(reverse('transfer_between_payment_types'), data={
+            'payment_type_from': self.cash.pk, 'payment_type_to': card.pk, 'value': 100})
+        self.assertSummaryConsistent()
+
+        income = self.wallet.transaction_set.get(category=self.income_category)
+        self.client.post(reverse('delete_transaction', args=[income.pk]))
+        self.assertSummaryConsistent()
+
+        self.client.post(reverse('delete_payment_type', args=[card.pk]), data={'name': self.cash.pk})
+        self.assertSummaryConsistent()
+        self.assertEqual(WalletSummary.objects.get(wallet=self.wallet).transaction_count, 3)
@@ -0,0 +1,60 @@
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.db.models import Sum
+from django.test import TestCase
+
+from accounting.models import WalletSummary, MonthlyRollup
+from accounting.rollups import rebuild_monthly_rollups
+from accounting.summaries import rebuild_wallet_summary
+from accounting.synthetic import generate_wallets
+
+
+class TestSyntheticWallets(TestCase):
+    """Deterministic synthetic data generator"""
+
+    def rows(self, wallet):
+        return list(wallet.transaction_set.order_by('date').values_list(
+            'payment_type__name', 'category__name', 'value', 'description', 'date'))
+
+    def test_deterministic(self):
+        first, second = generate_wallets(users=2, prefix='first', transactions=200)
+        again, = generate_wallets(users=1, prefix='again', transactions=200)
+        other_seed, = generate_wallets(users=1, prefix='other', transactions=200, seed=1)
+
+        self.assertEqual(self.rows(first), self.rows(again))
+        self.assertNotEqual(self.rows(first), self.rows(second))
+        self.assertNotEqual(self.rows(first), self.rows(other_seed))
+        self.assertEqual(len(self.rows(first)), 200)
+
+    def test_derived_data_consistent(self):
+        wallet, = generate_wallets(transactions=500, payment_types=3, categories=8, income_share=0.3, batch_size=64)
+
+        for payment_type in wallet.paymenttype_set.all():
+            self.assertEqual(payment_type.balance,
+                             payment_type.transaction_set.aggregate(total=Sum('value'))['total'] or 0)
+        summary_fields = ('balance', 'income_all_time', 'expense_all_time', 'transaction_count',
+                          'last_transaction_date')
+        incremental = WalletSummary.objects.values_list(*summary_fields).get(wallet=wallet)
+        rebuild_wallet_summary(wallet)
+        self.assertEqual(incremental, WalletSummary.objects.values_list(*summary_fields).get(wallet=wallet))
+
+        fields = ('category_id', 'payment_type_id', 'month', 'total', 'count')
+        incremental = set(MonthlyRollup.objects.values_list(*fields))
+        rebuild_monthly_rollups()
+        self.assertEqual(incremental, set(MonthlyRollup.objects.values_list(*fields)))
+
+        self.assertEqual(wallet.paymenttype_set.count(), 3)
+        self.assertEqual(wallet.category_set.filter(service=False).count(), 8)
+        self.assertTrue(wallet.category_set.filter(name='Transfer', service=True).exists())
+
+    def test_command(self):
+        out = StringIO()
+
+        call_command('generate_wallets', '--users', 2, '--transactions', 50, '--password', 'secret', stdout=out)
+
+        self.assertIn('Generated 2 wallets with 100 transactions', out.getvalue())
+        self.assertTrue(User.objects.get(username='synthetic-2').check_password('secret'))
+        with self.assertRaises(CommandError):
+            call_command('generate_wallets', '--users', 1, stdout=out)
@@ -78,3 +78,9 @@ class TestUrls(SimpleTestCase):
         url = reverse('delete_transaction', args=[1])
 
         self.assertEqual(resolve(url).func.view_class, DeleteTransaction)
+
+    # Reports
+    def test_reports_url_resolves(self):
+        url = reverse('reports')
+
+        self.assertEqual(resolve(url).func.view_class, Reports)
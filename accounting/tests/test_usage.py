@@ -0,0 +1,112 @@
+from datetime import datetime, timezone
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+
+from accounting import ledger
+from accounting.imports import import_transactions
+from accounting.models import Wallet, PaymentType, Category, Transaction
+from accounting.summaries import rebuild_wallet_summary
+from accounting.usage import rebuild_usage
+
+
+class TestUsageCounters(TestCase):
+    """Usage counters maintained by the ledger match the ones rebuilt from the transactions"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='testuser', password='1234')
+        cls.wallet = Wallet.objects.create(owner=cls.user)
+        cls.cash = PaymentType.objects.create(wallet=cls.wallet, name='Cash', balance=0)
+        cls.card = PaymentType.objects.create(wallet=cls.wallet, name='Card', balance=0)
+        cls.food = Category.objects.create(name='Food', wallet=cls.wallet, type='Expense')
+        cls.rent = Category.objects.create(name='Rent', wallet=cls.wallet, type='Expense')
+        Category.objects.create(name='Transfer', wallet=cls.wallet, type='Transfer', service=True)
+        for day in range(1, 6):
+            Transaction.objects.create(wallet=cls.wallet, payment_type=cls.cash, category=cls.food, value=-day,
+                                       date=datetime(2021, 3, day, tzinfo=timezone.utc))
+        rebuild_wallet_summary(cls.wallet)
+        rebuild_usage()
+
+    def counters(self):
+        return {obj.name: (obj.usage_count, obj.last_used)
+                for model in (PaymentType, Category) for obj in model.objects.filter(wallet=self.wallet)}
+
+    def assertCountersConsistent(self):
+        incremental = self.counters()
+        rebuild_usage()
+
+        self.assertEqual(incremental, self.counters())
+
+    def create(self, payment_type, category, day):
+        return ledger.create_transaction(Transaction(wallet=self.wallet, payment_type=payment_type, category=category,
+                                                     value=-10, date=datetime(2021, 4, day, tzinfo=timezone.utc)))
+
+    def test_rebuild(self):
+        self.assertEqual(self.counters(), {'Cash': (5, datetime(2021, 3, 5, tzinfo=timezone.utc)),
+                                           'Card': (0, None),
+                                           'Food': (5, datetime(2021, 3, 5, tzinfo=timezone.utc)),
+                                           'Rent': (0, None),
+                                           'Transfer': (0, None)})
+
+    def test_create(self):
+        self.create(self.card, self.rent, 1)
+        self.create(self.card, self.food, 2)
+
+        self.assertEqual(self.counters()['Food'], (6, datetime(2021, 4, 2, tzinfo=timezone.utc)))
+        self.assertCountersConsistent()
+
+    def test_update(self):
+        transaction = self.create(self.card, self.rent, 1)
+        transaction.payment_type = self.cash
+        transaction.category = self.food
+        ledger.update_transaction(transaction)
+
+        self.assertEqual(self.counters()['Card'][0], 0)
+        self.assertEqual(self.counters()['Cash'][0], 6)
+
+    def test_delete(self):
+        ledger.delete_transaction(self.create(self.card, self.rent, 1))
+
+        self.assertEqual(self.counters()['Rent'][0], 0)
+        self.assertEqual(self.counters()['Card'][0], 0)
+
+    def test_transfer(self):
+        ledger.transfer(self.wallet, self.cash, self.card, 10)
+
+        self.assertEqual(self.counters()['Cash'][0], 6)
+        self.assertEqual(self.counters()['Card'][0], 1)
+        self.assertEqual(self.counters()['Transfer'][0], 2)
+        self.assertCountersConsistent()
+
+    def test_move(self):
+        self.create(self.cash, self.rent, 1)
+        ledger.move_transactions(self.food, self.rent)
+
+        self.assertEqual(self.counters()['Food'], (0, None))
+        self.assertCountersConsistent()
+
+    def test_import(self):
+        import_transactions(self.wallet, StringIO('date,payment_type,category,value\n'
+                                                  '2021-05-01,Card,Rent,-100\n'
+                                                  '2021-05-02,Card,Food,-5\n'))
+
+        self.assertCountersConsistent()
+
+    def test_stale_counters_stay_positive(self):
+        PaymentType.objects.filter(pk=self.cash.pk).update(usage_count=0)
+
+        ledger.delete_transaction(Transaction.objects.filter(payment_type=self.cash).first())
+
+        self.assertEqual(self.counters()['Cash'][0], 0)
+
+    def test_command(self):
+        PaymentType.objects.filter(pk=self.cash.pk).update(usage_count=0, last_used=None)
+        out = StringIO()
+
+        call_command('rebuild_usage_counts', '--wallet', self.wallet.pk, stdout=out)
+
+        self.assertEqual(self.counters()['Cash'], (5, datetime(2021, 3, 5, tzinfo=timezone.utc)))
+        self.assertIn('5 categories and payment types', out.getvalue())
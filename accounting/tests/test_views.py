@@ -5,7 +5,9 @@ from django.test import TestCase, Client
 from django.urls import reverse
 from django.utils import timezone
 
-from accounting.models import Wallet, PaymentType, Category, Transaction
+from accounting.models import Wallet, PaymentType, Category, Transaction, WalletSummary
+from accounting.rollups import rebuild_monthly_rollups
+from accounting.summaries import rebuild_wallet_summary
 
 
 class TestViewsUnauthorized(TestCase):
@@ -116,6 +118,14 @@ class TestViewsUnauthorized(TestCase):
         self.assertEqual(response.status_code, 302)
         self.assertURLEqual(response.url.split('?')[0], reverse('login'))
 
+    # Reports
+    def test_reports_login_required(self):
+        """Reports"""
+        response = self.client.get(reverse('reports'))
+
+        self.assertEqual(response.status_code, 302)
+        self.assertURLEqual(response.url.split('?')[0], reverse('login'))
+
 
 class TestViews(TestCase):
     """Authorized user"""
@@ -148,6 +158,8 @@ class TestViews(TestCase):
         cls.user = User.objects.create_user(username=cls.client_username, password=cls.client_password)
         cls.wallet = Wallet(owner=cls.user)
         cls.wallet.save()
+        cls.summary = WalletSummary(wallet=cls.wallet)
+        cls.summary.save()
         cls.payment_type = PaymentType(wallet=cls.wallet, name='Cash')
         cls.payment_type.save()
         cls.income_category = Category(name='Income', wallet=cls.wallet, type='Income')
@@ -160,6 +172,8 @@ class TestViews(TestCase):
         cls.user2 = User.objects.create_user(username=cls.client2_username, password=cls.client2_password)
         cls.wallet2 = Wallet(owner=cls.user2)
         cls.wallet2.save()
+        cls.summary2 = WalletSummary(wallet=cls.wallet2)
+        cls.summary2.save()
         cls.payment_type2 = PaymentType(wallet=cls.wallet2, name='Cash')
         cls.payment_type2.save()
         cls.income_category2 = Category(name='Income', wallet=cls.wallet2, type='Income')
@@ -173,6 +187,13 @@ class TestViews(TestCase):
         self.client.login(username=self.client_username, password=self.client_password)
         self.client2.login(username=self.client2_username, password=self.client2_password)
 
+    def create_transaction(self, **fields):
+        """Transaction created directly, with the wallet summary and rollups the ledger would have kept"""
+        transaction = Transaction.objects.create(**fields)
+        rebuild_wallet_summary(transaction.wallet)
+        rebuild_monthly_rollups(Wallet.objects.filter(pk=transaction.wallet_id))
+        return transaction
+
     # Main
     def test_main_GET(self):
         """Main page"""
@@ -183,14 +204,14 @@ class TestViews(TestCase):
 
     def test_main_GET_queryset(self):
         """Main page. Transaction queryset has only user data."""
-        transaction = Transaction.objects.create(wallet=self.wallet,
-                                                 payment_type=self.payment_type,
-                                                 category=self.income_category,
-                                                 value=500)
-        transaction2 = Transaction.objects.create(wallet=self.wallet2,
-                                                  payment_type=self.payment_type2,
-                                                  category=self.income_category2,
-                                                  value=500)
+        transaction = self.create_transaction(wallet=self.wallet,
+                                              payment_type=self.payment_type,
+                                              category=self.income_category,
+                                              value=500)
+        transaction2 = self.create_transaction(wallet=self.wallet2,
+                                               payment_type=self.payment_type2,
+                                               category=self.income_category2,
+                                               value=500)
 
         response = self.client.get(reverse('main'))
 
@@ -296,14 +317,14 @@ class TestViews(TestCase):
 
     def test_transactions_GET_queryset(self):
         """Transactions page. Transaction queryset has only user data."""
-        transaction = Transaction.objects.create(wallet=self.wallet,
-                                                 payment_type=self.payment_type,
-                                                 category=self.income_category,
-                                                 value=500)
-        transaction2 = Transaction.objects.create(wallet=self.wallet2,
-                                                  payment_type=self.payment_type2,
-                                                  category=self.income_category2,
-                                                  value=500)
+        transaction = self.create_transaction(wallet=self.wallet,
+                                              payment_type=self.payment_type,
+                                              category=self.income_category,
+                                              value=500)
+        transaction2 = self.create_transaction(wallet=self.wallet2,
+                                               payment_type=self.payment_type2,
+                                               category=self.income_category2,
+                                               value=500)
 
         response = self.client.get(reverse('transactions'))
 
@@ -336,53 +357,53 @@ class TestViews(TestCase):
         payment_type_credit = PaymentType.objects.create(wallet=self.wallet,
                                                          name='Credit',
                                                          balance=100000)
-        transaction_in_past = Transaction.objects.create(wallet=self.wallet,
+        transaction_in_past = self.create_transaction(wallet=self.wallet,
+                                                      payment_type=self.payment_type,
+                                                      category=self.income_category,
+                                                      value=500,
+                                                      date=date_past,
+                                                      description='Test')
+        transaction_in_present = self.create_transaction(wallet=self.wallet,
                                                          payment_type=self.payment_type,
                                                          category=self.income_category,
                                                          value=500,
-                                                         date=date_past,
                                                          description='Test')
-        transaction_in_present = Transaction.objects.create(wallet=self.wallet,
-                                                            payment_type=self.payment_type,
-                                                            category=self.income_category,
-                                                            value=500,
-                                                            description='Test')
-        transaction_in_future = Transaction.objects.create(wallet=self.wallet,
+        transaction_in_future = self.create_transaction(wallet=self.wallet,
+                                                        payment_type=self.payment_type,
+                                                        category=self.income_category,
+                                                        value=500,
+                                                        date=date_future,
+                                                        description='Test')
+        transaction_less_value = self.create_transaction(wallet=self.wallet,
+                                                         payment_type=self.payment_type,
+                                                         category=self.income_category,
+                                                         value=100,
+                                                         description='Test')
+        transaction_middle_value = self.create_transaction(wallet=self.wallet,
                                                            payment_type=self.payment_type,
                                                            category=self.income_category,
                                                            value=500,
-                                                           date=date_future,
                                                            description='Test')
-        transaction_less_value = Transaction.objects.create(wallet=self.wallet,
-                                                            payment_type=self.payment_type,
-                                                            category=self.income_category,
-                                                            value=100,
-                                                            description='Test')
-        transaction_middle_value = Transaction.objects.create(wallet=self.wallet,
-                                                              payment_type=self.payment_type,
-                                                              category=self.income_category,
-                                                              value=500,
-                                                              description='Test')
-        transaction_much_value = Transaction.objects.create(wallet=self.wallet,
-                                                            payment_type=self.payment_type,
-                                                            category=self.income_category,
-                                                            value=1000,
-                                                            description='Test')
-        transaction_expense_category = Transaction.objects.create(wallet=self.wallet,
-                                                                  payment_type=self.payment_type,
-                                                                  category=self.expense_category,
-                                                                  value=500,
-                                                                  description='Test')
-        transaction_card_payment_type = Transaction.objects.create(wallet=self.wallet,
-                                                                   payment_type=payment_type_card,
-                                                                   category=self.income_category,
-                                                                   value=500,
-                                                                   description='Test')
-        transaction_description = Transaction.objects.create(wallet=self.wallet,
-                                                             payment_type=self.payment_type,
-                                                             category=self.income_category,
-                                                             value=500,
-                                                             description='Description')
+        transaction_much_value = self.create_transaction(wallet=self.wallet,
+                                                         payment_type=self.payment_type,
+                                                         category=self.income_category,
+                                                         value=1000,
+                                                         description='Test')
+        transaction_expense_category = self.create_transaction(wallet=self.wallet,
+                                                               payment_type=self.payment_type,
+                                                               category=self.expense_category,
+                                                               value=500,
+                                                               description='Test')
+        transaction_card_payment_type = self.create_transaction(wallet=self.wallet,
+                                                                payment_type=payment_type_card,
+                                                                category=self.income_category,
+                                                                value=500,
+                                                                description='Test')
+        transaction_description = self.create_transaction(wallet=self.wallet,
+                                                          payment_type=self.payment_type,
+                                                          category=self.income_category,
+                                                          value=500,
+                                                          description='Description')
 
         response = self.client.get(reverse('transactions'), data={
             'date__gte': (date_past + datetime.timedelta(days=5)).strftime('%Y-%m-%d'),
@@ -416,10 +437,10 @@ class TestViews(TestCase):
 
     def test_transaction_details_GET(self):
         """Transaction details page."""
-        transaction = Transaction.objects.create(wallet=self.wallet,
-                                                 payment_type=self.payment_type,
-                                                 category=self.income_category,
-                                                 value=500)
+        transaction = self.create_transaction(wallet=self.wallet,
+                                              payment_type=self.payment_type,
+                                              category=self.income_category,
+                                              value=500)
         response = self.client.get(reverse('transaction_details', args=[transaction.pk]))
 
         self.assertEqual(response.status_code, 200)
@@ -427,10 +448,10 @@ class TestViews(TestCase):
 
     def test_transaction_details_GET_other_user(self):
         """Transaction details page. Other user data."""
-        transaction = Transaction.objects.create(wallet=self.wallet2,
-                                                 payment_type=self.payment_type,
-                                                 category=self.income_category,
-                                                 value=500)
+        transaction = self.create_transaction(wallet=self.wallet2,
+                                              payment_type=self.payment_type,
+                                              category=self.income_category,
+                                              value=500)
 
         response = self.client.get(reverse('transaction_details', args=[transaction.pk]))
 
@@ -438,10 +459,10 @@ class TestViews(TestCase):
 
     def test_update_transaction_GET(self):
         """Transaction editing page."""
-        transaction = Transaction.objects.create(wallet=self.wallet,
-                                                 payment_type=self.payment_type,
-                                                 category=self.income_category,
-                                                 value=500)
+        transaction = self.create_transaction(wallet=self.wallet,
+                                              payment_type=self.payment_type,
+                                              category=self.income_category,
+                                              value=500)
         response = self.client.get(reverse('update_transaction', args=[transaction.pk]))
 
         self.assertEqual(response.status_code, 200)
@@ -449,10 +470,10 @@ class TestViews(TestCase):
 
     def test_update_transaction_GET_other_user(self):
         """Transaction editing page. Other user data."""
-        transaction = Transaction.objects.create(wallet=self.wallet2,
-                                                 payment_type=self.payment_type2,
-                                                 category=self.income_category2,
-                                                 value=500)
+        transaction = self.create_transaction(wallet=self.wallet2,
+                                              payment_type=self.payment_type2,
+                                              category=self.income_category2,
+                                              value=500)
         response = self.client.get(reverse('update_transaction', args=[transaction.pk]))
 
         self.assertEqual(response.status_code, 403)
@@ -467,10 +488,10 @@ class TestViews(TestCase):
         category_for_update = Category.objects.create(wallet=self.wallet,
                                                       name='Category for transaction. Update',
                                                       type='Income')
-        transaction = Transaction.objects.create(wallet=self.wallet,
-                                                 payment_type=payment_type,
-                                                 category=self.income_category,
-                                                 value=1000)
+        transaction = self.create_transaction(wallet=self.wallet,
+                                              payment_type=payment_type,
+                                              category=self.income_category,
+                                              value=1000)
 
         response = self.client.post(reverse('update_transaction', args=[transaction.pk]), data={
             'payment_type': payment_type_for_update.pk,
@@ -499,10 +520,10 @@ class TestViews(TestCase):
         category_for_update = Category.objects.create(wallet=self.wallet,
                                                       name='Category for update transaction',
                                                       type='Expense')
-        transaction = Transaction.objects.create(wallet=self.wallet,
-                                                 payment_type=payment_type,
-                                                 category=self.income_category,
-                                                 value=1000)
+        transaction = self.create_transaction(wallet=self.wallet,
+                                              payment_type=payment_type,
+                                              category=self.income_category,
+                                              value=1000)
 
         response = self.client.post(reverse('update_transaction', args=[transaction.pk]), data={
             'payment_type': payment_type_for_update.pk,
@@ -531,10 +552,10 @@ class TestViews(TestCase):
 
     def test_update_transaction_POST_other_user(self):
         """Transaction editing page. Other user data."""
-        transaction = Transaction.objects.create(wallet=self.wallet2,
-                                                 payment_type=self.payment_type2,
-                                                 category=self.income_category2,
-                                                 value=1000)
+        transaction = self.create_transaction(wallet=self.wallet2,
+                                              payment_type=self.payment_type2,
+                                              category=self.income_category2,
+                                              value=1000)
 
         response = self.client.post(reverse('update_transaction', args=[transaction.pk]), data={
             'value': 400,
@@ -547,10 +568,10 @@ class TestViews(TestCase):
         payment_type = PaymentType.objects.create(wallet=self.wallet,
                                                   name='Payment type for transaction. Delete',
                                                   balance=1000)
-        transaction = Transaction.objects.create(wallet=self.wallet,
-                                                 payment_type=payment_type,
-                                                 category=self.income_category,
-                                                 value=500)
+        transaction = self.create_transaction(wallet=self.wallet,
+                                              payment_type=payment_type,
+                                              category=self.income_category,
+                                              value=500)
         response = self.client.get(reverse('delete_transaction', args=[transaction.pk]))
 
         self.assertEqual(response.status_code, 200)
@@ -558,10 +579,10 @@ class TestViews(TestCase):
 
     def test_delete_transaction_POST(self):
         """Transaction deletion page."""
-        transaction = Transaction.objects.create(wallet=self.wallet,
-                                                 payment_type=self.payment_type,
-                                                 category=self.income_category,
-                                                 value=500)
+        transaction = self.create_transaction(wallet=self.wallet,
+                                              payment_type=self.payment_type,
+                                              category=self.income_category,
+                                              value=500)
 
         response = self.client.post(reverse('delete_transaction', args=[transaction.pk]))
         self.payment_type.refresh_from_db()
@@ -572,10 +593,10 @@ class TestViews(TestCase):
 
     def test_delete_transaction_POST_other_user(self):
         """Transaction deletion page. Other user data"""
-        transaction = Transaction.objects.create(wallet=self.wallet2,
-                                                 payment_type=self.payment_type2,
-                                                 category=self.income_category2,
-                                                 value=500)
+        transaction = self.create_transaction(wallet=self.wallet2,
+                                              payment_type=self.payment_type2,
+                                              category=self.income_category2,
+                                              value=500)
 
         response = self.client.post(reverse('delete_transaction', args=[transaction.pk]))
 
@@ -755,10 +776,10 @@ class TestViews(TestCase):
         payment_type = PaymentType.objects.create(wallet=self.user.wallet,
                                                   name='Payment type for delete',
                                                   balance=100)
-        transaction = Transaction.objects.create(wallet=self.wallet,
-                                                 payment_type=payment_type,
-                                                 category=self.income_category,
-                                                 value=500)
+        transaction = self.create_transaction(wallet=self.wallet,
+                                              payment_type=payment_type,
+                                              category=self.income_category,
+                                              value=500)
 
         self.client.post(reverse('delete_payment_type', args=[payment_type.pk]), data={
             'name': self.payment_type.pk,
@@ -1038,10 +1059,10 @@ class TestViews(TestCase):
         category = Category.objects.create(wallet=self.user.wallet,
                                            name='Category for delete. POST. Change in transactions',
                                            type='Income')
-        transaction = Transaction.objects.create(wallet=self.wallet,
-                                                 payment_type=self.payment_type,
-                                                 category=category,
-                                                 value=500)
+        transaction = self.create_transaction(wallet=self.wallet,
+                                              payment_type=self.payment_type,
+                                              category=category,
+                                              value=500)
 
         self.client.post(reverse('delete_category', args=[category.pk]), data={
             'name': self.income_category.pk,
@@ -0,0 +1,86 @@
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from accounting.models import Wallet, PaymentType, Category, Transaction
+from accounting.summaries import rebuild_wallet_summary
+from accounting.usage import rebuild_usage
+
+
+class TestWalletCache(TestCase):
+    """Pages read unchanged wallet data from the cache and see every write"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='testuser', password='1234')
+        cls.wallet = Wallet.objects.create(owner=cls.user)
+        cls.cash = PaymentType.objects.create(wallet=cls.wallet, name='Cash', balance=1000)
+        cls.card = PaymentType.objects.create(wallet=cls.wallet, name='Card', balance=1000)
+        cls.food = Category.objects.create(name='Food', wallet=cls.wallet, type='Expense')
+        cls.rent = Category.objects.create(name='Rent', wallet=cls.wallet, type='Expense')
+        for i in range(20):
+            Transaction.objects.create(wallet=cls.wallet, payment_type=cls.cash, category=cls.food, value=-i)
+        Transaction.objects.create(wallet=cls.wallet, payment_type=cls.card, category=cls.rent, value=-500)
+        rebuild_wallet_summary(cls.wallet)
+        rebuild_usage()
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.login(username='testuser', password='1234')
+
+    def get(self, name, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(name), data=params)
+        return response, ' '.join(query['sql'] for query in queries)
+
+    def test_unchanged_wallet_is_cached(self):
+        for name, params in [('main', {}), ('transactions', {}), ('transactions', {'category': self.food.pk})]:
+            with self.subTest(name, **params):
+                self.get(name, **params)
+                response, sql = self.get(name, **params)
+
+                self.assertNotIn('accounting_transaction', sql)
+                if not params:
+                    # Submitted filter values are still validated against the database
+                    self.assertNotIn('accounting_category', sql)
+                    self.assertNotIn('accounting_paymenttype', sql)
+
+    def test_usage_ordered_choices(self):
+        response, _ = self.get('main')
+
+        self.assertEqual([str(choice[1]) for choice in response.context['form'].fields['category'].choices],
+                         ['Food', 'Rent'])
+
+    def test_writes_invalidate(self):
+        self.get('main')
+        self.get('transactions')
+
+        self.client.post(reverse('main'), data={'category': self.rent.pk, 'payment_type': self.card.pk,
+                                                'value': 12345, 'description': 'New'})
+        self.client.post(reverse('update_category', args=[self.food.pk]), data={'name': 'Groceries'})
+
+        response, _ = self.get('main')
+        self.assertContains(response, '-12345.00')
+        self.assertEqual([str(choice[1]) for choice in response.context['form'].fields['category'].choices],
+                         ['Groceries', 'Rent'])
+        response, _ = self.get('transactions')
+        self.assertContains(response, '-12345.00')
+        self.assertEqual(response.context['balance'], 2000 - 12345)
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                                           'LOCATION': tempfile.mkdtemp()}})
+    def test_file_based_cache(self):
+        self.get('transactions')
+        _, sql = self.get('transactions')
+        self.assertNotIn('accounting_transaction', sql)
+
+        self.client.post(reverse('main'), data={'category': self.rent.pk, 'payment_type': self.card.pk, 'value': 1})
+
+        response, _ = self.get('transactions')
+        self.assertEqual(len(response.context['transactions_table'].split('<tr>')), 1 + 23)
@@ -1,10 +1,16 @@
+from django.conf import settings
 from django.urls import path
 
+from accounting.api import BalancesApi, CashflowApi, CategoriesApi, PaymentTypesApi, TransactionsApi
+from accounting.async_views import AsyncMain, AsyncTransactions
 from accounting.views import *
 
+# Under ASGI the dashboard pages read concurrently
+MainView, TransactionsView = (AsyncMain, AsyncTransactions) if settings.ASYNC_VIEWS else (Main, Transactions)
+
 
 urlpatterns = [
-    path('', Main.as_view(), name='main'),
+    path('', MainView.as_view(), name='main'),
 
     path('payment_types/', PaymentTypes.as_view(), name='payment_types'),
     path('payment_types/create/', CreatePaymentType.as_view(), name='create_payment_type'),
@@ -17,8 +23,19 @@ urlpatterns = [
     path('categories/update_category/<int:pk>', UpdateCategory.as_view(), name='update_category'),
     path('categories/delete_category/<int:pk>', DeleteCategory.as_view(), name='delete_category'),
 
-    path('transactions/', Transactions.as_view(), name='transactions'),
+    path('transactions/', TransactionsView.as_view(), name='transactions'),
     path('transactions/details/<int:pk>', TransactionDetails.as_view(), name='transaction_details'),
     path('transactions/update/<int:pk>', UpdateTransaction.as_view(), name='update_transaction'),
-    path('transactions/delete/<int:pk>', DeleteTransaction.as_view(), name='delete_transaction')
+    path('transactions/delete/<int:pk>', DeleteTransaction.as_view(), name='delete_transaction'),
+    path('transactions/import/', ImportTransactions.as_view(), name='import_transactions'),
+    path('transactions/export/', ExportTransactions.as_view(), name='export_transactions'),
+
+    path('reports/', Reports.as_view(), name='reports'),
+    path('reports/cashflow/', Cashflow.as_view(), name='cashflow'),
+
+    path('api/payment_types/', PaymentTypesApi.as_view(), name='api_payment_types'),
+    path('api/categories/', CategoriesApi.as_view(), name='api_categories'),
+    path('api/transactions/', TransactionsApi.as_view(), name='api_transactions'),
+    path('api/balances/', BalancesApi.as_view(), name='api_balances'),
+    path('api/cashflow/', CashflowApi.as_view(), name='api_cashflow'),
 ]
@@ -0,0 +1,77 @@
+"""Usage counters of categories and payment types: usage_count is the number of their transactions
+and last_used the latest transaction date. The ledger maintains them incrementally, deletions don't
+move last_used back until the counters are rebuilt."""
+from django.db.models import Count, F, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from accounting.models import CarryForward, Category, PaymentType, Transaction, Wallet, WalletSummary
+from accounting.summaries import new_version
+
+
+def _latest(field, date):
+    """The later of the field and the date, which may be an expression. NULLs are ignored."""
+    return Greatest(Coalesce(field, date), Coalesce(date, field))
+
+
+def usage_changes(count, date=None):
+    """Update kwargs adding count uses, the latest on the date"""
+    # Counters of data written before they were maintained may be too low, they never go negative
+    changes = {'usage_count': F('usage_count') + count if count >= 0 else Greatest(F('usage_count') + count, 0)}
+    if date is not None:
+        changes['last_used'] = _latest('last_used', Value(date))
+    return changes
+
+
+def apply_usage_deltas(model, deltas):
+    """Adds {pk: (count, date or None)} to the counters, one UPDATE per row in pk order"""
+    for pk in sorted(deltas):
+        count, date = deltas[pk]
+        if count or date is not None:
+            model.objects.filter(pk=pk).update(**usage_changes(count, date))
+
+
+class UsageDeltas:
+    """Counter changes of the payment types and categories of added and removed transactions"""
+
+    def __init__(self):
+        self.payment_types = {}
+        self.categories = {}
+
+    def add(self, transaction, sign=1):
+        for deltas, pk in ((self.payment_types, transaction.payment_type_id),
+                           (self.categories, transaction.category_id)):
+            count, date = deltas.get(pk, (0, None))
+            if sign > 0:
+                date = transaction.date if date is None else max(date, transaction.date)
+            deltas[pk] = (count + sign, date)
+
+
+def move_usage(source, target):
+    """Moves the counters of a category or payment type whose transactions moved to the target"""
+    model = type(source)
+    source_usage = model.objects.filter(pk=source.pk)
+    model.objects.filter(pk=target.pk).update(
+        usage_count=F('usage_count') + Subquery(source_usage.values('usage_count')),
+        last_used=_latest('last_used', Subquery(source_usage.values('last_used'))),
+    )
+    source_usage.update(usage_count=0, last_used=None)
+
+
+def rebuild_usage(wallets=None):
+    """Recomputes the counters of the given wallets (all by default) with one UPDATE per model, archived
+    transactions included. Returns the number of updated categories and payment types."""
+    if wallets is None:
+        wallets = Wallet.objects.all()
+    updated = 0
+    for model, field in ((Category, 'category'), (PaymentType, 'payment_type')):
+        transactions = Transaction.objects.filter(**{field: OuterRef('pk')}).order_by().values(field)
+        archived = CarryForward.objects.filter(**{field: OuterRef('pk')}).order_by().values(field)
+        updated += model.objects.filter(wallet__in=wallets).update(
+            usage_count=(Coalesce(Subquery(transactions.annotate(count=Count('pk')).values('count')), 0)
+                         + Coalesce(Subquery(archived.annotate(count=Sum('count')).values('count')), 0)),
+            last_used=_latest(Subquery(transactions.annotate(date=Max('date')).values('date')),
+                              Subquery(archived.annotate(date=Max('last_date')).values('date'))),
+        )
+    # The cached choices are ordered by the counters
+    WalletSummary.objects.filter(wallet__in=wallets).update(**new_version())
+    return updated
@@ -1,11 +1,34 @@
+import hashlib
+from calendar import timegm
+
+from django.conf import settings
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.core.exceptions import PermissionDenied
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.functional import cached_property
+from django.utils.http import http_date
+
+from accounting.wallet_cache import WalletCache
 
 
 class PermissionMixin(LoginRequiredMixin):
-    """Allows to get and operate only user's data"""
+    """Allows to get and operate only user's data. The object is fetched once per request, with
+    the related objects listed in select_related."""
+    select_related = ()
+    _object = None
+
+    def get_queryset(self):
+        return super().get_queryset().select_related(*self.select_related)
+
+    def get_object(self, queryset=None):
+        if queryset is not None:
+            return super().get_object(queryset)
+        if self._object is None:
+            self._object = super().get_object()
+        return self._object
+
     def dispatch(self, request, *args, **kwargs):
-        if not request.user.is_anonymous and self.get_object().wallet != request.user.wallet:
+        if not request.user.is_anonymous and self.get_object().wallet_id != request.user.wallet.pk:
             raise PermissionDenied()
         return super().dispatch(request, *args, **kwargs)
 
@@ -16,3 +39,41 @@ class UserQueryset:
     def get_user_queryset(user, model):
         queryset = model.objects.filter(wallet=user.wallet)
         return queryset
+
+
+class WalletCacheMixin:
+    """Cache of the user's wallet data for the request"""
+    @cached_property
+    def wallet_cache(self):
+        return WalletCache(self.request.user.wallet)
+
+
+class ConditionalPageMixin(WalletCacheMixin):
+    """Answers GET with 304 Not Modified while the wallet is unchanged since the page was sent, before
+    any of the page's queries run. The ETag combines the wallet version with the CSRF cookie, whose
+    token the page's forms contain."""
+
+    def get_etag(self):
+        csrf_cookie = self.request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')
+        key = f'{self.wallet_cache.summary.version}:{csrf_cookie}'
+        return f'"{hashlib.md5(key.encode(), usedforsecurity=False).hexdigest()}"'
+
+    def get_last_modified(self):
+        return timegm(self.wallet_cache.summary.modified.utctimetuple())
+
+    def get_not_modified_response(self):
+        """304 response if the client's copy of the page is current, otherwise None"""
+        return get_conditional_response(self.request, etag=self.get_etag(), last_modified=self.get_last_modified())
+
+    def set_validators(self, response):
+        response['ETag'] = self.get_etag()
+        response['Last-Modified'] = http_date(self.get_last_modified())
+        # Browsers keep the page but ask every time whether it changed
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def get(self, request, *args, **kwargs):
+        response = self.get_not_modified_response()
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        return self.set_validators(response)
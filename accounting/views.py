@@ -1,17 +1,33 @@
+import hashlib
+import io
+
 from django.contrib.auth.mixins import LoginRequiredMixin
 
-from django.db.models import Count
+from django.db import transaction as db_transaction
+from django.http import Http404, HttpResponseRedirect, StreamingHttpResponse
+from django.template.loader import render_to_string
 from django.urls import reverse_lazy
-from django.views.generic import CreateView, DeleteView, FormView, ListView, UpdateView, DetailView
+from django.views.generic import CreateView, DeleteView, FormView, ListView, UpdateView, DetailView, TemplateView, View
 
+from accounting import ledger
+from accounting.archive import get_transactions
+from accounting.balances import running_balances
+from accounting.cashflow import CashflowError, get_cached_cashflow
 from accounting.forms import *
+from accounting.exports import export_transactions
 from accounting.filters import TransactionFilter
-from accounting.utils import PermissionMixin, UserQueryset
-from accounting.models import Category, PaymentType, Transaction
+from accounting.imports import TransactionImportError, import_transactions
+from accounting.pagination import CursorPaginationMixin
+from accounting.rollups import get_category_report, get_monthly_report
+from accounting.summaries import get_wallet_summary
+from accounting.utils import ConditionalPageMixin, PermissionMixin, UserQueryset, WalletCacheMixin
+from accounting.models import Category, MonthlyRollup, PaymentType, Transaction
+from accounting.wallet_cache import set_choices
 
 
 # Main
-class Main(UserQueryset, LoginRequiredMixin, CreateView):
+class Main(ConditionalPageMixin, UserQueryset, LoginRequiredMixin, CreateView):
+    query_budget = 16
     model = Transaction
     form_class = CreateTransactionForm
     template_name = 'accounting/main.html'
@@ -20,11 +36,11 @@ class Main(UserQueryset, LoginRequiredMixin, CreateView):
 
     def get_queryset(self):
         user = self.request.user
-        queryset = super().get_user_queryset(user=user, model=self.model).order_by('-date')
+        queryset = super().get_user_queryset(user=user, model=self.model).order_by('-date', '-id')
         return queryset
 
     def get_context_data(self, **kwargs):
-        transactions = self.get_queryset()[:5]
+        transactions = self.wallet_cache.get_recent_transactions()
 
         for transaction in transactions:
             transaction.date = transaction.date.strftime('%d.%m')
@@ -37,14 +53,10 @@ class Main(UserQueryset, LoginRequiredMixin, CreateView):
         form = self.form_class(**self.get_form_kwargs())
         user_wallet = self.request.user.wallet
 
-        form.fields['category'].queryset = form.fields['category'].queryset. \
-            filter(wallet=user_wallet). \
-            annotate(usage_count=Count('transaction__category')). \
-            order_by('-usage_count')
-        form.fields['payment_type'].queryset = form.fields['payment_type'].queryset. \
-            filter(wallet=user_wallet). \
-            annotate(usage_count=Count('transaction__payment_type')). \
-            order_by('-usage_count')
+        form.fields['category'].queryset = form.fields['category'].queryset.filter(wallet=user_wallet)
+        set_choices(form.fields['category'], self.wallet_cache.get_categories)
+        form.fields['payment_type'].queryset = form.fields['payment_type'].queryset.filter(wallet=user_wallet)
+        set_choices(form.fields['payment_type'], self.wallet_cache.get_payment_types)
         return form
 
     def form_valid(self, form):
@@ -54,17 +66,15 @@ class Main(UserQueryset, LoginRequiredMixin, CreateView):
             form.instance.value = -abs(form.instance.value)
         elif form.instance.category.type == 'Income':
             form.instance.value = abs(form.instance.value)
-        response = super().form_valid(form)
+        self.object = ledger.create_transaction(form.instance)
 
-        payment_type = form.instance.payment_type
-        payment_type.balance += form.instance.value
-        payment_type.save()
-
-        return response
+        return HttpResponseRedirect(self.get_success_url())
 
 
 # Payment types
-class PaymentTypes(UserQueryset, LoginRequiredMixin, ListView):
+class PaymentTypes(ConditionalPageMixin, UserQueryset, LoginRequiredMixin, ListView):
+    query_budget = 5
+    use_replica = True
     model = PaymentType
     template_name = 'accounting/payment_types.html'
     context_object_name = 'payment_types'
@@ -77,6 +87,7 @@ class PaymentTypes(UserQueryset, LoginRequiredMixin, ListView):
 
 
 class CreatePaymentType(LoginRequiredMixin, CreateView):
+    query_budget = 7
     model = PaymentType
     template_name = 'accounting/create_payment_type.html'
     form_class = CreatePaymentTypeForm
@@ -88,15 +99,27 @@ class CreatePaymentType(LoginRequiredMixin, CreateView):
         form.instance.wallet = self.request.user.wallet
         return form
 
+    def form_valid(self, form):
+        self.object = ledger.create_payment_type(form.instance)
+        return HttpResponseRedirect(self.get_success_url())
+
 
 class UpdatePaymentType(PermissionMixin, LoginRequiredMixin, UpdateView):
+    query_budget = 6
     model = PaymentType
     form_class = UpdatePaymentTypeForm
     template_name = 'accounting/update_payment_type.html'
     success_url = reverse_lazy('payment_types')
 
+    def form_valid(self, form):
+        # Saving every field would write back a balance changed by a concurrent request
+        self.object.save(update_fields=['name'])
+        ledger.record_wallet_changed(self.object.wallet_id)
+        return HttpResponseRedirect(self.get_success_url())
+
 
-class DeletePaymentType(PermissionMixin, LoginRequiredMixin, DeleteView):
+class DeletePaymentType(WalletCacheMixin, PermissionMixin, LoginRequiredMixin, DeleteView):
+    query_budget = 27
     model = PaymentType
     form_class = DeletePaymentTypeForm
     template_name = 'accounting/delete_payment_type.html'
@@ -105,41 +128,35 @@ class DeletePaymentType(PermissionMixin, LoginRequiredMixin, DeleteView):
     object = None
 
     def get_context_data(self, **kwargs):
-        payment_type = self.get_object()
-        kwargs['payment_type'] = payment_type
+        kwargs['payment_type'] = self.object
         return super().get_context_data(**kwargs)
 
     def get_form(self, form_class=None):
         form = self.form_class(**self.get_form_kwargs())
         user_wallet = self.request.user.wallet
-        payment_type = self.get_object()
+        payment_type = self.object
 
         form.fields['name'].queryset = form.fields['name'].queryset.filter(wallet=user_wallet).\
-            exclude(pk=payment_type.pk).\
-            annotate(usage_count=Count('transaction__payment_type')).order_by('-usage_count')
+            exclude(pk=payment_type.pk)
+        set_choices(form.fields['name'], lambda: [other for other in self.wallet_cache.get_payment_types()
+                                                  if other.pk != payment_type.pk])
 
         return form
 
     def post(self, request, *args, **kwargs):
-        user_wallet = request.user.wallet
         self.object = self.get_object()
         form = self.get_form()
 
         if form.is_valid():
-            payment_type_id = request.POST.get('name')
-            payment_type_to_convey = PaymentType.objects.get(pk=payment_type_id)
-            transactions = user_wallet.transaction_set.filter(payment_type=self.object)
-            for transaction in transactions:
-                transaction.payment_type = payment_type_to_convey
-                transaction.save()
-            payment_type_to_convey.balance += self.object.balance
-            payment_type_to_convey.save()
-            return self.form_valid(form)
+            with db_transaction.atomic():
+                ledger.move_transactions(self.object, form.cleaned_data['name'])
+                return self.form_valid(form)
         else:
             return self.form_invalid(form)
 
 
-class TransferBetweenPaymentTypes(LoginRequiredMixin, FormView):
+class TransferBetweenPaymentTypes(WalletCacheMixin, LoginRequiredMixin, FormView):
+    query_budget = 22
     form_class = TransferBetweenPaymentTypesForm
     template_name = 'accounting/transfer_between_payment_types.html'
     success_url = reverse_lazy('payment_types')
@@ -149,8 +166,10 @@ class TransferBetweenPaymentTypes(LoginRequiredMixin, FormView):
         user_wallet = self.request.user.wallet
         form_class = self.get_form_class()
         form = form_class(**self.get_form_kwargs())
-        form.fields['payment_type_from'].queryset = form.fields['payment_type_from'].queryset.filter(wallet=user_wallet)
-        form.fields['payment_type_to'].queryset = form.fields['payment_type_to'].queryset.filter(wallet=user_wallet)
+        for name in ('payment_type_from', 'payment_type_to'):
+            form.fields[name].queryset = form.fields[name].queryset.filter(wallet=user_wallet)
+            set_choices(form.fields[name], lambda: sorted(self.wallet_cache.get_payment_types(),
+                                                          key=lambda payment_type: payment_type.pk))
         return form
 
     def post(self, request, *args, **kwargs):
@@ -158,27 +177,8 @@ class TransferBetweenPaymentTypes(LoginRequiredMixin, FormView):
         if form.is_valid():
             user_wallet = request.user.wallet
             data = form.cleaned_data
-            payment_type_from = data['payment_type_from']
-            payment_type_to = data['payment_type_to']
-            value = abs(data['value'])
-            description = data['description']
-
-            payment_type_from.balance -= value
-            payment_type_from.save()
-
-            payment_type_to.balance += value
-            payment_type_to.save()
-
-            transaction_from = Transaction(wallet=user_wallet, payment_type=payment_type_from,
-                                           category=user_wallet.category_set.get(name='Transfer'), value=-value,
-                                           description=f'Transfer from "{payment_type_from.name}" '
-                                                       f'to "{payment_type_to.name}"\n{description}')
-            transaction_from.save()
-            transaction_to = Transaction(wallet=user_wallet, payment_type=payment_type_to,
-                                         category=user_wallet.category_set.get(name='Transfer'), value=value,
-                                         description=f'Transfer from "{payment_type_from.name}" '
-                                                     f'to "{payment_type_to.name}"\n{description}')
-            transaction_to.save()
+            ledger.transfer(user_wallet, data['payment_type_from'], data['payment_type_to'], data['value'],
+                            data['description'])
 
             return self.form_valid(form)
         else:
@@ -186,7 +186,9 @@ class TransferBetweenPaymentTypes(LoginRequiredMixin, FormView):
 
 
 # Categories
-class Categories(UserQueryset, LoginRequiredMixin, ListView):
+class Categories(ConditionalPageMixin, UserQueryset, LoginRequiredMixin, ListView):
+    query_budget = 5
+    use_replica = True
     model = Category
     template_name = 'accounting/categories.html'
     context_object_name = 'categories'
@@ -199,6 +201,7 @@ class Categories(UserQueryset, LoginRequiredMixin, ListView):
 
 
 class CreateCategory(LoginRequiredMixin, CreateView):
+    query_budget = 5
     model = Category
     template_name = 'accounting/create_category.html'
     form_class = CreateCategoryForm
@@ -210,15 +213,27 @@ class CreateCategory(LoginRequiredMixin, CreateView):
         form.instance.wallet = self.request.user.wallet
         return form
 
+    def form_valid(self, form):
+        response = super().form_valid(form)
+        ledger.record_wallet_changed(self.object.wallet_id)
+        return response
+
 
 class UpdateCategory(PermissionMixin, LoginRequiredMixin, UpdateView):
+    query_budget = 6
     model = Category
     form_class = UpdateCategoryForm
     template_name = 'accounting/update_category.html'
     success_url = reverse_lazy('categories')
 
+    def form_valid(self, form):
+        response = super().form_valid(form)
+        ledger.record_wallet_changed(self.object.wallet_id)
+        return response
+
 
-class DeleteCategory(PermissionMixin, LoginRequiredMixin, DeleteView):
+class DeleteCategory(WalletCacheMixin, PermissionMixin, LoginRequiredMixin, DeleteView):
+    query_budget = 23
     model = Category
     form_class = DeleteCategoryForm
     template_name = 'accounting/delete_category.html'
@@ -229,91 +244,174 @@ class DeleteCategory(PermissionMixin, LoginRequiredMixin, DeleteView):
     def get_form(self, form_class=None):
         form = self.form_class(**self.get_form_kwargs())
         user_wallet = self.request.user.wallet
-        category = self.get_object()
+        category = self.object
 
         form.fields['name'].queryset = form.fields['name'].queryset.filter(
-            wallet=user_wallet, type=category.type).exclude(pk=category.pk).\
-            annotate(usage_count=Count('transaction__category')).order_by('-usage_count')
+            wallet=user_wallet, type=category.type).exclude(pk=category.pk)
+        set_choices(form.fields['name'], lambda: [other for other in self.wallet_cache.get_categories()
+                                                  if other.type == category.type and other.pk != category.pk
+                                                  and not other.service])
 
         return form
 
     def post(self, request, *args, **kwargs):
-        user_wallet = request.user.wallet
         self.object = self.get_object()
         form = self.get_form()
 
         if form.is_valid():
-            category_type_id = request.POST.get('name')
-            category_type_to_convey = Category.objects.get(pk=category_type_id)
-            transactions = user_wallet.transaction_set.filter(category=self.object)
-            for transaction in transactions:
-                transaction.category = category_type_to_convey
-                transaction.save()
-            return self.form_valid(form)
+            with db_transaction.atomic():
+                ledger.move_transactions(self.object, form.cleaned_data['name'])
+                return self.form_valid(form)
         else:
             return self.form_invalid(form)
 
 
 # Transactions
-class Transactions(LoginRequiredMixin, ListView):
+class Transactions(ConditionalPageMixin, CursorPaginationMixin, LoginRequiredMixin, ListView):
+    query_budget = 12
+    use_replica = True
     model = Transaction
     template_name = 'accounting/transactions.html'
     context_object_name = 'transactions'
     filtered_queryset = None
     paginate_by = 50
+    # Rendered table, paginator and totals of the page, cached until the wallet changes
+    cached_page = None
+    # Page and totals, read once per request
+    paginated = None
+    page_summary = None
+    # {transaction id: balance of its payment type after it} of the page
+    running_balances = None
+    # ?archive=1 pages through the archived transactions, see accounting.archive
+    archive_kwarg = 'archive'
+
+    def in_archive(self):
+        return self.request.GET.get(self.archive_kwarg) == '1'
 
     def get_queryset(self):
-        user_wallet = self.request.user.wallet
-        queryset = user_wallet.transaction_set.order_by('-date')
-        self.filtered_queryset = TransactionFilter(self.request.GET, queryset=queryset)
-        for transaction in self.filtered_queryset.qs:
-            transaction.date = transaction.date.strftime('%d.%m.%y')
+        if self.filtered_queryset is None:
+            user_wallet = self.request.user.wallet
+            queryset = get_transactions(user_wallet, archived=self.in_archive()).select_related(
+                'payment_type', 'category').order_by('-date', '-id')
+            self.filtered_queryset = TransactionFilter(self.request.GET, queryset=queryset)
         return self.filtered_queryset.qs
 
+    def get_cursor_keys(self):
+        return self.filtered_queryset.get_cursor_keys()
+
+    def get_page_cache_name(self):
+        querystring = self.request.GET.urlencode()
+        return f'transactions_page:{hashlib.md5(querystring.encode(), usedforsecurity=False).hexdigest()}'
+
+    def paginate_queryset(self, queryset, page_size):
+        if self.paginated is None:
+            self.cached_page = self.wallet_cache.get(self.get_page_cache_name())
+            if self.cached_page is not None:
+                self.paginated = None, None, [], False
+            else:
+                self.paginated = super().paginate_queryset(queryset, page_size)
+        return self.paginated
+
+    def get_page_summary(self):
+        """Balance and all-time totals, and the totals of the filtered transactions if a filter is set or
+        of the archive"""
+        if self.page_summary is None:
+            user_wallet = self.request.user.wallet
+            if self.in_archive() or any(self.request.GET.get(name) for name in self.filtered_queryset.filters):
+                summary = get_wallet_summary(user_wallet, queryset=self.filtered_queryset.qs,
+                                             summary=self.wallet_cache.summary)
+            else:
+                summary = get_wallet_summary(user_wallet, summary=self.wallet_cache.summary)
+                summary.update(income_sum=summary['income_all_time_sum'], expense_sum=summary['expense_all_time_sum'])
+            self.page_summary = summary
+        return self.page_summary
+
+    def get_running_balances(self):
+        """Balance of the payment type after each transaction of the page, see accounting.balances"""
+        if self.running_balances is None:
+            self.running_balances = running_balances(self.request.user.wallet, self.paginated[2])
+        return self.running_balances
+
+    def get_archive_links(self, page):
+        """Querystrings of the archive after the last page of the transactions, and back from the archive"""
+        query = self.request.GET.copy()
+        query.pop(self.cursor_kwarg, None)
+        if self.in_archive():
+            links = {'archived': True}
+            if not page.has_previous():
+                query.pop(self.archive_kwarg)
+                links['recent_querystring'] = query.urlencode()
+            return links
+        if page.has_next() or self.request.user.wallet.archived_until is None:
+            return {}
+        query[self.archive_kwarg] = '1'
+        return {'archive_querystring': query.urlencode()}
+
+    def render_page(self, context):
+        balances = self.get_running_balances()
+        for transaction in context['transactions']:
+            transaction.running_balance = balances[transaction.pk]
+            transaction.date = transaction.date.strftime('%d.%m.%y')
+        context.update(self.get_archive_links(context['page_obj']))
+
+        return {
+            'transactions_table': render_to_string('accounting/transactions_table.html', context, self.request),
+            'transactions_paginator': render_to_string('accounting/paginator.html', context, self.request),
+            **self.get_page_summary()
+        }
+
     def get_context_data(self, *, object_list=None, **kwargs):
         context = super().get_context_data(object_list=object_list, **kwargs)
         user_wallet = self.request.user.wallet
 
-        balance = 0
-        payment_types = user_wallet.paymenttype_set.all()
-        for payment_type in payment_types:
-            balance += payment_type.balance
-
-        income_sum = 0
-        expense_sum = 0
-        for transaction in self.filtered_queryset.qs:
-            if transaction.category.type == 'Income':
-                income_sum += transaction.value
-
-            elif transaction.category.type == 'Expense':
-                expense_sum += transaction.value
-
-        income_all_time_sum = 0
-        expense_all_time_sum = 0
-        transactions = user_wallet.transaction_set.all()
-        for transaction in transactions:
-            if transaction.category.type == 'Income':
-                income_all_time_sum += transaction.value
-            elif transaction.category.type == 'Expense':
-                expense_all_time_sum += transaction.value
+        if self.cached_page is None:
+            self.cached_page = self.render_page(context)
+            self.wallet_cache.set(self.get_page_cache_name(), self.cached_page)
 
         form = self.filtered_queryset.form
-        form.fields['payment_type'].queryset = form.fields['payment_type'].queryset.filter(wallet=user_wallet)
-        form.fields['category'].queryset = form.fields['category'].queryset.filter(wallet=user_wallet)
+        for name in ('payment_type', 'category'):
+            form.fields[name].queryset = form.fields[name].queryset.filter(wallet=user_wallet)
+        set_choices(form.fields['payment_type'], lambda: sorted(self.wallet_cache.get_payment_types(),
+                                                                key=lambda payment_type: payment_type.pk))
+        set_choices(form.fields['category'], lambda: sorted(self.wallet_cache.get_categories(),
+                                                            key=lambda category: category.name))
+
+        export_query = self.request.GET.copy()
+        export_query.pop(self.cursor_kwarg, None)
 
         context.update({
             'form': self.filtered_queryset.form,
-            'balance': balance,
-            'income_sum': income_sum,
-            'income_all_time_sum': income_all_time_sum,
-            'expense_sum': expense_sum,
-            'expense_all_time_sum': expense_all_time_sum
+            'export_querystring': export_query.urlencode(),
+            **self.cached_page
         })
         return context
 
 
+class ExportTransactions(LoginRequiredMixin, View):
+    """Transactions filtered like on the Transactions page as a streamed CSV or JSONL file"""
+    # The rows are streamed after the view returns, their queries aren't counted. The category and
+    # payment type filters validate their ids with a query each.
+    query_budget = 4
+
+    def get(self, request, *args, **kwargs):
+        queryset = get_transactions(request.user.wallet, archived=request.GET.get('archive') == '1')
+        queryset = TransactionFilter(request.GET, queryset=queryset.order_by('-date', '-id')).qs
+        try:
+            content_type, file_name, chunks = export_transactions(queryset, request.GET.get('format', 'csv'),
+                                                                  compress=bool(request.GET.get('gzip')))
+        except KeyError:
+            raise Http404('Unknown export format')
+
+        response = StreamingHttpResponse(chunks, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{file_name}"'
+        return response
+
+
 class TransactionDetails(PermissionMixin, LoginRequiredMixin, DetailView):
+    query_budget = 3
+    use_replica = True
     model = Transaction
+    select_related = ('category', 'payment_type')
     context_object_name = 'transaction'
     template_name = 'accounting/transaction_details.html'
 
@@ -323,8 +421,11 @@ class TransactionDetails(PermissionMixin, LoginRequiredMixin, DetailView):
         return context_data
 
 
-class UpdateTransaction(PermissionMixin, LoginRequiredMixin, UpdateView):
+class UpdateTransaction(WalletCacheMixin, PermissionMixin, LoginRequiredMixin, UpdateView):
+    # Moving a transaction to a month, category and payment type without a rollup yet inserts it
+    query_budget = 24
     model = Transaction
+    select_related = ('category', 'payment_type')
     form_class = UpdateTransactionForm
     template_name = 'accounting/update_transaction.html'
     success_url = reverse_lazy('main')
@@ -334,32 +435,19 @@ class UpdateTransaction(PermissionMixin, LoginRequiredMixin, UpdateView):
         user_wallet = self.request.user.wallet
         form = self.form_class(**self.get_form_kwargs())
 
-        form.fields['category'].queryset = form.fields['category'].queryset. \
-            filter(wallet=user_wallet). \
-            annotate(usage_count=Count('transaction__category')). \
-            order_by('-usage_count')
-        form.fields['payment_type'].queryset = form.fields['payment_type'].queryset. \
-            filter(wallet=user_wallet). \
-            annotate(usage_count=Count('transaction__payment_type')). \
-            order_by('-usage_count')
+        form.fields['category'].queryset = form.fields['category'].queryset.filter(wallet=user_wallet)
+        set_choices(form.fields['category'], self.wallet_cache.get_categories)
+        form.fields['payment_type'].queryset = form.fields['payment_type'].queryset.filter(wallet=user_wallet)
+        set_choices(form.fields['payment_type'], self.wallet_cache.get_payment_types)
 
         return form
 
     def form_valid(self, form):
-        transaction = Transaction.objects.get(pk=self.object.pk)
         if self.object.category.type == 'Expense':
             self.object.value = -abs(self.object.value)
-        old_value = transaction.value
-        new_value = self.object.value
-
-        transaction.payment_type.balance -= old_value
-        transaction.payment_type.save()
+        ledger.update_transaction(self.object)
 
-        payment_type = PaymentType.objects.get(pk=self.object.payment_type.pk)
-        payment_type.balance += new_value
-        payment_type.save()
-
-        return super().form_valid(form)
+        return HttpResponseRedirect(self.get_success_url())
 
     def get_success_url(self):
         if self.request.GET.get('redirect_url'):
@@ -369,7 +457,9 @@ class UpdateTransaction(PermissionMixin, LoginRequiredMixin, UpdateView):
 
 
 class DeleteTransaction(PermissionMixin, LoginRequiredMixin, DeleteView):
+    query_budget = 14
     model = Transaction
+    select_related = ('category', 'payment_type')
     template_name = 'accounting/delete_transaction.html'
     context_object_name = 'transaction'
     success_url = reverse_lazy('main')
@@ -380,11 +470,105 @@ class DeleteTransaction(PermissionMixin, LoginRequiredMixin, DeleteView):
         return context_data
 
     def form_valid(self, form):
-        response = super().form_valid(form)
+        ledger.delete_transaction(self.object)
+        return HttpResponseRedirect(self.get_success_url())
+
 
-        # Subtract transaction value from payment type
-        payment_type = self.object.payment_type
-        payment_type.balance -= self.object.value
-        payment_type.save()
+class ImportTransactions(LoginRequiredMixin, FormView):
+    # Large files take a few queries per batch of rows
+    query_budget = 16
+    form_class = ImportTransactionsForm
+    template_name = 'accounting/import_transactions.html'
+    success_url = reverse_lazy('transactions')
 
+    def form_valid(self, form):
+        lines = io.TextIOWrapper(form.cleaned_data['file'], encoding='utf-8-sig', newline='')
+        try:
+            import_transactions(self.request.user.wallet, lines)
+        except TransactionImportError as e:
+            for error in e.errors:
+                form.add_error('file', error)
+            return self.form_invalid(form)
+        except UnicodeDecodeError:
+            form.add_error('file', 'The file must be UTF-8 encoded')
+            return self.form_invalid(form)
+        return super().form_valid(form)
+
+
+# Reports
+class Reports(LoginRequiredMixin, TemplateView):
+    query_budget = 4
+    use_replica = True
+    template_name = 'accounting/reports.html'
+
+    def get_context_data(self, **kwargs):
+        form = ReportForm(self.request.GET)
+        rollups = MonthlyRollup.objects.filter(wallet=self.request.user.wallet)
+        if form.is_valid():
+            for lookup, value in form.cleaned_data.items():
+                if value:
+                    rollups = rollups.filter(**{lookup: value})
+
+        kwargs.update({
+            'form': form,
+            'months': get_monthly_report(rollups),
+            'categories': get_category_report(rollups),
+        })
+        return super().get_context_data(**kwargs)
+
+
+class Cashflow(WalletCacheMixin, LoginRequiredMixin, TemplateView):
+    """Chart of the income and expense per day, week or month, see accounting.cashflow"""
+    query_budget = 6
+    use_replica = True
+    template_name = 'accounting/cashflow.html'
+    date_formats = {'day': 'd.m.Y', 'week': 'd.m.Y', 'month': 'm.Y'}
+
+    def get_chart(self, rows, split):
+        """Rows with the bar widths in percent of the largest income or expense"""
+        names = {}
+        if split:
+            objects = (self.wallet_cache.get_categories() if split == 'category'
+                       else self.wallet_cache.get_payment_types())
+            names = {obj.pk: obj.name for obj in objects}
+
+        chart = []
+        for row in rows:
+            groups = [{'name': names.get(pk, ''), **totals}
+                      for pk, totals in sorted(row.get('split', {}).items(), key=lambda item: names.get(item[0], ''))]
+            chart.append({**row, 'groups': groups})
+        scale = max((max(bar['income'], -bar['expense']) for row in chart for bar in [row, *row['groups']]),
+                    default=0) or 1
+        for row in chart:
+            for bar in [row, *row['groups']]:
+                bar['income_width'] = round(bar['income'] * 100 / scale, 1)
+                bar['expense_width'] = round(-bar['expense'] * 100 / scale, 1)
+        return chart
+
+    def get(self, request, *args, **kwargs):
+        response = super().get(request, *args, **kwargs)
+        if response.context_data['form'].errors:
+            response.status_code = 400
         return response
+
+    def get_context_data(self, **kwargs):
+        form = CashflowForm(self.request.GET)
+        chart = []
+        bucket = 'month'
+        if form.is_valid():
+            data = form.cleaned_data
+            bucket = data['bucket']
+            try:
+                rows = get_cached_cashflow(self.wallet_cache, bucket, data['date__gte'], data['date__lte'],
+                                           data['tz'], data['split'] or None)
+                chart = self.get_chart(rows, data['split'])
+            except CashflowError as e:
+                form.add_error(None, str(e))
+
+        kwargs.update({
+            'form': form,
+            'chart': chart,
+            'date_format': self.date_formats[bucket],
+            'api_querystring': self.request.GET.urlencode(),
+        })
+        return super().get_context_data(**kwargs)
@@ -0,0 +1,83 @@
+"""Cache of wallet data the pages read on every request: recent transactions, usage-ordered choice
+lists and rendered fragments. Keys include the version of the wallet summary, a random token every
+write replaces, so entries of a changed wallet are never read again and just expire. The version is
+read from the database, so per-process backends like the local-memory one stay consistent too."""
+from functools import partial
+
+from django.core.cache import cache
+from django.forms.models import ModelChoiceIterator
+from django.utils.functional import cached_property
+
+from accounting.summaries import get_summary
+
+TIMEOUT = 60 * 60
+
+
+class WalletCache:
+    """Cached data of one wallet at its current version. Create one per request."""
+
+    def __init__(self, wallet):
+        self.wallet = wallet
+        # Values read during the request, whatever the cache backend keeps
+        self.values = {}
+
+    @cached_property
+    def summary(self):
+        return get_summary(self.wallet)
+
+    def key(self, name):
+        return f'wallet:{self.wallet.pk}:{self.summary.version}:{name}'
+
+    def get(self, name):
+        return cache.get(self.key(name))
+
+    def set(self, name, value, timeout=TIMEOUT):
+        cache.set(self.key(name), value, timeout)
+
+    def get_or_set(self, name, compute, timeout=TIMEOUT):
+        if name not in self.values:
+            self.values[name] = cache.get_or_set(self.key(name), compute, timeout)
+        return self.values[name]
+
+    def get_recent_transactions(self, count=5):
+        return self.get_or_set(f'recent_transactions:{count}', lambda: list(
+            self.wallet.transaction_set.select_related('payment_type', 'category').order_by('-date', '-id')[:count]))
+
+    def get_categories(self):
+        """Categories of the wallet, most used first"""
+        return self.get_or_set('categories', lambda: list(
+            self.wallet.category_set.order_by('-usage_count')))
+
+    def get_payment_types(self):
+        """Payment types of the wallet, most used first"""
+        return self.get_or_set('payment_types', lambda: list(
+            self.wallet.paymenttype_set.order_by('-usage_count')))
+
+
+class ObjectsChoiceIterator(ModelChoiceIterator):
+    """Choices of a model choice field from the objects returned by get_objects instead of its queryset"""
+
+    def __init__(self, field, get_objects):
+        super().__init__(field)
+        self.get_objects = get_objects
+
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield '', self.field.empty_label
+        for obj in self.get_objects():
+            yield self.choice(obj)
+
+    def __len__(self):
+        return len(self.get_objects()) + (self.field.empty_label is not None)
+
+    def __bool__(self):
+        return self.field.empty_label is not None or bool(self.get_objects())
+
+
+def set_choices(field, get_objects):
+    """Renders the model choice field with the objects returned by get_objects, called only when
+    the field is rendered, instead of querying its queryset. The queryset still validates the
+    submitted value."""
+    field.iterator = partial(ObjectsChoiceIterator, get_objects=get_objects)
+    # The widget got its choices from the queryset when the field was created
+    field.widget.choices = field.choices
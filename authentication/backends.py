@@ -0,0 +1,15 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+UserModel = get_user_model()
+
+
+class WalletBackend(ModelBackend):
+    """Loads the user of the session together with the wallet, which almost every view reads"""
+
+    def get_user(self, user_id):
+        try:
+            user = UserModel._default_manager.select_related('wallet').get(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
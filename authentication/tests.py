@@ -1,3 +1,45 @@
-from django.test import TestCase
+from django.contrib.auth.models import User
+from django.test import TestCase, Client
+from django.urls import reverse
 
-# Create your tests here.
+from accounting.models import Wallet, PaymentType, Category, WalletSummary
+
+
+class TestWalletBackend(TestCase):
+    """The user of the session is loaded with the wallet"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='testuser', password='1234')
+        cls.wallet = Wallet.objects.create(owner=cls.user)
+        WalletSummary.objects.create(wallet=cls.wallet)
+
+    def test_wallet_loaded_with_user(self):
+        client = Client()
+        client.login(username='testuser', password='1234')
+
+        user = client.get(reverse('payment_types')).wsgi_request.user
+        with self.assertNumQueries(0):
+            self.assertEqual(user.wallet, self.wallet)
+
+    def test_inactive_user(self):
+        client = Client()
+        client.login(username='testuser', password='1234')
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+
+        self.assertTrue(client.get(reverse('payment_types')).wsgi_request.user.is_anonymous)
+
+
+class TestRegistry(TestCase):
+    """Signing up creates the wallet and logs the user in"""
+
+    def test_registry(self):
+        response = self.client.post(reverse('registry'), {'username': 'newuser', 'password1': 'Secret-Pass-42',
+                                                          'password2': 'Secret-Pass-42'})
+
+        wallet = Wallet.objects.get(owner__username='newuser')
+        self.assertTrue(WalletSummary.objects.filter(wallet=wallet).exists())
+        self.assertRedirects(response, reverse('main'))
+        self.assertEqual(list(PaymentType.objects.filter(wallet=wallet).values_list('name', flat=True)), ['Cash'])
+        self.assertEqual(Category.objects.filter(wallet=wallet).count(), 3)
+        self.assertEqual(self.client.get(reverse('main')).wsgi_request.user.wallet, wallet)
@@ -4,7 +4,7 @@ from django.shortcuts import redirect
 from django.urls import reverse_lazy
 from django.views.generic import CreateView
 from authentication.forms import *
-from accounting.models import Wallet, Category, PaymentType
+from accounting.models import Wallet, Category, PaymentType, WalletSummary
 
 
 class Registry(CreateView):
@@ -17,7 +17,10 @@ class Registry(CreateView):
         wallet = Wallet(owner=user)
         wallet.save()
 
-        payment_type = PaymentType(wallet=wallet, name='Cash')
+        summary = WalletSummary(wallet=wallet)
+        summary.save()
+
+        payment_type = PaymentType(wallet=wallet, name='Cash', opening_balance=0)
         payment_type.save()
 
         income_category = Category(name='Income', wallet=wallet, type='Income')
@@ -29,7 +32,7 @@ class Registry(CreateView):
         expense_category = Category(name='Transfer', wallet=wallet, type='Transfer', service=True)
         expense_category.save()
 
-        login(self.request, user)
+        login(self.request, user, backend='authentication.backends.WalletBackend')
 
         return redirect('main')
 
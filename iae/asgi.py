@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'iae.settings')
+# Serve the async variants of the Main and Transactions pages
+os.environ.setdefault('IAE_ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.1/ref/settings/
 """
 import os
+import sys
 from pathlib import Path
 
 import dotenv
@@ -54,6 +55,8 @@ INSTALLED_APPS = [
 dotenv.load_dotenv()
 
 MIDDLEWARE = [
+    'accounting.middleware.QueryBudgetMiddleware',
+    'accounting.middleware.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -95,10 +98,66 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD'),
         'HOST': os.getenv('POSTGRES_HOST'),
-        'PORT': os.getenv('POSTGRES_PORT')
+        'PORT': os.getenv('POSTGRES_PORT'),
+        # Seconds to keep connections open between requests, 0 closes them at the end of every request
+        'CONN_MAX_AGE': int(os.getenv('IAE_CONN_MAX_AGE', 0)),
     }
 }
 
+# Read replicas: comma-separated hosts of replicas of the database above. The read-only pages read from
+# them, clients that just wrote read from the primary for REPLICA_PIN_SECONDS.
+# The host of the primary itself gives a second alias to try the routing locally.
+
+REPLICA_DATABASES = []
+for number, host in enumerate(filter(None, os.getenv('POSTGRES_REPLICA_HOSTS', '').split(',')), start=1):
+    DATABASES[f'replica{number}'] = {**DATABASES['default'], 'HOST': host.strip(), 'TEST': {'MIRROR': 'default'}}
+    REPLICA_DATABASES.append(f'replica{number}')
+
+DATABASE_ROUTERS = ['accounting.routers.ReplicaRouter']
+
+REPLICA_PIN_SECONDS = int(os.getenv('IAE_REPLICA_PIN_SECONDS', 10))
+
+# Transactions older than this many days (from the start of that month) are moved to the archive by
+# the archive_transactions command
+
+ARCHIVE_AFTER_DAYS = int(os.getenv('IAE_ARCHIVE_AFTER_DAYS', 365))
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+# Local memory by default, set IAE_CACHE_DIR to share the cache between processes through files
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('IAE_CACHE_DIR'),
+    } if os.getenv('IAE_CACHE_DIR') else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+
+# Query budgets
+# Requests that run more queries than the query_budget of their view log a warning, or fail when
+# strict. The test suite is strict unless IAE_QUERY_BUDGET_STRICT=0.
+
+QUERY_BUDGET_STRICT = os.getenv('IAE_QUERY_BUDGET_STRICT', '1' if sys.argv[1:2] == ['test'] else '0') == '1'
+
+
+# Async views
+# Main and Transactions run their independent queries concurrently. iae/asgi.py turns them on.
+
+ASYNC_VIEWS = os.getenv('IAE_ASYNC_VIEWS') == '1'
+
+
+# Authentication
+# Users are loaded with their wallet. ModelBackend keeps sessions created before it valid.
+
+AUTHENTICATION_BACKENDS = [
+    'authentication.backends.WalletBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators